@@ -6,6 +6,7 @@ const baseURL = window.location.hostname === 'localhost' || window.location.host
 // State management
 let selectedLeads = new Map();
 let processedLeads = new Set(); // Track processed lead emails
+let leadPhones = new Map(); // Lead email -> phone numbers known for it
 
 // Loading spinner functions
 function showLoading() {
@@ -34,6 +35,8 @@ function markLeadAsProcessed(lead) {
 
 function getPhoneNumbers(contactInfo) {
     if (!contactInfo) return [];
+    // Newer backends send one deduplicated list
+    if (Array.isArray(contactInfo)) return contactInfo;
     
     console.log('Processing contact info for phone numbers:', contactInfo);
     
@@ -111,10 +114,14 @@ function createLinkedInLink(url, text) {
     `;
 }
 
-function createLeadCard(lead, contactInfo = null, showActions = true) {
+// revealId: the lead's Apollo id when its phones can still be revealed
+function createLeadCard(lead, contactInfo = null, showActions = true, revealId = null) {
     console.log('Creating lead card with contact info:', contactInfo);
     const phones = contactInfo ? getPhoneNumbers(contactInfo) : [];
     console.log('Processed phone numbers for card:', phones);
+    if (showActions && lead.email && phones.length) {
+        leadPhones.set(lead.email, phones);
+    }
     
     return `
         <div class="lead-card">
@@ -147,7 +154,7 @@ function createLeadCard(lead, contactInfo = null, showActions = true) {
             </div>
             ${showActions ? `
                 <div class="lead-actions">
-                    <button onclick='addToSelected(${JSON.stringify(lead)})'>Select</button>
+                    <button onclick='addToSelected(${JSON.stringify(lead)}, ${JSON.stringify(revealId)})'>Select</button>
                 </div>
             ` : ''}
         </div>
@@ -165,17 +172,44 @@ function updateSelectedLeadsUI() {
     
     selectedLeadsCard.style.display = 'block';
     container.innerHTML = Array.from(selectedLeads.values())
-        .map(lead => createLeadCard(lead, null, false))
+        .map(lead => createLeadCard(lead, leadPhones.get(lead.email) || null, false))
         .join('');
 }
 
-function addToSelected(lead) {
+function addToSelected(lead, revealId = null) {
     if (isLeadProcessed(lead.email)) {
         alert("This lead has already been processed.");
         return;
     }
     selectedLeads.set(lead.email, lead);
     updateSelectedLeadsUI();
+    if (revealId) {
+        revealPhones(lead, revealId);
+    }
+}
+
+// Phone reveals cost Apollo credits, so they only happen for selected leads
+async function revealPhones(lead, apolloId) {
+    try {
+        const response = await fetch(`${baseURL}/reveal-phones`, {
+            method: "POST",
+            headers: createHeaders(),
+            body: JSON.stringify({ ids: [apolloId] })
+        });
+        if (!response.ok) {
+            return; // Older backends reveal during the search instead
+        }
+        const result = await response.json();
+        const phones = (result.results[apolloId] || {}).phones || [];
+        if (!phones.length || !selectedLeads.has(lead.email)) {
+            return;
+        }
+        leadPhones.set(lead.email, [...new Set([...(leadPhones.get(lead.email) || []), ...phones])]);
+        lead.phone = lead.phone || phones[0];
+        updateSelectedLeadsUI();
+    } catch (error) {
+        console.error("Error revealing phones:", error);
+    }
 }
 
 function removeLead(email) {
@@ -239,15 +273,51 @@ document.getElementById("createLeadForm").addEventListener("submit", async (e) =
   try {
         submitButton.disabled = true;
         showLoading();
-        
-    const response = await fetch(`${baseURL}/create-lead`, {
-      method: "POST",
+        const resultsDiv = document.getElementById("results");
+
+        let result;
+        const response = await fetch(`${baseURL}/create-lead/stream`, {
+            method: "POST",
             headers: createHeaders(),
-      body: JSON.stringify(data)
-    });
+            body: JSON.stringify(data)
+        });
 
-        const result = await handleApiResponse(response);
-    document.getElementById("results").innerHTML = `
+        if (response.status === 404 || response.status === 405) {
+            // Backend without the streaming endpoint: wait for the whole response
+            const fallback = await fetch(`${baseURL}/create-lead`, {
+                method: "POST",
+                headers: createHeaders(),
+                body: JSON.stringify(data)
+            });
+            result = await handleApiResponse(fallback);
+        } else if (!response.ok) {
+            await handleApiResponse(response);
+        } else {
+            // Show the draft as the model writes it
+            resultsDiv.innerHTML = `
+              <div class="card">
+                <h3 class="lead-title">✍️ Writing email...</h3>
+                <p class="lead-detail email-draft" style="white-space: pre-wrap;"></p>
+              </div>
+            `;
+            const draft = resultsDiv.querySelector(".email-draft");
+            await readSse(response, (event, payload) => {
+                if (event === "token") {
+                    hideLoading();
+                    draft.textContent += payload.text;
+                } else if (event === "done") {
+                    result = payload;
+                } else if (event === "error") {
+                    throw new Error(payload.detail);
+                }
+            });
+            if (!result) {
+                throw new Error("The lead stream ended early.");
+            }
+            console.log(`Email first token after ${result.ttft_ms}ms, done after ${result.total_ms}ms`);
+        }
+
+    resultsDiv.innerHTML = `
       <div class="card">
                 <h3 class="lead-title">✅ Lead Created</h3>
                 <p class="lead-detail"><strong>Email:</strong> ${result.email}</p>
@@ -265,6 +335,79 @@ document.getElementById("createLeadForm").addEventListener("submit", async (e) =
   }
 });
 
+// Reads an NDJSON response line by line, calling onLine for each parsed object
+async function readNdjson(response, onLine) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (line.trim()) {
+                onLine(JSON.parse(line));
+            }
+        }
+
+        if (done) break;
+    }
+
+    if (buffer.trim()) {
+        onLine(JSON.parse(buffer));
+    }
+}
+
+// Reads a server-sent events response, calling onEvent(event, data) for each
+// event with its JSON data
+async function readSse(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    const dispatch = (block) => {
+        let event = "message";
+        const data = [];
+        for (const line of block.split("\n")) {
+            if (line.startsWith("event:")) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith("data:")) {
+                data.push(line.slice(5).trim());
+            }
+        }
+        if (data.length) {
+            onEvent(event, JSON.parse(data.join("\n")));
+        }
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+        const blocks = buffer.split("\n\n");
+        buffer = blocks.pop();
+        blocks.forEach(dispatch);
+
+        if (done) break;
+    }
+
+    if (buffer.trim()) {
+        dispatch(buffer);
+    }
+}
+
+function showNoLeadsFound(resultsDiv) {
+    resultsDiv.innerHTML = `
+      <div class="card">
+            <h3>No new leads found</h3>
+            <p>All matching leads have already been processed. Try different search criteria.</p>
+        </div>
+    `;
+}
+
 // Find Leads Form
 document.getElementById("findLeadsForm").addEventListener("submit", async (e) => {
   e.preventDefault();
@@ -277,12 +420,16 @@ document.getElementById("findLeadsForm").addEventListener("submit", async (e) =>
     organization_name: form.organization_name.value,
     location: form.location.value,
         industry_tag: form.industry_tag.value,
-        exclude_emails: Array.from(processedLeads)
+        exclude_emails: Array.from(processedLeads),
+        target_count: parseInt(form.target_count.value, 10) || 20,
+        stream: true,
+        compact: true
   };
 
   try {
         submitButton.disabled = true;
         showLoading();
+        resultsDiv.innerHTML = "";
         
         console.log('Sending request to:', `${baseURL}/find-leads`);
         console.log('Request data:', data);
@@ -293,7 +440,32 @@ document.getElementById("findLeadsForm").addEventListener("submit", async (e) =>
       body: JSON.stringify(data)
     });
 
-    const result = await response.json();
+        const contentType = response.headers.get("content-type") || "";
+        if (response.ok && contentType.includes("application/x-ndjson") && response.body) {
+            // Render each lead as soon as the backend has enriched it
+            let count = 0;
+
+            await readNdjson(response, (message) => {
+                if (message.error) {
+                    throw new Error(message.error);
+                }
+                if (message.lead) {
+                    if (count === 0) {
+                        hideLoading();
+                    }
+                    count += 1;
+                    resultsDiv.insertAdjacentHTML("beforeend", createLeadCard(message.lead, message.phones || message.apollo_contact_info, true, message.revealed ? null : message.apollo_id));
+                }
+            });
+
+            if (count === 0) {
+                showNoLeadsFound(resultsDiv);
+            }
+            return;
+        }
+
+        // Backends without streaming support answer with a single JSON body
+    const result = await handleApiResponse(response);
         console.log('API Response:', result);
 
         if (!result.results) {
@@ -305,34 +477,86 @@ document.getElementById("findLeadsForm").addEventListener("submit", async (e) =>
         }
 
         if (result.results.length === 0) {
-            resultsDiv.innerHTML = `
-      <div class="card">
-                    <h3>No new leads found</h3>
-                    <p>All matching leads have already been processed. Try different search criteria.</p>
-                </div>
-            `;
+            showNoLeadsFound(resultsDiv);
             return;
         }
         
         const html = result.results
-            .map(res => createLeadCard(res.lead, res.apollo_contact_info))
+            .map(res => createLeadCard(res.lead, res.phones || res.apollo_contact_info, true, res.revealed ? null : res.apollo_id))
             .join("");
 
         resultsDiv.innerHTML = html;
     } catch (error) {
         console.error("Error:", error);
-        resultsDiv.innerHTML = `
+        resultsDiv.insertAdjacentHTML("beforeend", `
             <div class="card error">
                 <h3>Error</h3>
                 <p>${error.message}</p>
       </div>
-        `;
+        `);
     } finally {
         submitButton.disabled = false;
         hideLoading();
     }
 });
 
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 30 * 60 * 1000;  // stop waiting on a job after this long
+const JOB_RESULTS_PAGE_SIZE = 500;
+
+// Adds the job's results finished since the last call to `results` (index ->
+// result) and returns the job. Leads finish out of order, so pages start
+// after the leading run of indexes already seen rather than at 0.
+async function fetchJobResults(jobId, results) {
+    let after = -1;
+    while (results.has(after + 1)) after++;
+    let job;
+    do {
+        const response = await fetch(`${baseURL}/jobs/${jobId}/results?after=${after}&limit=${JOB_RESULTS_PAGE_SIZE}`, {
+            headers: createHeaders()
+        });
+        job = await handleApiResponse(response);
+        job.results.forEach(item => results.set(item.index, item.result));
+        if (job.results.length) after = job.results[job.results.length - 1].index;
+    } while (job.results.length === JOB_RESULTS_PAGE_SIZE);
+    return job;
+}
+
+function inSubmissionOrder(results) {
+    return Array.from(results.keys()).sort((a, b) => a - b).map(index => results.get(index));
+}
+
+// Renders /process-leads style results, marking successful leads as processed
+function renderProcessedLeads(results, job) {
+    results.forEach(res => {
+        if (!res.error && res.lead.email) {
+            markLeadAsProcessed(res.lead);
+        }
+    });
+
+    // Display processing results
+    const html = results.map((res) => {
+        const card = createLeadCard(res.lead, res.apollo_contact_info, false);
+        return card.replace('</div></div>', `
+                ${res.error ? 
+                    `<p class="error">Error: ${res.error}</p>` :
+                    `<p class="lead-detail"><strong>Score:</strong> ${res.score}</p>
+                     <p class="lead-detail"><strong>Email Status:</strong> 
+                        <span class="status-badge ${res.email_sent ? 'success' : 'pending'}">
+                            ${res.email_sent ? 'Sent' : 'Generated'}
+                        </span>
+                     </p>`
+                }
+            </div>
+        </div>`);
+    }).join("");
+
+    const progress = job && job.status !== "completed"
+        ? `<div class="card"><p class="lead-detail">Processed ${job.done + job.failed} of ${job.total} leads…</p></div>`
+        : "";
+    document.getElementById("results").innerHTML = progress + html;
+}
+
 // Process Selected Leads
 document.getElementById("processSelectedLeads").addEventListener("click", async () => {
     if (selectedLeads.size === 0) {
@@ -348,42 +572,45 @@ document.getElementById("processSelectedLeads").addEventListener("click", async
         button.disabled = true;
         showLoading();
         
-        const response = await fetch(`${baseURL}/process-leads`, {
+        // Submit the batch as a background job and poll for results, so
+        // large batches don't run into the request timeout
+        const body = JSON.stringify({
+            leads: leads,
+            send_immediately: sendImmediately
+        });
+        const submitResponse = await fetch(`${baseURL}/jobs`, {
             method: "POST",
             headers: createHeaders(),
-            body: JSON.stringify({
-                leads: leads,
-                send_immediately: sendImmediately
-            })
+            body: body
         });
 
-        const result = await handleApiResponse(response);
-        
-        // Mark processed leads
-        result.results.forEach(res => {
-            if (!res.error && res.lead.email) {
-                markLeadAsProcessed(res.lead);
+        if (submitResponse.status === 503) {
+            // Jobs are disabled on this server, so process the batch in one request
+            const response = await fetch(`${baseURL}/process-leads`, {
+                method: "POST",
+                headers: createHeaders(),
+                body: body
+            });
+            const data = await handleApiResponse(response);
+            renderProcessedLeads(data.results, null);
+        } else {
+            let job = await handleApiResponse(submitResponse);
+            const results = new Map();
+            const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+            while (true) {
+                job = await fetchJobResults(job.job_id, results);
+                renderProcessedLeads(inSubmissionOrder(results), job);
+                if (job.status === "completed" || job.status === "failed") break;
+                if (Date.now() > deadline) {
+                    throw new Error(`Job ${job.job_id} is still running, check back later`);
+                }
+                await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
             }
-        });
-        
-        // Display processing results
-        const html = result.results.map((res) => {
-            const card = createLeadCard(res.lead, res.apollo_contact_info, false);
-            return card.replace('</div></div>', `
-                    ${res.error ? 
-                        `<p class="error">Error: ${res.error}</p>` :
-                        `<p class="lead-detail"><strong>Score:</strong> ${res.score}</p>
-                         <p class="lead-detail"><strong>Email Status:</strong> 
-                            <span class="status-badge ${res.email_sent ? 'success' : 'pending'}">
-                                ${res.email_sent ? 'Sent' : 'Generated'}
-                            </span>
-                         </p>`
-                    }
-                </div>
-            </div>`);
-        }).join("");
 
-    document.getElementById("results").innerHTML = html;
+            if (job.status === "failed") {
+                throw new Error(job.error || "Job failed");
+            }
+        }
         
         // Clear selected leads after processing
         selectedLeads.clear();
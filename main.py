@@ -1,37 +1,94 @@
 import os
-import smtplib
+import asyncio
+import re
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from fastapi import FastAPI, HTTPException
+import sqlite3
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import requests
-from typing import List, Optional
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import httpx
+from typing import TYPE_CHECKING, List, Literal, Optional
 from dotenv import load_dotenv
-import openai
-from langchain_openai.llms import OpenAI as LangChainLLM
-from langchain.agents import initialize_agent, Tool
-from openai import OpenAI
-from langchain.agents.agent_types import AgentType
+from service.smtp_pool import SMTPPool
+from service.pipeline import Stage, BatchStage, run_pipeline
+from service.scoring import LeadScore, LeadScorer, ScoringRules
+from service.jobs import JobStore, JobRunner
+from service.outbound import Provider, CircuitOpenError
+from service.http_clients import ClientRegistry
+from service.dedup import LeadIndex, lead_keys, normalize_email
+from service.leads import LeadCard, apollo_contact_info, collect_phones, dumps, project_person
+from service.email_templates import EmailTemplate, TemplateLibrary
+from service.lead_files import LeadFileParser, export_chunks
+from service.metrics import Metrics, TraceIdFilter, TraceMiddleware
+from service.ttl_cache import TTLCache
+from service.shared_stream import SharedWalks
+
+# The OpenAI SDK is imported where it is first used; it takes a while to
+# load and the server should be answering /health by then
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; every line carries the trace id of the request it came from
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(levelname)s:%(name)s:%(trace_id)s:%(message)s")
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
 # Config
-APOLLO_API_KEY = os.getenv("APOLLO_API_KEY")
+APOLLO_API_KEY = os.getenv("APOLLO_API_KEY", "")
 HUBSPOT_TOKEN = os.getenv("HUBSPOT_PRIVATE_TOKEN")
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-
-# Initialize OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", 8))
+HUBSPOT_CONCURRENCY = int(os.getenv("HUBSPOT_CONCURRENCY", 8))
+APOLLO_BASE_URL = os.getenv("APOLLO_BASE_URL", "https://api.apollo.io/api/v1")
+HUBSPOT_BASE_URL = os.getenv("HUBSPOT_BASE_URL", "https://api.hubapi.com")
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 15))
+APOLLO_RATE_LIMIT = float(os.getenv("APOLLO_RATE_LIMIT", 5))  # requests per second, 0 disables pacing
+APOLLO_BURST = int(os.getenv("APOLLO_BURST", 10))
+HUBSPOT_RATE_LIMIT = float(os.getenv("HUBSPOT_RATE_LIMIT", 10))  # private apps get 100 requests per 10s
+HUBSPOT_BURST = int(os.getenv("HUBSPOT_BURST", 10))
+OPENAI_RATE_LIMIT = float(os.getenv("OPENAI_RATE_LIMIT", 10))
+OPENAI_BURST = int(os.getenv("OPENAI_BURST", 20))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_BREAKER_THRESHOLD = int(os.getenv("OUTBOUND_BREAKER_THRESHOLD", 5))
+OUTBOUND_BREAKER_RESET = float(os.getenv("OUTBOUND_BREAKER_RESET", 30))
+APOLLO_MAX_CONNECTIONS = int(os.getenv("APOLLO_MAX_CONNECTIONS", 20))
+HUBSPOT_MAX_CONNECTIONS = int(os.getenv("HUBSPOT_MAX_CONNECTIONS", 10))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() != "false"
+HTTP_POOL_SHARD_SIZE = int(os.getenv("HTTP_POOL_SHARD_SIZE", 8))  # connections per pooled client
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "" if os.getenv("VERCEL") else "jobs.sqlite3")  # "" disables jobs; Vercel's filesystem is read-only
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # jobs processed at once by this instance
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 1000))  # items a job worker loads and processes at a time
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))  # a running job not renewed for this long is requeued
+JOB_IMPORT_TIMEOUT = float(os.getenv("JOB_IMPORT_TIMEOUT", 3600))  # an import idle for this long is failed
+LEAD_INDEX_PATH = os.getenv("LEAD_INDEX_PATH", "lead_index.sqlite3")
+LEAD_INDEX_CAPACITY = int(os.getenv("LEAD_INDEX_CAPACITY", 100000))
+# Statuses that keep a lead out of search results ("found", "processed", "emailed"); empty disables
+LEAD_DEDUP_EXCLUDE = {status.strip() for status in os.getenv("LEAD_DEDUP_EXCLUDE", "processed,emailed").split(",") if status.strip()}
+APOLLO_PER_PAGE = max(1, min(100, int(os.getenv("APOLLO_PER_PAGE", 25))))  # Apollo caps per_page at 100
+APOLLO_MAX_PAGES = int(os.getenv("APOLLO_MAX_PAGES", 40))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 300))  # seconds identical /find-leads searches share results; 0 disables
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 128))
+LEAD_SCORING_RULES = os.getenv("LEAD_SCORING_RULES")  # optional path to a JSON ScoringRules file
+LEAD_SCORING_LLM = os.getenv("LEAD_SCORING_LLM", "off")  # "off" or "borderline"
+LEAD_SCORING_LLM_CONCURRENCY = int(os.getenv("LEAD_SCORING_LLM_CONCURRENCY", 4))
+LEAD_SCORING_MODEL = os.getenv("LEAD_SCORING_MODEL", "gpt-3.5-turbo")
+EMAIL_MODE = os.getenv("EMAIL_MODE", "llm")  # how /process-leads writes emails: "llm" or "template"
+EMAIL_TEMPLATE = os.getenv("EMAIL_TEMPLATE", "intro")  # "name" or "name@version"
+EMAIL_TEMPLATES_PATH = os.getenv("EMAIL_TEMPLATES_PATH")  # optional JSON list of templates added to the built-in ones
 
 # Initialize FastAPI
 app = FastAPI()
@@ -45,6 +102,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics, served at /metrics. Provider calls are timed by their
+# Provider; scoring and SMTP are timed where they run.
+metrics = Metrics()
+metrics.describe("provider_call_duration_seconds", "Time per provider call attempt, by provider, operation and outcome")
+metrics.describe("provider_calls_total", "Provider call retries and circuit breaker rejections")
+metrics.describe("stage_duration_seconds", "Time spent in non-provider steps: SMTP, template rendering and lead scoring")
+app.add_middleware(TraceMiddleware, metrics=metrics)
+
 # Models
 class LeadRequest(BaseModel):
     firstname: str
@@ -64,22 +129,29 @@ class ApolloSearchRequest(BaseModel):
     organization_name: str = ""
     location: str = ""
     industry_tag: str = ""
-    exclude_emails: List[str] = []
+    exclude_emails: set[str] = set()
+    target_count: int = Field(20, ge=1, le=1000)  # Stop walking Apollo pages once this many leads are found
+    stream: bool = False  # Stream leads back as NDJSON
+    compact: bool = False  # Leave None fields out of lead cards
 
 class EmailGenerationRequest(BaseModel):
     leads: list[LeadRequest]
     send_immediately: bool = False
+    mode: Optional[Literal["llm", "template"]] = None  # defaults to EMAIL_MODE
+    template: Optional[str] = None  # "name" or "name@version" for template mode, defaults to EMAIL_TEMPLATE
 
-# LangChain Setup
-llm = LangChainLLM(temperature=0, openai_api_key=os.getenv("OPENAI_API_KEY"))
+# Email templates are compiled once at startup
+email_templates = TemplateLibrary.from_file(EMAIL_TEMPLATES_PATH) if EMAIL_TEMPLATES_PATH else TemplateLibrary()
+email_templates.get(EMAIL_TEMPLATE)  # fail at startup, not on the first request
 
-lead_score_tool = Tool(
-    name="LeadScorer",
-    func=lambda x: f"Score for lead '{x}': High potential (based on title and industry match)",
-    description="Scores a lead based on description and role"
-)
+def email_template(ref: Optional[str]) -> EmailTemplate:
+    try:
+        return email_templates.get(ref or EMAIL_TEMPLATE)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown email template {ref!r}.")
 
-agent = initialize_agent([lead_score_tool], llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=False)
+# Lead scoring rules are compiled once at startup
+lead_scorer = LeadScorer(ScoringRules.from_file(LEAD_SCORING_RULES) if LEAD_SCORING_RULES else None)
 
 # Health check endpoint
 @app.get("/health")
@@ -94,31 +166,162 @@ async def health_check():
             "SMTP_USER": bool(os.getenv("SMTP_USER")),
             "SMTP_PASSWORD": bool(os.getenv("SMTP_PASSWORD")),
         }
-        return {"status": "ok", "environment": env_vars}
+        return {"status": "ok", "jobs_enabled": job_store is not None, "environment": env_vars}
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return {"status": "error", "detail": str(e)}
 
-def send_email_smtp(to_email: str, subject: str, body: str):
-    msg = MIMEMultipart()
-    msg['From'] = SMTP_USER
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
+# Bulk jobs are persisted so they survive a restart. The store is opened
+# at startup from JOB_STORE_PATH; without a writable one (e.g. a read-only
+# filesystem) jobs are disabled and their endpoints answer 503. Workers are
+# stopped before the clients they use are closed.
+job_store = None
+job_runner = None
 
+def open_store(name: str, factory, path: str):
+    # None for an empty path or one that can't be opened
+    if not path:
+        return None
     try:
-        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.sendmail(SMTP_USER, to_email, msg.as_string())
-        server.quit()
+        return factory(path)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Can't open the {name} at {path}: {e}")
+        return None
+
+@app.on_event("startup")
+async def start_job_runner():
+    global job_store, job_runner
+    job_store = open_store("job store", JobStore, JOB_STORE_PATH)
+    if job_store is None:
+        logger.info("Bulk jobs are disabled: no writable JOB_STORE_PATH")
+        return
+    job_runner = JobRunner(
+        job_store, workers=JOB_WORKERS, chunk_size=JOB_CHUNK_SIZE,
+        lease_seconds=JOB_LEASE_SECONDS, import_timeout=JOB_IMPORT_TIMEOUT
+    )
+    job_runner.register("process-leads", run_process_leads_job)
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    global job_store, job_runner
+    if job_runner is not None:
+        await job_runner.stop()
+        await asyncio.to_thread(job_store.close)
+        job_store = job_runner = None
+
+def require_job_store() -> JobStore:
+    if job_store is None:
+        raise HTTPException(status_code=503, detail="Bulk jobs are disabled on this server.")
+    return job_store
+
+# Leads already found, processed or emailed, by email, Apollo id and LinkedIn
+# URL. Kept in memory only when LEAD_INDEX_PATH can't be opened. Like the
+# other SQLite stores, it is used from request handlers through
+# asyncio.to_thread, so disk I/O never blocks the event loop (and doesn't
+# queue behind SMTP sends in Starlette's thread pool).
+lead_index = None
+
+@app.on_event("startup")
+async def open_lead_index():
+    global lead_index
+    lead_index = (
+        open_store("lead index", lambda path: LeadIndex(path, capacity=LEAD_INDEX_CAPACITY), LEAD_INDEX_PATH)
+        or LeadIndex(":memory:", capacity=LEAD_INDEX_CAPACITY)
+    )
+
+@app.on_event("shutdown")
+async def close_lead_index():
+    lead_index.close()
+
+# Running and recent /find-leads searches, as SharedStreams of lead cards
+search_cache = TTLCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL)
+
+# Pooled keep-alive HTTP clients, one per provider, shared by every request
+http_clients = ClientRegistry(shard_size=HTTP_POOL_SHARD_SIZE)
+http_clients.register(
+    "apollo", timeout=HTTP_TIMEOUT, max_connections=APOLLO_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED
+)
+http_clients.register(
+    "hubspot", timeout=HTTP_TIMEOUT, max_connections=HUBSPOT_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED
+)
+# The OpenAI SDK wraps a single client, so this one isn't sharded
+http_clients.register(
+    "openai", timeout=OPENAI_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED, shard_size=OPENAI_MAX_CONNECTIONS
+)
+
+@app.on_event("startup")
+async def open_http_clients():
+    http_clients.start()
+
+# One OpenAI client for the app's lifetime, on the pooled "openai" HTTP
+# client. Retries are left to openai_provider.
+openai_client = None
+
+def get_openai_client() -> "AsyncOpenAI":
+    global openai_client
+    if openai_client is None:
+        from openai import APIConnectionError, AsyncOpenAI
+        openai_provider.retry_exceptions = (httpx.TransportError, APIConnectionError)
+        openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, http_client=http_clients.get("openai")
+        )
+    return openai_client
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    global openai_client
+    openai_client = None  # built on the "openai" HTTP client closed below
+    await http_clients.aclose()
+
+# Every provider call goes through its Provider: rate limited, retried on
+# 429/5xx/connection errors, and cut off by a circuit breaker when it keeps failing
+apollo = Provider(
+    "apollo", APOLLO_RATE_LIMIT, APOLLO_BURST, max_retries=OUTBOUND_MAX_RETRIES,
+    failure_threshold=OUTBOUND_BREAKER_THRESHOLD, reset_timeout=OUTBOUND_BREAKER_RESET, metrics=metrics
+)
+hubspot = Provider(
+    "hubspot", HUBSPOT_RATE_LIMIT, HUBSPOT_BURST, max_retries=OUTBOUND_MAX_RETRIES,
+    failure_threshold=OUTBOUND_BREAKER_THRESHOLD, reset_timeout=OUTBOUND_BREAKER_RESET, metrics=metrics
+)
+openai_provider = Provider(
+    "openai", OPENAI_RATE_LIMIT, OPENAI_BURST, max_retries=OUTBOUND_MAX_RETRIES,
+    failure_threshold=OUTBOUND_BREAKER_THRESHOLD, reset_timeout=OUTBOUND_BREAKER_RESET, metrics=metrics
+)  # also retries openai.APIConnectionError, added by get_openai_client() once the SDK is loaded
+
+# SMTP sessions are opened on first send and reused across requests
+smtp_pool = SMTPPool(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, size=SMTP_POOL_SIZE, starttls=SMTP_STARTTLS)
+
+@app.on_event("shutdown")
+async def close_smtp_pool():
+    await run_in_threadpool(smtp_pool.close)
+
+# Read at scrape time, so they cost nothing between scrapes
+metrics.gauge(
+    "provider_circuit_open", "1 while a provider's circuit breaker is open",
+    lambda: [({"provider": p.name}, p.breaker.state == "open") for p in (apollo, hubspot, openai_provider)]
+)
+metrics.gauge("lead_index_keys", "Keys in the lead index", lambda: lead_index.stats()["keys"])
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Gauges count rows in the SQLite stores
+    return PlainTextResponse(await asyncio.to_thread(metrics.render), media_type="text/plain; version=0.0.4")
+
+def send_email_smtp(to_email: str, subject: str, body: str):
+    try:
+        with metrics.timer("stage_duration_seconds", stage="smtp"):
+            smtp_pool.send(to_email, subject, body)
         logger.info(f"Email sent to {to_email}")
         return {"status": "success", "message": "Email sent successfully."}
     except Exception as e:
         logger.error(f"SMTP error: {e}")
         raise HTTPException(status_code=500, detail="Error sending email.")
 
-def push_to_hubspot(lead: LeadRequest):
+async def push_to_hubspot(lead: LeadRequest):
     if not lead.email:
         return None
         
@@ -129,7 +332,7 @@ def push_to_hubspot(lead: LeadRequest):
 
     try:
         # Create new contact
-        create_url = "https://api.hubapi.com/crm/v3/objects/contacts"
+        create_url = f"{HUBSPOT_BASE_URL}/crm/v3/objects/contacts"
         data = {
             "properties": {
                 "email": lead.email,
@@ -139,114 +342,182 @@ def push_to_hubspot(lead: LeadRequest):
                 "company": lead.company
             }
         }
-        create_resp = requests.post(create_url, json=data, headers=headers)
+        client = http_clients.get("hubspot")
+        create_resp = await hubspot.request(client, "POST", create_url, operation="create", json=data, headers=headers)
         create_resp.raise_for_status()
         logger.info(f"Lead pushed to HubSpot: {lead.email}")
         return create_resp.json()
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, CircuitOpenError) as e:
         logger.error(f"HubSpot API error: {e}")
         return None
 
-@app.post("/find-leads")
-async def find_leads(query: ApolloSearchRequest):
-    url = "https://api.apollo.io/api/v1/mixed_people/search"
-    headers = {
-        "Cache-Control": "no-cache",
-        "Content-Type": "application/json",
-        "X-Api-Key": APOLLO_API_KEY
-    }
-    
+def build_search_payload(query: ApolloSearchRequest, page: int) -> dict:
     payload = {
         "api_key": APOLLO_API_KEY,
         "q_person_titles": [query.job_title] if query.job_title else None,
         "q_organization_name": query.organization_name if query.organization_name else None,
         "q_location_name": query.location if query.location else None,
         "q_industry": query.industry_tag if query.industry_tag else None,
-        "page": 1,
-        "per_page": 25,
+        "page": page,
+        "per_page": APOLLO_PER_PAGE,
         "reveal_personal_emails": True,
         "contact_details": True,
         "reveal_phone_numbers": True
     }
 
     # Remove None values
-    payload = {k: v for k, v in payload.items() if v is not None}
+    return {k: v for k, v in payload.items() if v is not None}
+
+async def lead_seen(keys: list[str]) -> bool:
+    # The lead index's Bloom filter rules most leads out in memory; only a
+    # possible hit is looked up in SQLite, on a worker thread
+    if not LEAD_DEDUP_EXCLUDE or not lead_index.maybe_seen(keys):
+        return False
+    return await asyncio.to_thread(lead_index.seen, keys, LEAD_DEDUP_EXCLUDE)
+
+def build_lead_result(person: dict, exclude_emails: set[str]) -> Optional[LeadCard]:
+    # Get company information
+    company_info = person.get("organization", {})
+
+    # Skip if email is in exclude list or the lead is already known
+    email = person.get("email")
+    if not email or normalize_email(email) in exclude_emails:
+        return None
+    if lead_index.seen(lead_keys(person), LEAD_DEDUP_EXCLUDE):
+        return None
 
-    try:
-        response = requests.post(url, headers=headers, json=payload)
+    # Only add leads that have at least a company name
+    if not company_info.get("name"):
+        return None
+
+    return LeadCard(
+        firstname=person.get("first_name", ""),
+        lastname=person.get("last_name", ""),
+        email=email,
+        company=company_info["name"],
+        company_description=company_info.get("description"),
+        company_linkedin_url=company_info.get("linkedin_url"),
+        job_title=person.get("title"),
+        description=person.get("headline"),
+        linkedin_url=person.get("linkedin_url"),
+        phone=person.get("phone_number"),
+        phones=collect_phones(person),
+        apollo_contact_info=apollo_contact_info(person),
+    )
+
+def found_leads(people: list[dict], exclude_emails: set[str], limit: int) -> list[LeadCard]:
+    # Up to `limit` cards from one search page, recorded as found in the
+    # lead index. Blocking; iter_leads runs it on a worker thread.
+    cards = []
+    for person in map(project_person, people):
+        card = build_lead_result(person, exclude_emails)
+        if card is None:
+            continue
+        lead_index.add(lead_keys(person), "found")
+        cards.append(card)
+        if len(cards) >= limit:
+            break
+    return cards
+
+async def iter_leads(query: ApolloSearchRequest):
+    # Walks Apollo search pages lazily, yielding leads until
+    # query.target_count is reached or the search runs out of pages
+    url = f"{APOLLO_BASE_URL}/mixed_people/search"
+    headers = {
+        "Cache-Control": "no-cache",
+        "Content-Type": "application/json",
+        "X-Api-Key": APOLLO_API_KEY
+    }
+    excluded = {normalize_email(email) for email in query.exclude_emails} - {None}
+    found = 0
+    page, total_pages = 1, 1
+    client = http_clients.get("apollo")
+    while found < query.target_count and page <= min(total_pages, APOLLO_MAX_PAGES):
+        response = await apollo.request(client, "POST", url, operation="search", headers=headers, json=build_search_payload(query, page))
         response.raise_for_status()
-        
-        people = response.json().get("people", [])
-        leads_created = []
-        
-        for person in people:
-            # Get company information
-            company_info = person.get("organization", {})
-            
-            # Skip if email is in exclude list
-            email = person.get("email")
-            if not email or email in query.exclude_emails:
-                continue
-
-            # Create lead data
-            lead_data = LeadRequest(
-                firstname=person.get("first_name", ""),
-                lastname=person.get("last_name", ""),
-                email=email,
-                phone=person.get("phone_number"),
-                company=company_info.get("name", "Unknown Company"),
-                company_description=company_info.get("description"),
-                company_linkedin_url=company_info.get("linkedin_url"),
-                job_title=person.get("title"),
-                description=person.get("headline"),
-                linkedin_url=person.get("linkedin_url")
-            )
-            
-            # Only add leads that have at least a company name
-            if lead_data.company != "Unknown Company":
-                leads_created.append({
-                    "lead": lead_data.dict(),
-                    "apollo_contact_info": {
-                        "phone_numbers": person.get("phone_numbers", []),
-                        "direct_phone": person.get("direct_phone"),
-                        "mobile_phone": person.get("mobile_phone")
-                    }
-                })
-
-            if len(leads_created) >= 20:
-                break
+        data = response.json()
+        people = data.get("people", [])
+        if not people:
+            break
+        total_pages = (data.get("pagination") or {}).get("total_pages") or page
+
+        for card in await asyncio.to_thread(found_leads, people, excluded, query.target_count - found):
+            yield card
+            found += 1
+        page += 1
+
+def search_cache_key(query: ApolloSearchRequest) -> tuple:
+    # Case and whitespace don't change what Apollo returns
+    filters = (query.job_title, query.organization_name, query.location, query.industry_tag)
+    return tuple(" ".join(value.split()).casefold() for value in filters) + (query.target_count,)
+
+def card_keys(card: LeadCard) -> list[str]:
+    return lead_keys({"email": card.email, "linkedin_url": card.linkedin_url})
+
+shared_searches = SharedWalks(search_cache, iter_leads, card_keys)
+
+def iter_shared_leads(query: ApolloSearchRequest):
+    # iter_leads, with identical searches sharing one Apollo walk: while it
+    # runs, and for SEARCH_CACHE_TTL seconds after. Each caller's
+    # exclude_emails and a fresh lead index check are applied on top of the
+    # shared cards; if they drop any, the caller tops up with its own walk.
+    if SEARCH_CACHE_TTL <= 0:
+        return iter_leads(query)
+
+    excluded = {normalize_email(email) for email in query.exclude_emails} - {None}
+
+    async def skip(card: LeadCard, keys: list[str]) -> bool:
+        return normalize_email(card.email) in excluded or await lead_seen(keys)
+
+    # The shared walk leaves exclude_emails to each caller
+    shared_query = query.model_copy(update={"exclude_emails": set()})
+    return shared_searches.iter(search_cache_key(query), shared_query, query, skip, query.target_count)
+
+async def stream_leads(query: ApolloSearchRequest):
+    # NDJSON: one lead per line, then {"done": true} or {"error": ...}
+    count = 0
+    try:
+        async for card in iter_shared_leads(query):
+            count += 1
+            yield dumps(card.to_dict(query.compact)) + b"\n"
+    except Exception as e:
+        logger.error(f"Apollo API error: {e}")
+        yield dumps({"error": str(e)}) + b"\n"
+        return
+    yield dumps({"done": True, "count": count}) + b"\n"
 
+@app.post("/find-leads")
+async def find_leads(query: ApolloSearchRequest):
+    if query.stream:
+        return StreamingResponse(stream_leads(query), media_type="application/x-ndjson")
+
+    leads_created = []
+    try:
+        async for card in iter_shared_leads(query):
+            leads_created.append(card.to_dict(query.compact))
+        if query.compact:
+            # Already plain JSON types, so skip FastAPI's encoder
+            return Response(dumps({"results": leads_created}), media_type="application/json")
         return {"results": leads_created}
 
     except Exception as e:
         logger.error(f"Apollo API error: {e}")
-        return {"results": [], "error": str(e)}
+        return {"results": leads_created, "error": str(e)}
 
 @app.post("/create-lead")
-async def create_lead(lead: LeadRequest):
+async def create_lead(lead: LeadRequest, template: Optional[str] = None):
+    # ?template= picks another template than EMAIL_TEMPLATE
+    email_body = email_template(template).render(lead)
     try:
-        # Simple email template
-        email_body = f"""
-Dear {lead.firstname},
-
-I hope this email finds you well. I am reaching out from SkillUp MENA, the pioneer of e-learning services. We offer a vast curated library of over 85,000 courses from the world's leading training providers.
-
-Given your role at {lead.company}, I believe we could provide significant value to your organization's training needs.
-
-Would you be open to a brief call to discuss how we can support your team's development?
-
-Best regards,
-SkillUp MENA Team
-        """
-        
         # Send email
         if lead.email:
             email_subject = f"Exciting Opportunity for {lead.company}"
-            send_email_smtp(lead.email, email_subject, email_body)
+            await run_in_threadpool(send_email_smtp, lead.email, email_subject, email_body)
+            await asyncio.to_thread(lead_index.add, lead_keys(lead.dict()), "emailed")
         
         # Push to HubSpot
-        hubspot_response = push_to_hubspot(lead)
+        hubspot_response = await push_to_hubspot(lead)
         
         return {
             "status": "success",
@@ -258,62 +529,254 @@ SkillUp MENA Team
         logger.error(f"Error processing lead: {e}")
         return {"status": "error", "detail": str(e)}
 
+# Lead pipeline stages. They are shared by all requests, so each
+# provider's concurrency limit holds across concurrent batches.
+async def generate_lead_email(record: dict) -> dict:
+    record["email"] = await generate_email(record["lead"])
+    return record
+
+async def render_lead_emails(records: list[dict]) -> list:
+    with metrics.timer("stage_duration_seconds", stage="render_templates"):
+        for record in records:
+            record["email"] = record["template"].render(record["lead"])
+    return records
+
+async def llm_score_lead(lead: LeadRequest, rule_score: LeadScore) -> LeadScore:
+    # Second opinion for borderline leads; falls back to the rule score
+    prompt = f"""
+    SkillUp MENA sells a curated corporate e-learning library of over 85000 courses.
+    Rate from 0 to 100 how likely this lead is to buy it for their organization.
+    Name: {lead.firstname} {lead.lastname}
+    Role: {lead.job_title or "unknown"}
+    Company: {lead.company}
+    Company description: {lead.company_description or "unknown"}
+    Profile: {lead.description or "unknown"}
+    Reply with the number only.
+    """
+    try:
+        response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
+            model=LEAD_SCORING_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=5
+        ), "score")
+        match = re.search(r"\d+", response.choices[0].message.content or "")
+        if not match:
+            return rule_score
+        return lead_scorer.make_score(int(match.group()), rule_score.matches, source="llm")
+    except Exception as e:
+        logger.error(f"OpenAI scoring error: {e}")
+        return rule_score
+
+async def rescore_borderline_lead(record: dict) -> dict:
+    if lead_scorer.is_borderline(record["score"]):
+        record["score"] = await llm_score_lead(record["lead"], record["score"])
+    return record
+
+async def sync_lead_to_hubspot(record: dict) -> dict:
+    record["hubspot"] = await push_to_hubspot(record["lead"])
+    return record
+
+async def send_lead_emails(records: list[dict]) -> list:
+    to_send = [record for record in records if record["lead"].email]
+    messages = [
+        (
+            record["lead"].email,
+            f"Exciting Opportunity for {record['lead'].firstname} {record['lead'].lastname} at {record['lead'].company}",
+            record["email"]
+        )
+        for record in to_send
+    ]
+    with metrics.timer("stage_duration_seconds", stage="smtp_batch"):
+        send_results = await run_in_threadpool(smtp_pool.send_batch, messages)
+    failures = {}
+    for record, result in zip(to_send, send_results):
+        if result["status"] == "sent":
+            record["email_sent"] = True
+        else:
+            failures[id(record)] = RuntimeError(result["error"])
+    return [failures.get(id(record), record) for record in records]
+
+generate_stage = Stage("openai", generate_lead_email, OPENAI_CONCURRENCY)
+template_stage = BatchStage("templates", render_lead_emails, batch_size=1000, max_wait=0)
+llm_score_stage = Stage("openai-scoring", rescore_borderline_lead, LEAD_SCORING_LLM_CONCURRENCY)
+hubspot_stage = Stage("hubspot", sync_lead_to_hubspot, HUBSPOT_CONCURRENCY)
+smtp_stage = BatchStage("smtp", send_lead_emails, batch_size=50, max_wait=0.05)
+
+def lead_stages(send_immediately: bool, mode: Optional[str] = None) -> list:
+    stages = [template_stage if (mode or EMAIL_MODE) == "template" else generate_stage, hubspot_stage]
+    if LEAD_SCORING_LLM == "borderline":
+        stages.insert(1, llm_score_stage)
+    if send_immediately:
+        stages.append(smtp_stage)
+    return stages
+
+def new_lead_records(leads: List[LeadRequest], template: Optional[EmailTemplate] = None) -> list[dict]:
+    # Rule scores for the whole batch up front; only borderline leads reach the LLM stage
+    with metrics.timer("stage_duration_seconds", stage="score_rules_batch"):
+        scores = lead_scorer.score_batch(leads)
+    return [
+        {"lead": lead, "email": None, "template": template, "score": score, "hubspot": None, "email_sent": False}
+        for lead, score in zip(leads, scores)
+    ]
+
+def email_options(mode: Optional[str], template: Optional[str]) -> tuple:
+    mode = mode or EMAIL_MODE
+    return mode, email_template(template) if mode == "template" else None
+
+def remember_leads(records: list[dict], outcomes: list):
+    # Blocking; callers run it on a worker thread
+    for record, outcome in zip(records, outcomes):
+        if not isinstance(outcome, Exception):
+            lead_index.add(lead_keys(record["lead"].dict()), "emailed" if record["email_sent"] else "processed")
+
+def lead_result(record: dict, outcome) -> dict:
+    lead = record["lead"]
+    if isinstance(outcome, Exception):
+        logger.error(f"Error processing lead {lead.email}: {outcome}")
+        return {
+            "lead": lead.dict(),
+            "error": str(outcome)
+        }
+    return {
+        "lead": lead.dict(),
+        "email": record["email"],
+        "template": record["template"].key if record["template"] else None,
+        "score": record["score"].label,
+        "score_details": record["score"].to_dict(),
+        "hubspot": record["hubspot"],
+        "email_sent": record["email_sent"]
+    }
+
 @app.post("/process-leads")
 async def process_leads(request: EmailGenerationRequest):
-    processed_leads = []
-    
-    for lead in request.leads:
-        try:
-            # Generate email
-            email_text = generate_email(lead)
-            
-            # Score the lead
-            lead_score = agent.run(
-                f"Score this lead: {lead.firstname} {lead.lastname}, role at {lead.company}, "
-                "given that this what we do, SkillUp MENA is the pioneer of e-learning services, "
-                "with our vast curated e-learning library of over 85000 courses, all offered by "
-                "the world's leading training providers."
-            )
-            
-            # Push to HubSpot
-            hubspot_response = push_to_hubspot(lead)
-            
-            # Send email if requested
-            email_sent = False
-            if request.send_immediately and lead.email:
-                email_subject = f"Exciting Opportunity for {lead.firstname} {lead.lastname} at {lead.company}"
-                send_email_smtp(lead.email, email_subject, email_text)
-                email_sent = True
-            
-            processed_leads.append({
-                "lead": lead.dict(),
-                "email": email_text,
-                "score": lead_score,
-                "hubspot": hubspot_response,
-                "email_sent": email_sent
-            })
-            
-        except Exception as e:
-            logger.error(f"Error processing lead {lead.email}: {e}")
-            processed_leads.append({
-                "lead": lead.dict(),
-                "error": str(e)
-            })
-    
-    return {"results": processed_leads}
-
-def generate_email(lead: LeadRequest) -> str:
+    mode, template = email_options(request.mode, request.template)
+    records = new_lead_records(request.leads, template)
+    outcomes = await run_pipeline(records, lead_stages(request.send_immediately, mode))
+    await asyncio.to_thread(remember_leads, records, outcomes)
+    return {"results": [lead_result(record, outcome) for record, outcome in zip(records, outcomes)]}
+
+# Bulk processing jobs: same pipeline as /process-leads, but the request
+# returns a job id right away and results are stored as they land
+async def run_process_leads_job(job: dict, items: list, on_result):
+    options = job["options"]
+    template = email_templates.get(options["template"]) if options.get("template") else None
+    records = new_lead_records([LeadRequest(**item) for _, item in items], template)
+
+    def record_outcome(position: int, outcome):
+        idx = items[position][0]
+        on_result(idx, lead_result(records[position], outcome), failed=isinstance(outcome, Exception))
+
+    stages = lead_stages(options.get("send_immediately", False), options.get("mode", "llm"))
+    outcomes = await run_pipeline(records, stages, on_result=record_outcome)
+    await asyncio.to_thread(remember_leads, records, outcomes)
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: EmailGenerationRequest):
+    require_job_store()
+    # The template version is fixed when the job is submitted
+    mode, template = email_options(request.mode, request.template)
+    job_id = await asyncio.to_thread(
+        job_store.create,
+        "process-leads", [lead.dict() for lead in request.leads],
+        {"send_immediately": request.send_immediately, "mode": mode, "template": template.key if template else None}
+    )
+    job_runner.notify()
+    return await asyncio.to_thread(job_store.get, job_id)
+
+def import_row(idx: int, line: int, row) -> tuple:
+    # (idx, item, result) for job_store.add_items; rows that aren't valid
+    # leads go in as failed items, so indexes still follow the file
+    if isinstance(row, str):
+        return idx, {}, {"lead": {}, "error": f"Line {line}: {row}"}
+    try:
+        return idx, LeadRequest(**row).dict(), None
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        return idx, row, {"lead": row, "error": f"Line {line}: {problems}"}
+
+@app.post("/jobs/import", status_code=202)
+async def import_job(
+    request: Request,
+    file_format: Optional[Literal["csv", "jsonl"]] = Query(None, alias="format"),  # defaults from the Content-Type
+    send_immediately: bool = False,
+    mode: Optional[Literal["llm", "template"]] = None,
+    template: Optional[str] = None,
+):
+    # A /jobs job from a CSV or JSONL file sent as the request body. Rows
+    # are parsed and stored as the upload arrives; the job is queued once
+    # the whole file is in.
+    require_job_store()
+    mode, template = email_options(mode, template)
+    content_type = request.headers.get("content-type", "")
+    parser = LeadFileParser(file_format or ("jsonl" if "json" in content_type else "csv"))
+    job_id = await asyncio.to_thread(
+        job_store.start_import,
+        "process-leads", {"send_immediately": send_immediately, "mode": mode, "template": template.key if template else None}
+    )
+    rows, count = [], 0
+    try:
+        async for chunk in request.stream():
+            for line, row in parser.feed(chunk):
+                rows.append(import_row(count, line, row))
+                count += 1
+            if len(rows) >= 500:
+                await asyncio.to_thread(job_store.add_items, job_id, rows)
+                rows = []
+        for line, row in parser.close():
+            rows.append(import_row(count, line, row))
+            count += 1
+        if rows:
+            await asyncio.to_thread(job_store.add_items, job_id, rows)
+    except Exception as e:
+        logger.error(f"Import of job {job_id} failed after {count} rows: {e}")
+        await asyncio.to_thread(job_store.finish, job_id, error=f"Import failed after {count} rows.")
+        raise HTTPException(status_code=400, detail=f"Import failed after {count} rows.")
+    await asyncio.to_thread(job_store.finish_import, job_id)
+    job_runner.notify()
+    logger.info(f"Imported {count} rows into job {job_id}")
+    return await asyncio.to_thread(job_store.get, job_id)
+
+@app.get("/jobs/{job_id}/export")
+async def export_job(job_id: str, file_format: Literal["csv", "jsonl"] = Query("csv", alias="format")):
+    # Finished results so far, streamed a page at a time
+    if await asyncio.to_thread(require_job_store().get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return StreamingResponse(
+        export_chunks(job_store.iter_results(job_id), file_format),
+        media_type="text/csv" if file_format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="job-{job_id}.{file_format}"'}
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(require_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100, after: int = -1):
+    # Pollers pass after= the last index they have instead of an offset, so
+    # each poll only returns results past it
+    job = await asyncio.to_thread(require_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    limit = max(1, min(1000, limit))
+    results = await asyncio.to_thread(job_store.results, job_id, max(0, offset), limit, after)
+    return {**job, "results": results}
+
+async def generate_email(lead: LeadRequest) -> str:
     prompt = f"""
     SkillUp MENA is the pioneer of e-learning services, with our vast curated e-learning library of over 85000 courses, all offered by the world's leading training providers. Our aim is to simplify the corporate training process by offering a unique engaging learning experience, whilst marinating our partners' business needs.
     Write a personalized cold outreach email to {lead.firstname} {lead.lastname} at {lead.company}.
     Mention potential value and request a short call. Keep it under 120 words.
     """
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.chat.completions.create(
+        response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}]
-        )
+        ), "email")
         return response.choices[0].message.content
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
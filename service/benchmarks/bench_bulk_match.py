@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env, percentile
+
+
+# Apollo calls and /find-leads latency with one people/match call per
+# person vs. people/bulk_match batches, against a mock Apollo. The last
+# run has the mock leave every n-th person out of bulk results, so those
+# fall back to single matches. Every mode must return the same leads.
+#
+#   cd service && python -m benchmarks.bench_bulk_match --latency 0.05
+
+MODES = [("single", 0, 0), ("bulk", 10, 0), ("bulk+miss", 10, 4)]
+
+
+async def measure(service, apollo: FakeApollo, args) -> dict:
+    async with service.app.router.lifespan_context(service.app):
+        query = service.ApolloSearchRequest(job_title="Head of Learning", target_count=args.target)
+        results = {}
+        for label, batch_size, miss_every in MODES:
+            service.APOLLO_BULK_MATCH_SIZE = batch_size
+            apollo.bulk_miss_every = miss_every
+            apollo.calls.clear()
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                leads = (await service.find_leads(query))["results"]
+                timings.append(time.perf_counter() - started)
+            calls = {route: count // args.runs for route, count in sorted(apollo.calls.items())}
+            print(
+                f"{label:<10} leads={len(leads):>3}  p50={percentile(timings, 50) * 1000:7.1f}ms  "
+                f"p99={percentile(timings, 99) * 1000:7.1f}ms  calls/request {calls}"
+            )
+            results[label] = leads
+        return results
+
+
+def run(args):
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+
+        results = asyncio.run(measure(service, apollo, args))
+    baseline = results["single"]
+    for label, leads in results.items():
+        assert leads == baseline, f"{label} returned different leads than single matches"
+    print(f"all modes returned the same {len(baseline)} leads")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock Apollo call")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=int, default=20)
+    run(parser.parse_args())
@@ -0,0 +1,95 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_stream import free_port
+from benchmarks.fakes import bench_env
+
+
+# Cold start of both apps: the slowest imports according to
+# `python -X importtime`, and the time from spawning uvicorn to the first
+# 200 from /health.
+#
+#   cd service && python -m benchmarks.bench_coldstart --top 8
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+APPS = {"root": SERVICE_DIR.parent, "service": SERVICE_DIR}
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def app_env(tmp: Path) -> dict:
+    bench_env(JOB_STORE_PATH=tmp / "jobs.sqlite3")
+    return dict(os.environ)
+
+
+def import_profile(cwd: Path, env: dict) -> tuple[float, list[tuple[int, str]]]:
+    # Total import time of `main` plus its slowest direct dependencies
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    total, modules = 0, []
+    for self_us, cumulative_us, indent, name in IMPORTTIME.findall(output):
+        depth = len(indent) // 2
+        if name == "main":
+            total = int(cumulative_us)
+        elif depth == 1:
+            modules.append((int(cumulative_us), name))
+    return total / 1e6, sorted(modules, reverse=True)
+
+
+def time_to_health(cwd: Path, env: dict, timeout: float) -> float | None:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first = None
+    client = httpx.Client(timeout=1)
+    try:
+        while time.perf_counter() - started < timeout and first is None:
+            try:
+                response = client.get(f"http://127.0.0.1:{port}/health")
+            except httpx.TransportError:
+                time.sleep(0.01)
+                continue
+            if response.status_code == 200:
+                first = time.perf_counter() - started
+            time.sleep(0.01)
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+    return first
+
+
+def ms(seconds: float | None) -> str:
+    return f"{seconds * 1000:7.0f}ms" if seconds is not None else "    n/a"
+
+
+def run(args):
+    tmp = Path(args.tmp)
+    tmp.mkdir(parents=True, exist_ok=True)
+    env = app_env(tmp)
+    for name in args.apps:
+        total, modules = import_profile(APPS[name], env)
+        first = time_to_health(APPS[name], env, args.timeout)
+        print(f"{name:<8} import main={total * 1000:7.0f}ms  first /health={ms(first)}")
+        for cumulative_us, module in modules[:args.top]:
+            print(f"{'':<10}{cumulative_us / 1000:7.0f}ms  {module}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", nargs="+", choices=list(APPS), default=list(APPS))
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per app")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--tmp", default="/tmp/bench_coldstart")
+    run(parser.parse_args())
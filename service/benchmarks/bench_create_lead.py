@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_stream import free_port
+from benchmarks.fakes import FakeHubSpot, FakeOpenAI, FakeSMTP, bench_env, percentile
+
+
+# Time until the user sees the email for /create-lead (whole response) vs.
+# /create-lead/stream (first token, and the final "done" event), with mock
+# OpenAI, HubSpot and SMTP. Every run uses a new lead, so nothing is cached.
+#
+#   cd service && python -m benchmarks.bench_create_lead --runs 10
+
+def lead(index: int) -> dict:
+    return {
+        "firstname": f"Bench{index}", "lastname": "Lead", "email": f"bench{index}@example.com",
+        "phone": "+20100000000", "company": "Company", "job_title": "Head of Learning",
+    }
+
+
+async def read_events(response: httpx.Response):
+    event, data = None, []
+    async for line in response.aiter_lines():
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
+
+
+async def measure(base_url: str, runs: int) -> dict:
+    timings = {"json": [], "first token": [], "done": []}
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for index in range(runs):
+            started = time.perf_counter()
+            response = await client.post("/create-lead", json=lead(2 * index))
+            response.raise_for_status()
+            timings["json"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            async with client.stream("POST", "/create-lead/stream", json=lead(2 * index + 1)) as response:
+                async for event, data in read_events(response):
+                    if event == "token" and len(timings["first token"]) == index:
+                        timings["first token"].append(time.perf_counter() - started)
+                    elif event == "done":
+                        timings["done"].append(time.perf_counter() - started)
+                    elif event == "error":
+                        raise RuntimeError(data["detail"])
+    return timings
+
+
+def run(args, app):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        timings = asyncio.run(measure(f"http://127.0.0.1:{port}", args.runs))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    for label, values in timings.items():
+        print(f"{label:<12} p50={percentile(values, 50) * 1000:7.1f}ms  p99={percentile(values, 99) * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds until the mock model's first token")
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--hubspot", type=float, default=0.1, help="seconds per mock HubSpot call")
+    args = parser.parse_args()
+
+    with (
+        FakeOpenAI(latency=args.ttft, tokens=args.tokens, token_delay=args.token_delay) as openai_stub,
+        FakeHubSpot(latency=args.hubspot) as hubspot_stub,
+        FakeSMTP(tls=False) as smtp_stub,
+    ):
+        bench_env(openai=openai_stub, hubspot=hubspot_stub, smtp=smtp_stub)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        run(args, service.app)
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env
+from dedup import LeadIndex, lead_keys
+
+
+# Lead index lookups against a large history, then Apollo calls for a
+# /find-leads where half of the people were processed before: excluded by
+# email (only known after enrichment, so they are still paid for) vs.
+# dropped by the lead index before enrichment.
+#
+#   cd service && python -m benchmarks.bench_dedup --history 200000
+
+def bench_index(history: int, lookups: int):
+    index = LeadIndex(":memory:", capacity=history)
+    started = time.perf_counter()
+    for start in range(0, history, 1000):
+        batch = range(start, min(start + 1000, history))
+        index.add([key for i in batch for key in lead_keys({"id": f"old{i}", "email": f"old{i}@example.com"})], "processed")
+    print(f"index     {history} leads loaded in {time.perf_counter() - started:5.2f}s  {index.stats()}")
+
+    for label, make in (("unseen", lambda i: f"new{i}"), ("seen", lambda i: f"old{i % history}")):
+        started = time.perf_counter()
+        for i in range(lookups):
+            index.status(lead_keys({"id": make(i)}))
+        elapsed = time.perf_counter() - started
+        print(f"lookup    {label:<7} {elapsed / lookups * 1e6:6.1f}us each")
+    print(f"          {index.stats()}")
+    index.close()
+
+
+async def find(service, apollo: FakeApollo, exclude_emails: set[str], target: int) -> tuple[int, dict]:
+    apollo.calls.clear()
+    query = service.ApolloSearchRequest(job_title="Head of Learning", target_count=target, exclude_emails=exclude_emails)
+    leads = (await service.find_leads(query))["results"]
+    return len(leads), dict(sorted(apollo.calls.items()))
+
+
+async def bench_find(service, apollo: FakeApollo, target: int):
+    async with service.app.router.lifespan_context(service.app):
+        processed = [apollo.person(i) for i in range(0, 2 * target, 2)]
+        emails = {f"person{i}@example.com" for i in range(0, 2 * target, 2)}
+
+        service.LEAD_DEDUP_EXCLUDE = set()
+        count, calls = await find(service, apollo, emails, target)
+        print(f"emails    leads={count:>3}  calls {calls}")
+
+        service.LEAD_DEDUP_EXCLUDE = {"processed", "emailed"}
+        for person in processed:
+            service.lead_index.add(lead_keys(person), "processed")
+        count, calls = await find(service, apollo, set(), target)
+        print(f"index     leads={count:>3}  calls {calls}")
+
+
+def run(args):
+    bench_index(args.history, args.lookups)
+    with FakeApollo(latency=args.latency, total_people=4 * args.target) as apollo:
+        bench_env(apollo=apollo)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(bench_find(service, apollo, args.target))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=200000, help="leads already in the index")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per mock Apollo call")
+    parser.add_argument("--target", type=int, default=20)
+    run(parser.parse_args())
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env, percentile
+
+
+# p50/p99 latency of /find-leads against a local mock Apollo at several
+# enrichment concurrency limits.
+#
+#   cd service && python -m benchmarks.bench_enrichment --latency 0.05
+
+def run(args):
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+
+        asyncio.run(measure(service, args))
+
+
+async def measure(service, args):
+    async with service.app.router.lifespan_context(service.app):
+        query = service.ApolloSearchRequest(job_title="Head of Learning")
+        for concurrency in args.concurrency:
+            service.APOLLO_ENRICH_CONCURRENCY = concurrency
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                result = await service.find_leads(query)
+                timings.append(time.perf_counter() - started)
+            print(
+                f"concurrency={concurrency:>3}  leads={len(result['results']):>3}  "
+                f"p50={percentile(timings, 50) * 1000:8.1f}ms  p99={percentile(timings, 99) * 1000:8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock Apollo call")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 2, 4, 8, 20])
+    run(parser.parse_args())
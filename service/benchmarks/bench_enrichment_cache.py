@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env
+
+
+# Repeats the same /find-leads search against a local mock Apollo and shows
+# how many match/reveal calls each run still pays for once the enrichment
+# cache is warm.
+#
+#   cd service && python -m benchmarks.bench_enrichment_cache --runs 3
+
+async def run(service, runs: int, apollo: FakeApollo):
+    async with service.app.router.lifespan_context(service.app):
+        query = service.ApolloSearchRequest(job_title="Head of Learning")
+        for run_number in range(1, runs + 1):
+            apollo.calls.clear()
+            started = time.perf_counter()
+            result = await service.find_leads(query)
+            elapsed = time.perf_counter() - started
+            print(
+                f"run {run_number}: {elapsed * 1000:8.1f}ms  leads={len(result['results'])}  "
+                f"match={apollo.calls['match']} reveal={apollo.calls['reveal']}"
+            )
+        print(f"cache: {service.enrichment_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock Apollo call")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeApollo(latency=args.latency) as apollo, tempfile.TemporaryDirectory() as directory:
+        # The cache is what is measured here, so it keeps its TTL and a file of its own
+        bench_env(
+            apollo=apollo, ENRICHMENT_CACHE_PATH=os.path.join(directory, "enrichment_cache.sqlite3"), ENRICHMENT_CACHE_TTL=None
+        )
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(run(service, args.runs, apollo))
@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from benchmarks.fakes import FakeOpenAI, bench_env
+
+
+# OpenAI calls, tokens and wall-clock time to write emails for a batch of
+# leads through the pipeline's generation stage: one completion per lead
+# (today's loop), multi-lead JSON completions, and the offline batch file
+# stand-in, against a mock OpenAI. --drop-every makes the mock leave some
+# leads out of batched answers to exercise the retries.
+#
+#   cd service && python -m benchmarks.bench_generation --leads 100
+
+def leads(service, mode: str, count: int) -> list:
+    # New names per mode, so no mode is served from another one's cache
+    return [
+        service.LeadRequest(firstname=f"{mode}{i}", lastname="Lead", email=f"{mode}{i}@example.com", company=f"Company {i % 17}")
+        for i in range(count)
+    ]
+
+
+async def measure(service, stub: FakeOpenAI, args):
+    for mode in ("single", "batched", "offline"):
+        records = service.new_lead_records(leads(service, mode, args.leads))
+        stub.calls.clear()
+        stub.usage.clear()
+        started = time.perf_counter()
+        outcomes = await service.run_pipeline(records, [service.generate_stages[mode]])
+        elapsed = time.perf_counter() - started
+        failed = sum(isinstance(outcome, Exception) for outcome in outcomes)
+        written = sum(1 for record in records if record["email"])
+        per_100 = 100 / args.leads
+        print(
+            f"{mode:<8} emails={written:>4} failed={failed:>3}  per 100 leads: calls={stub.calls['chat'] * per_100:6.1f}  "
+            f"prompt tokens={stub.usage['prompt_tokens'] * per_100:8.0f}  completion tokens={stub.usage['completion_tokens'] * per_100:8.0f}  "
+            f"time={elapsed * per_100:6.2f}s"
+        )
+    await service.http_clients.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds of per-call overhead before the first token")
+    parser.add_argument("--tokens", type=int, default=150, help="words per email")
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--drop-every", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    with FakeOpenAI(latency=args.latency, tokens=args.tokens, token_delay=args.token_delay, drop_every=args.drop_every) as stub, \
+            tempfile.TemporaryDirectory() as directory:
+        bench_env(openai=stub, EMAIL_BATCH_SIZE=args.batch_size, EMAIL_OFFLINE_BATCH_WAIT=0.1, EMAIL_BATCH_DIR=directory)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(measure(service, stub, args))
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeHubSpot, bench_env
+
+
+# HubSpot calls and wall time for importing N leads one at a time
+# (search + create/patch per lead) versus push_to_hubspot_batch, against a
+# local fake HubSpot. A third of the leads already exist as contacts.
+#
+#   cd service && python -m benchmarks.bench_hubspot --leads 500
+
+def make_leads(service, count: int):
+    return [
+        service.LeadRequest(firstname=f"First{i}", lastname=f"Last{i}", email=f"lead{i}@example.com", company=f"Company {i % 13}")
+        for i in range(count)
+    ]
+
+
+async def per_lead(service, leads):
+    for lead in leads:
+        await service.push_to_hubspot(lead)
+
+
+async def batched(service, leads):
+    outcomes = await service.push_to_hubspot_batch(leads)
+    for lead, outcome in zip(leads, outcomes):
+        contact = outcome.get("result")
+        if not contact or contact["properties"].get("email", lead.email).lower() != lead.email.lower():
+            raise RuntimeError(f"unexpected HubSpot outcome for {lead.email}: {outcome}")
+
+
+async def import_leads_once(service, leads, import_leads):
+    # Each run gets its own event loop, so don't carry pooled connections over
+    try:
+        await import_leads(service, leads)
+    finally:
+        await service.http_clients.aclose()
+
+
+def run(label: str, service, leads, existing: list[str], latency: float, import_leads):
+    with FakeHubSpot(existing_emails=existing, latency=latency) as hubspot:
+        service.HUBSPOT_BASE_URL = hubspot.url
+        started = time.perf_counter()
+        asyncio.run(import_leads_once(service, leads, import_leads))
+        elapsed = time.perf_counter() - started
+    print(f"{label:<10} calls={sum(hubspot.calls.values()):<6} {elapsed:7.2f}s  {dict(hubspot.calls)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per fake HubSpot call")
+    args = parser.parse_args()
+
+    bench_env()
+    import main as service
+    logging.getLogger().setLevel(logging.WARNING)
+
+    leads = make_leads(service, args.leads)
+    existing = [f"lead{i}@example.com" for i in range(0, args.leads, 3)]
+    run("per-lead", service, leads, existing, args.latency, per_lead)
+    run("batched", service, leads, existing, args.latency, batched)
@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from benchmarks.fakes import bench_env
+
+
+# Time and peak Python memory to import a synthetic lead file into a job
+# (POST /jobs/import), process it and stream the results back out
+# (GET /jobs/{id}/export), for files of --leads rows. "json" is the same
+# leads sent to POST /jobs as one JSON body, the only way in before the
+# import endpoint. Emails come from a template and HubSpot is stubbed, so
+# the numbers are the app's own. Every run checks that each row comes
+# back exactly once. Peaks are measured per phase with tracemalloc, which
+# slows everything down; compare them between sizes, not the times with
+# other benchmarks.
+#
+#   cd service && python -m benchmarks.bench_import --leads 100 10000 100000
+
+FIELDS = ("firstname", "lastname", "email", "company", "job_title", "company_description")
+
+
+def write_leads(path: str, file_format: str, count: int):
+    # Every 500th row is missing its company, so it fails validation
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f) if file_format == "csv" else None
+        if writer:
+            writer.writerow(["First Name", "Last Name", "Email", "Company", "Title", "Company Description"])
+        for i in range(count):
+            row = (
+                f"First{i}", f"Last{i}", f"lead{i}@example.com", "" if i % 500 == 499 else f"Company {i % 997}",
+                "Head of Learning" if i % 3 else "HR Manager", f"Regional group, {i % 50} offices, \"est.\" 19{i % 100:02d}",
+            )
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps({name: value for name, value in zip(FIELDS, row) if value}) + "\n")
+
+
+async def call(app, method: str, path: str, chunks=None, content_type: str = "text/csv") -> tuple[int, int, int, bytes]:
+    # Runs one request through the ASGI app, feeding the body from `chunks`
+    # and counting the response instead of keeping it (httpx's
+    # ASGITransport buffers whole responses). -> (status, bytes, lines,
+    # first 64KB of the body)
+    body = chunks.__aiter__() if chunks is not None else None
+    status, size, lines, head = None, 0, 0, bytearray()
+    done = asyncio.Event()
+    request_sent = False
+    path, _, query = path.partition("?")
+
+    async def receive():
+        nonlocal request_sent
+        if request_sent:
+            await done.wait()
+            return {"type": "http.disconnect"}
+        if body is not None:
+            try:
+                return {"type": "http.request", "body": await body.__anext__(), "more_body": True}
+            except StopAsyncIteration:
+                pass
+        request_sent = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, size, lines
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            data = message.get("body", b"")
+            size += len(data)
+            lines += data.count(b"\n")
+            if len(head) < 65536:
+                head.extend(data[:65536 - len(head)])
+            if not message.get("more_body"):
+                done.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"content-type", content_type.encode())], "server": ("bench", 80), "client": ("127.0.0.1", 1),
+    }
+    await app(scope, receive, send)
+    return status, size, lines, bytes(head)
+
+
+async def file_chunks(path: str, size: int = 65536):
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+            await asyncio.sleep(0)
+
+
+async def json_body(path: str):
+    # The whole file as one /jobs request, built the way a client would;
+    # rows without a company would fail the whole request, so they're left out
+    with open(path) as f:
+        leads = [lead for lead in map(json.loads, f) if "company" in lead]
+    yield json.dumps({"leads": leads, "mode": "template"}).encode()
+
+
+def phase(label: str, started: float, baseline: int):
+    _, peak = tracemalloc.get_traced_memory()
+    print(f"  {label:<8} {time.perf_counter() - started:7.2f}s  peak {(peak - baseline) / 1024:9.0f}KB", end="")
+    tracemalloc.reset_peak()
+    return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+
+
+async def run_one(service, path: str, file_format: str, count: int):
+    print(f"{file_format:<5} leads={count:>7}", end="")
+    tracemalloc.reset_peak()
+    started, baseline = time.perf_counter(), tracemalloc.get_traced_memory()[0]
+    if file_format == "json":
+        status, _, _, head = await call(service.app, "POST", "/jobs", json_body(path), "application/json")
+    else:
+        query = urlencode({"format": file_format, "mode": "template"})
+        status, _, _, head = await call(service.app, "POST", f"/jobs/import?{query}", file_chunks(path))
+    assert status == 202, (status, head[:200])
+    job_id = json.loads(head)["job_id"]
+    started, baseline = phase("import", started, baseline)
+
+    while service.job_store.get(job_id)["status"] not in ("completed", "failed"):
+        await asyncio.sleep(0.05)
+    job = service.job_store.get(job_id)
+    started, baseline = phase("process", started, baseline)
+
+    status, size, lines, _ = await call(service.app, "GET", f"/jobs/{job_id}/export?format=csv")
+    phase("export", started, baseline)
+    print(f"  {size / 1e6:6.1f}MB out")
+    expected_failed = count // 500
+    if file_format == "json":
+        count, expected_failed = count - expected_failed, 0
+    assert status == 200 and job["status"] == "completed", job
+    assert job["total"] == count and job["done"] == count - expected_failed and job["failed"] == expected_failed, job
+    assert lines >= count + 1, (lines, count)
+
+
+async def measure(service, args, directory: str):
+    async def push_to_hubspot_batch(leads):
+        return [{"result": {"id": str(i)}} for i, _ in enumerate(leads)]
+
+    service.push_to_hubspot_batch = push_to_hubspot_batch
+    async with service.app.router.lifespan_context(service.app):
+        for count in args.leads:
+            for file_format in args.formats:
+                path = os.path.join(directory, f"leads-{count}.{'csv' if file_format == 'csv' else 'jsonl'}")
+                if not os.path.exists(path):
+                    write_leads(path, "csv" if file_format == "csv" else "jsonl", count)
+                await run_one(service, path, file_format, count)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "jsonl", "json"], choices=["csv", "jsonl", "json"])
+    parser.add_argument("--chunk-size", type=int, default=1000, help="JOB_CHUNK_SIZE")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_env(JOB_STORE_PATH=os.path.join(directory, "jobs.sqlite3"), JOB_CHUNK_SIZE=args.chunk_size)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        tracemalloc.start()
+        asyncio.run(measure(service, args, directory))
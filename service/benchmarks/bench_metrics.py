@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env, percentile
+
+
+# /find-leads latency against a mock Apollo with the per-person payload logs
+# written for every person (LOG_SAMPLE_RATE=1 at DEBUG, what INFO used to
+# log), for a sample of them, and off (INFO, the default). Logs go to a
+# file, as they would in production. Ends with the provider and stage
+# series /metrics would show.
+#
+#   cd service && python -m benchmarks.bench_metrics --target 50
+
+MODES = [("every person", logging.DEBUG, 1.0), ("sampled 1%", logging.DEBUG, 0.01), ("off (INFO)", logging.INFO, 0.01)]
+
+
+async def measure(service, args):
+    async with service.app.router.lifespan_context(service.app):
+        query = service.ApolloSearchRequest(job_title="Head of Learning", target_count=args.target)
+        for label, level, rate in MODES:
+            logging.getLogger().setLevel(level)
+            service.LOG_SAMPLE_RATE = rate
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                await service.find_leads(query)
+                timings.append(time.perf_counter() - started)
+            print(f"{label:<13} p50={percentile(timings, 50) * 1000:7.1f}ms  p99={percentile(timings, 99) * 1000:7.1f}ms")
+        # The gauges read the stores, which are closed on shutdown
+        return service.metrics.render()
+
+
+def run(args):
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo)
+        import main as service
+        root = logging.getLogger()
+        for handler in root.handlers:
+            handler.setStream(open(os.devnull, "w"))
+        for name in ("httpx", "httpcore", "asyncio"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        rendered = asyncio.run(measure(service, args))
+        print()
+        for line in rendered.splitlines():
+            if line.startswith(("provider_call_duration_seconds_count", "stage_duration_seconds_count")):
+                print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per mock Apollo call")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target", type=int, default=50)
+    run(parser.parse_args())
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeApollo
+from outbound import CircuitOpenError, Provider
+
+
+# Bursty load against a stub that rate limits (429 + Retry-After) and
+# injects 500s: plain calls vs. calls through an outbound Provider. The
+# Provider should finish every request with few 429s while staying close
+# to the stub's limit. The last run points it at a stub that always fails
+# to show the circuit breaker cutting the calls off.
+#
+#   cd service && python -m benchmarks.bench_outbound --requests 200 --limit 50
+
+async def fire(url: str, count: int, provider: Provider | None) -> tuple[int, int, float]:
+    ok = failed = 0
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=50)) as client:
+        async def one():
+            nonlocal ok, failed
+            try:
+                if provider is None:
+                    response = await client.post(f"{url}/mixed_people/search", json={"per_page": 1})
+                else:
+                    response = await provider.request(client, "POST", f"{url}/mixed_people/search", json={"per_page": 1})
+                response.raise_for_status()
+                ok += 1
+            except (httpx.HTTPError, CircuitOpenError):
+                failed += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(count)))
+        return ok, failed, time.perf_counter() - started
+
+
+def report(label: str, stub: FakeApollo, ok: int, failed: int, elapsed: float):
+    statuses = dict(sorted(stub.statuses.items()))
+    print(f"{label:<10} ok={ok:>4} failed={failed:>4}  {elapsed:6.2f}s  {ok / elapsed:6.1f} ok/s  server saw {statuses}")
+
+
+def run(args):
+    with FakeApollo(rate_limit=args.limit, error_rate=args.error_rate, latency=args.latency) as stub:
+        report("plain", stub, *asyncio.run(fire(stub.url, args.requests, None)))
+    time.sleep(1)
+
+    with FakeApollo(rate_limit=args.limit, error_rate=args.error_rate, latency=args.latency) as stub:
+        provider = Provider("apollo", rate=args.limit * 0.9, burst=args.burst, max_retries=5, base_delay=0.2)
+        report("provider", stub, *asyncio.run(fire(stub.url, args.requests, provider)))
+        print(f"{'':<10} {provider.stats()}")
+
+    with FakeApollo(error_rate=1.0, latency=args.latency) as stub:
+        provider = Provider("apollo", rate=args.limit, burst=args.burst, max_retries=2, base_delay=0.05, failure_threshold=5)
+        report("outage", stub, *asyncio.run(fire(stub.url, args.requests, provider)))
+        print(f"{'':<10} {provider.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limit", type=float, default=50, help="stub rate limit, requests per second")
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of injected 500s")
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    run(args)
@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeApollo, bench_env, percentile
+
+
+# Load test: fire N concurrent /find-leads requests at the app through an
+# in-process ASGI client and compare the wall time with N times the latency
+# of a single request. If the handlers block the event loop the two numbers
+# match; if they overlap, the wall time stays close to one request.
+#
+#   cd service && python -m benchmarks.bench_overlap --clients 10
+
+async def timed_post(client: httpx.AsyncClient, path: str, body: dict) -> float:
+    started = time.perf_counter()
+    response = await client.post(path, json=body)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run(args, app):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        body = {"job_title": "Head of Learning"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            single = await timed_post(client, "/find-leads", body)
+
+            started = time.perf_counter()
+            timings = await asyncio.gather(*(timed_post(client, "/find-leads", body) for _ in range(args.clients)))
+            wall = time.perf_counter() - started
+
+        print(f"single request     {single * 1000:8.1f}ms")
+        print(f"serial estimate    {single * args.clients * 1000:8.1f}ms  ({args.clients} x single)")
+        print(f"concurrent wall    {wall * 1000:8.1f}ms  p50={percentile(timings, 50) * 1000:.1f}ms p99={percentile(timings, 99) * 1000:.1f}ms")
+        print(f"overlap factor     {single * args.clients / wall:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per mock Apollo call")
+    parser.add_argument("--clients", type=int, default=10)
+    args = parser.parse_args()
+
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo, APOLLO_MAX_CONNECTIONS=100)  # nor the connection pool cap either
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(run(args, service.app))
@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.fakes import FakeApollo, bench_env
+
+
+# Size and serialization time of a /find-leads response (--target leads,
+# 20 by default) in the default format, which goes through FastAPI's
+# encoder and JSONResponse, and the compact one (None fields left out,
+# serialized with orjson when it is installed). Leads come from a mock
+# Apollo through the real search/enrichment path.
+#
+#   cd service && python -m benchmarks.bench_payload
+
+async def find(service, target: int) -> list:
+    async with service.app.router.lifespan_context(service.app):
+        query = service.ApolloSearchRequest(job_title="Head of Learning", target_count=target)
+        cards = [card async for card in service.iter_leads(query)]
+        return cards
+
+
+def measure(label: str, render, runs: int):
+    body = render()
+    started = time.perf_counter()
+    for _ in range(runs):
+        render()
+    elapsed = (time.perf_counter() - started) / runs
+    print(f"{label:<8} {len(body):>7} bytes  {elapsed * 1e6:7.0f}us per response")
+
+
+def run(args):
+    with FakeApollo() as apollo:
+        bench_env(apollo=apollo)
+        import leads
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        cards = asyncio.run(find(service, args.target))
+
+    print(f"{len(cards)} leads, orjson {'installed' if leads.orjson else 'not installed'}")
+    measure("default", lambda: JSONResponse(jsonable_encoder({"results": [card.to_dict() for card in cards]})).body, args.runs)
+    measure("compact", lambda: service.dumps({"results": [card.to_dict(compact=True) for card in cards]}), args.runs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=2000)
+    run(parser.parse_args())
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import logging
+import math
+import time
+
+from benchmarks.fakes import bench_env
+
+
+# Throughput of /process-leads with stubbed providers: the old one-lead-at-a-
+# time loop versus the staged pipeline. Provider latencies are configurable
+# so the stage limits can be tuned against realistic numbers.
+#
+#   cd service && python -m benchmarks.bench_pipeline --leads 50 --openai 1.5
+
+class StubSMTPPool:
+    def __init__(self, latency: float, size: int):
+        self.latency = latency
+        self.size = size
+
+    def send_batch(self, messages):
+        time.sleep(self.latency * math.ceil(len(messages) / self.size))
+        return [{"to": to_email, "status": "sent"} for to_email, _, _ in messages]
+
+    def close(self):
+        pass
+
+
+def install_stubs(service, args):
+    async def generate_email(lead):
+        await asyncio.sleep(args.openai)
+        return f"Hello {lead.firstname}"
+
+    async def llm_score_lead(lead, rule_score):
+        await asyncio.sleep(args.scoring_llm)
+        return rule_score
+
+    async def push_to_hubspot_batch(leads):
+        await asyncio.sleep(args.hubspot)
+        return [{"result": {"id": str(i), "properties": {"email": lead.email}}} for i, lead in enumerate(leads)]
+
+    service.generate_email = generate_email
+    service.push_to_hubspot_batch = push_to_hubspot_batch
+    service.llm_score_lead = llm_score_lead
+    if args.borderline:
+        service.LEAD_SCORING_LLM = "borderline"
+    service.smtp_pool = StubSMTPPool(args.smtp, service.SMTP_POOL_SIZE)
+
+
+async def sequential(service, request):
+    # The pre-pipeline handler: every step for one lead before the next lead
+    results = []
+    for lead in request.leads:
+        record = {"lead": lead, "email": None, "score": None, "hubspot": None, "email_sent": False}
+        record = await service.generate_lead_email(record)
+        record["score"] = await service.score_lead(lead)
+        [record] = await service.sync_leads_to_hubspot([record])
+        [record] = await service.send_lead_emails([record])
+        results.append(record)
+    return results
+
+
+async def run(service, args):
+    async with service.app.router.lifespan_context(service.app):
+        leads = [
+            service.LeadRequest(
+                firstname=f"First{i}", lastname=f"Last{i}", email=f"lead{i}@example.com", company="Acme",
+                job_title=("Head of Learning", "HR Manager", "Software Engineer")[i % 3]
+            )
+            for i in range(args.leads)
+        ]
+        request = service.EmailGenerationRequest(leads=leads, send_immediately=True)
+
+        for label, handler in (("sequential", lambda: sequential(service, request)), ("pipeline", lambda: service.process_leads(request))):
+            started = time.perf_counter()
+            await handler()
+            elapsed = time.perf_counter() - started
+            print(f"{label:<11} {args.leads} leads in {elapsed:6.2f}s  {args.leads / elapsed:7.1f} leads/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=50)
+    parser.add_argument("--openai", type=float, default=1.0, help="seconds per email generation")
+    parser.add_argument("--scoring-llm", type=float, default=0.5, help="seconds per borderline LLM score")
+    parser.add_argument("--borderline", action="store_true", help="send borderline leads to the (stubbed) LLM")
+    parser.add_argument("--hubspot", type=float, default=0.2, help="seconds per HubSpot batch")
+    parser.add_argument("--smtp", type=float, default=0.1, help="seconds per message per SMTP session")
+    args = parser.parse_args()
+
+    bench_env()
+    import main as service
+    logging.getLogger().setLevel(logging.WARNING)
+    install_stubs(service, args)
+    asyncio.run(run(service, args))
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeApollo, percentile
+from http_clients import ClientRegistry
+
+
+# Per-call latency against a local TLS stub with a fresh client per call
+# (a TCP connect plus TLS handshake every time) vs. a pooled keep-alive
+# client from the registry, sequentially and with concurrent callers.
+#
+#   cd service && python -m benchmarks.bench_pooling --calls 200
+
+async def timed(get_client, url: str, fresh: bool) -> float:
+    started = time.perf_counter()
+    if fresh:
+        async with httpx.AsyncClient(verify=False) as client:
+            response = await client.post(url, json={"per_page": 1})
+    else:
+        response = await get_client().post(url, json={"per_page": 1})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def measure(url: str, calls: int, concurrency: int, fresh: bool) -> list[float]:
+    registry = ClientRegistry()
+    registry.register("apollo", max_connections=concurrency, verify=False)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await timed(lambda: registry.get("apollo"), url, fresh)
+
+    if not fresh:
+        await one()  # open the pool outside the measurement
+    timings = await asyncio.gather(*(one() for _ in range(calls)))
+    await registry.aclose()
+    return timings
+
+
+def run(args):
+    with FakeApollo(tls=True) as stub:
+        url = f"{stub.url}/mixed_people/search"
+        for concurrency in args.concurrency:
+            for fresh in (True, False):
+                started = time.perf_counter()
+                timings = asyncio.run(measure(url, args.calls, concurrency, fresh))
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{'fresh' if fresh else 'pooled':<7} concurrency={concurrency:<3} "
+                    f"p50={percentile(timings, 50) * 1000:6.2f}ms  p99={percentile(timings, 99) * 1000:6.2f}ms  "
+                    f"{args.calls / elapsed:7.1f} calls/s"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 10])
+    run(parser.parse_args())
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env
+
+
+# Time to build a large lead list in one /find-leads request against a mock
+# Apollo, with search pages fetched ahead and enriched while the previous
+# page is read (APOLLO_PAGE_PREFETCH). Also reports the Apollo calls made,
+# to show that stopping at the target doesn't enrich much past it.
+#
+#   cd service && python -m benchmarks.bench_prefetch --target 500 --prefetch 2
+
+async def measure(service, apollo: FakeApollo, args):
+    async with service.app.router.lifespan_context(service.app):
+        for target in args.target:
+            apollo.calls.clear()
+            service.enrichment_cache = service.EnrichmentCache(":memory:")
+            query = service.ApolloSearchRequest(job_title="Head of Learning", target_count=target)
+            started = time.perf_counter()
+            leads = (await service.find_leads(query))["results"]
+            elapsed = time.perf_counter() - started
+            print(
+                f"target={target:>5} leads={len(leads):>5}  {elapsed:6.2f}s  {len(leads) / elapsed:6.1f} leads/s  "
+                f"apollo calls {dict(sorted(apollo.calls.items()))}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--prefetch", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per mock Apollo call")
+    parser.add_argument("--people", type=int, default=2000, help="people the mock search returns in total")
+    args = parser.parse_args()
+
+    with FakeApollo(latency=args.latency, total_people=args.people) as apollo:
+        bench_env(apollo=apollo, APOLLO_PAGE_PREFETCH=args.prefetch, ENRICHMENT_CACHE_TTL=None)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(measure(service, apollo, args))
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env, percentile
+
+
+# /find-leads latency and Apollo reveal calls with phones revealed for every
+# search hit (APOLLO_REVEAL=eager) vs. only for the leads a user selects
+# (lazy, through /reveal-phones), against a mock Apollo. --selected leads
+# per search are revealed, then revealed again to check the second time
+# comes from the store.
+#
+#   cd service && python -m benchmarks.bench_reveal --selected 3
+
+async def measure(service, apollo: FakeApollo, args):
+    async with service.app.router.lifespan_context(service.app):
+        for mode in ("eager", "lazy"):
+            service.APOLLO_REVEAL = mode
+            apollo.calls.clear()
+            timings = []
+            for _ in range(args.runs):
+                # The mock returns the same people for every search; an empty
+                # cache makes each run pay for them as if they were new
+                service.enrichment_cache = service.EnrichmentCache(":memory:")
+                query = service.ApolloSearchRequest(job_title="Head of Learning", target_count=args.target)
+                started = time.perf_counter()
+                cards = (await service.find_leads(query))["results"]
+                timings.append(time.perf_counter() - started)
+            searched = apollo.calls["reveal"]
+
+            selected = [card["apollo_id"] for card in cards[:args.selected] if not card["revealed"]]
+            revealed = {}
+            for _ in range(2):
+                if selected:
+                    revealed = (await service.reveal_phones(service.RevealRequest(ids=selected)))["results"]
+            phones = sum(len(result["phones"]) for result in revealed.values())
+            print(
+                f"{mode:<6} search p50={percentile(timings, 50) * 1000:7.1f}ms  p99={percentile(timings, 99) * 1000:7.1f}ms  "
+                f"reveals during search={searched / args.runs:5.1f}/search  "
+                f"on select={apollo.calls['reveal'] - searched} for {len(selected)} leads selected twice ({phones} phones)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock Apollo call")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=int, default=20)
+    parser.add_argument("--selected", type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo, ENRICHMENT_CACHE_TTL=None)  # second reveals are read back from it
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(measure(service, apollo, args))
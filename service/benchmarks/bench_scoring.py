@@ -0,0 +1,31 @@
+import argparse
+import time
+
+from scoring import LeadScorer
+
+
+# Per-lead cost of the rule-based scorer on a synthetic batch.
+#
+#   cd service && python -m benchmarks.bench_scoring --leads 10000
+
+class Lead:
+    def __init__(self, i: int):
+        self.job_title = ("Head of Learning & Development", "HR Business Partner", "Software Engineer", "Talent Director")[i % 4]
+        self.description = "Passionate about upskilling people and building a learning culture" if i % 2 else None
+        self.company_description = "Regional bank with a workforce of 12,000 employees"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=10000)
+    args = parser.parse_args()
+
+    scorer = LeadScorer()
+    leads = [Lead(i) for i in range(args.leads)]
+    started = time.perf_counter()
+    scores = scorer.score_batch(leads)
+    elapsed = time.perf_counter() - started
+
+    tiers = {tier: sum(score.tier == tier for score in scores) for tier in ("High", "Medium", "Low")}
+    print(f"{args.leads} leads in {elapsed * 1000:.1f}ms  {elapsed / args.leads * 1e6:.1f}us/lead  {tiers}")
+    print(f"sample: {scores[0].label} {scores[0].matches}")
@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeApollo, bench_env, percentile
+
+
+# A burst of identical /find-leads searches from several SDRs at once, and
+# the same search repeated a minute later, with and without the search
+# cache, against a mock Apollo. The last caller of each burst excludes the
+# first two leads, to check it still gets target_count leads without them.
+#
+#   cd service && python -m benchmarks.bench_search_cache --callers 10
+
+async def burst(service, args) -> tuple[list[float], list]:
+    async def one(caller: int):
+        exclude = {"person0@example.com", "person1@example.com"} if caller == args.callers - 1 else set()
+        query = service.ApolloSearchRequest(job_title=" head of  Learning", target_count=args.target, exclude_emails=exclude)
+        started = time.perf_counter()
+        leads = (await service.find_leads(query))["results"]
+        return time.perf_counter() - started, leads
+
+    results = await asyncio.gather(*(one(caller) for caller in range(args.callers)))
+    return [elapsed for elapsed, _ in results], [leads for _, leads in results]
+
+
+async def measure(service, apollo: FakeApollo, args):
+    async with service.app.router.lifespan_context(service.app):
+        for label, ttl in (("no cache", 0), ("cache", 300)):
+            service.SEARCH_CACHE_TTL = ttl
+            service.search_cache = service.shared_searches.cache = service.TTLCache(
+                max_entries=service.SEARCH_CACHE_MAX_ENTRIES, ttl=ttl
+            )
+            service.enrichment_cache.ttl = 0  # every walk pays for enrichment
+            for run in ("burst", "repeat"):
+                apollo.calls.clear()
+                timings, results = await burst(service, args)
+                emails = [[lead["lead"]["email"] for lead in leads] for leads in results]
+                excluded_ok = len(emails[-1]) == args.target and not {"person0@example.com", "person1@example.com"} & set(emails[-1])
+                print(
+                    f"{label:<9}{run:<7} p50={percentile(timings, 50) * 1000:7.1f}ms  p99={percentile(timings, 99) * 1000:7.1f}ms  "
+                    f"apollo calls={sum(apollo.calls.values()):>4}  {dict(sorted(apollo.calls.items()))}  "
+                    f"excluding caller ok={excluded_ok}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=10)
+    parser.add_argument("--target", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock Apollo call")
+    args = parser.parse_args()
+
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo, SEARCH_CACHE_TTL=None, ENRICHMENT_CACHE_TTL=None)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(measure(service, apollo, args))
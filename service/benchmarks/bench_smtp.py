@@ -0,0 +1,63 @@
+import argparse
+import logging
+import smtplib
+import time
+
+from benchmarks.fakes import FakeSMTP
+from smtp_pool import SMTPPool
+
+
+# Messages per second for a batch sent the old way (new connection,
+# STARTTLS and LOGIN per message) versus through SMTPPool.send_batch,
+# against a local SMTP stand-in.
+#
+#   cd service && python -m benchmarks.bench_smtp --messages 200 --latency 0.005
+
+def connection_per_message(fake: FakeSMTP, messages: list[tuple[str, str, str]]):
+    host, port = fake.address
+    pool = SMTPPool(host, port, "bench@example.com", "secret", starttls=fake.starttls)
+    for to_email, subject, body in messages:
+        server = smtplib.SMTP(host, port)
+        if fake.starttls:
+            server.starttls()
+        server.login("bench@example.com", "secret")
+        server.sendmail("bench@example.com", to_email, pool.build_message(to_email, subject, body))
+        server.quit()
+
+
+def pooled(fake: FakeSMTP, messages: list[tuple[str, str, str]], size: int):
+    host, port = fake.address
+    pool = SMTPPool(host, port, "bench@example.com", "secret", size=size, starttls=fake.starttls)
+    results = pool.send_batch(messages)
+    pool.close()
+    failed = [result for result in results if result["status"] != "sent"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} messages failed: {failed[0]['error']}")
+
+
+def measure(label: str, send, fake: FakeSMTP, count: int):
+    connections, delivered = fake.connections, fake.messages
+    started = time.perf_counter()
+    send()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<24} {count / elapsed:8.1f} msg/s  {elapsed:6.2f}s  "
+        f"connections={fake.connections - connections:<4} delivered={fake.messages - delivered}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every SMTP reply")
+    parser.add_argument("--pool-sizes", type=lambda s: [int(n) for n in s.split(",")], default=[1, 4])
+    parser.add_argument("--no-tls", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    messages = [(f"lead{i}@example.com", "Exciting Opportunity", "Hello " * 40) for i in range(args.messages)]
+    with FakeSMTP(latency=args.latency, tls=not args.no_tls) as fake:
+        print(f"STARTTLS: {'on' if fake.starttls else 'off'}")
+        measure("connection per message", lambda: connection_per_message(fake, messages), fake, len(messages))
+        for size in args.pool_sizes:
+            measure(f"pool size={size}", lambda: pooled(fake, messages, size), fake, len(messages))
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import FakeApollo, bench_env
+
+
+# Time to first lead card vs. time to the full list for /find-leads, with
+# and without NDJSON streaming. Runs the app under a real uvicorn server,
+# since the in-process ASGI transport buffers the whole response body.
+#
+#   cd service && python -m benchmarks.bench_stream --target 50
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def measure(base_url: str, body: dict) -> tuple[float, float, int]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        started = time.perf_counter()
+        first = None
+        count = 0
+        async with client.stream("POST", "/find-leads", json=body) as response:
+            response.raise_for_status()
+            if not body.get("stream"):
+                count = len(json.loads(await response.aread())["results"])
+                first = time.perf_counter() - started
+            else:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    if first is None:
+                        first = time.perf_counter() - started
+                    if "lead" in json.loads(line):
+                        count += 1
+        return first, time.perf_counter() - started, count
+
+
+def run(args, app):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    body = {"job_title": "Head of Learning", "target_count": args.target}
+    try:
+        for stream in (False, True):
+            first, total, count = asyncio.run(measure(f"http://127.0.0.1:{port}", {**body, "stream": stream}))
+            print(f"{'ndjson' if stream else 'json':>6}  leads={count:>4}  first card={first * 1000:8.1f}ms  all={total * 1000:8.1f}ms")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock Apollo call")
+    parser.add_argument("--target", type=int, default=50)
+    args = parser.parse_args()
+
+    with FakeApollo(latency=args.latency) as apollo:
+        bench_env(apollo=apollo)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        run(args, service.app)
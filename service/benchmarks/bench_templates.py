@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fakes import FakeOpenAI, bench_env
+
+
+# Emails per second for each way of writing them: rendering a compiled
+# template directly, the pipeline's template stage, hybrid (template plus a
+# model-written opening line) and the LLM stages (one completion per lead,
+# multi-lead completions), against a mock OpenAI. --leads is the count for
+# the model-backed modes, --render-leads for the template ones.
+#
+#   cd service && python -m benchmarks.bench_templates
+
+def leads(service, tag: str, count: int) -> list:
+    # New names per mode, so no mode is served from another one's cache
+    return [
+        service.LeadRequest(
+            firstname=f"{tag}{i}", lastname="Lead", email=f"{tag}{i}@example.com", company=f"Company {i % 17}",
+            job_title="Head of Learning" if i % 3 else None, company_description="Regional bank with 4000 employees"
+        )
+        for i in range(count)
+    ]
+
+
+def report(label: str, count: int, elapsed: float, stub: FakeOpenAI | None = None):
+    calls = f"  openai calls={stub.calls['chat']:>5}  completion tokens={stub.usage['completion_tokens']:>7}" if stub else ""
+    print(f"{label:<16} emails={count:>6}  {elapsed:8.3f}s  {count / elapsed:10.0f} emails/s{calls}")
+
+
+async def measure(service, stub: FakeOpenAI, args):
+    template = service.email_template(args.template)
+    batch = leads(service, "render", args.render_leads)
+    started = time.perf_counter()
+    emails = template.render_batch(batch)
+    report(f"render {template.key}", len(emails), time.perf_counter() - started)
+
+    records = service.new_lead_records(leads(service, "stage", args.render_leads), template)
+    started = time.perf_counter()
+    await service.run_pipeline(records, [service.template_stage])
+    report("template stage", sum(1 for record in records if record["email"]), time.perf_counter() - started)
+
+    for label, stage, template_for_records in (
+        ("hybrid", service.hybrid_stage, template),
+        ("llm single", service.generate_stages["single"], None),
+        ("llm batched", service.generate_stages["batched"], None),
+    ):
+        records = service.new_lead_records(leads(service, label.replace(" ", ""), args.leads), template_for_records)
+        stub.calls.clear()
+        stub.usage.clear()
+        started = time.perf_counter()
+        await service.run_pipeline(records, [stage])
+        report(label, sum(1 for record in records if record["email"]), time.perf_counter() - started, stub)
+    await service.http_clients.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=100, help="leads for the hybrid and LLM modes")
+    parser.add_argument("--render-leads", type=int, default=100000, help="leads for the template modes")
+    parser.add_argument("--template", default="role")
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds of per-call overhead before the first token")
+    parser.add_argument("--tokens", type=int, default=150, help="words per email")
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    with FakeOpenAI(latency=args.latency, tokens=args.tokens, token_delay=args.token_delay) as stub:
+        bench_env(openai=stub)
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(measure(service, stub, args))
@@ -0,0 +1,519 @@
+import inspect
+import json
+import math
+import os
+import random
+import re
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local stand-ins for the providers the service talks to. Each fake runs a
+# threaded HTTP server on an ephemeral port, sleeps `latency` seconds per
+# call and counts calls per route so benchmarks can report provider usage.
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def bench_env(apollo=None, hubspot=None, openai=None, smtp=None, **overrides) -> dict:
+    # Sets the environment main reads on import, so call it before `import
+    # main`: providers pointed at the given fakes, no client-side pacing
+    # (measure the app, not the rate limiter), stores in memory and caches
+    # off so every run pays for its provider calls, and no bulk jobs.
+    # Keyword arguments override single variables; None leaves one at the
+    # app's default. -> the variables set
+    env = {
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+        "APOLLO_API_KEY": os.environ.get("APOLLO_API_KEY", "bench"),
+        "APOLLO_RATE_LIMIT": "0",
+        "HUBSPOT_RATE_LIMIT": "0",
+        "OPENAI_RATE_LIMIT": "0",
+        "ENRICHMENT_CACHE_PATH": ":memory:",
+        "ENRICHMENT_CACHE_TTL": "0",
+        "LEAD_INDEX_PATH": ":memory:",
+        "SEARCH_CACHE_TTL": "0",
+        "JOB_STORE_PATH": "",
+    }
+    if apollo:
+        env["APOLLO_BASE_URL"] = apollo.url
+    if hubspot:
+        env["HUBSPOT_BASE_URL"] = hubspot.url
+    if openai:
+        env["OPENAI_BASE_URL"] = f"{openai.url}/v1"
+    if smtp:
+        host, port = smtp.address
+        env.update(SMTP_HOST=host, SMTP_PORT=port, SMTP_USER="bench@example.com", SMTP_PASSWORD="secret", SMTP_STARTTLS="false")
+    env.update(overrides)
+    for name, value in env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = str(value)
+    return env
+
+
+def self_signed_cert() -> tuple[str, str] | None:
+    # (certfile, keyfile) for 127.0.0.1, or None when openssl is unavailable
+    directory = tempfile.mkdtemp(prefix="bench-tls-")
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=127.0.0.1", "-keyout", keyfile, "-out", certfile],
+            check=True, capture_output=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return certfile, keyfile
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients that hang up early (cancelled requests) aren't worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeServer:
+    # error_rate injects 500s; rate_limit (requests per second, sliding
+    # window) answers anything above it with a 429 and a Retry-After header;
+    # tls serves HTTPS with a throwaway self-signed certificate
+    def __init__(
+        self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, rate_limit: float = 0.0, tls: bool = False
+    ):
+        self.latency = latency
+        self.tls = tls
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.calls = Counter()
+        self.statuses = Counter()
+        self._window = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # Subclasses return a list of (method, compiled path regex, handler)
+    def routes(self):
+        return []
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{'https' if self.tls else 'http'}://{host}:{port}"
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def _retry_after(self) -> float | None:
+        if self.rate_limit <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0] >= 1:
+                self._window.popleft()
+            if len(self._window) >= self.rate_limit:
+                return 1 - (now - self._window[0])
+            self._window.append(now)
+        return None
+
+    def dispatch(self, method: str, path: str, body: dict):
+        for route_method, pattern, handler in self.routes():
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                with self._lock:
+                    self.calls[handler.__name__] += 1
+                retry_after = self._retry_after()
+                if retry_after is not None:
+                    return 429, {"error": "rate limited"}, {"Retry-After": str(math.ceil(retry_after))}
+                if self.latency:
+                    time.sleep(self.latency)
+                if self._should_fail():
+                    return 500, {"error": "injected failure"}
+                return handler(body, **match.groupdict())
+        return 404, {"error": f"no route for {method} {path}"}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else {}
+                status, payload, *headers = fake.dispatch(self.command, self.path.split("?")[0], body)
+                with fake._lock:
+                    fake.statuses[status] += 1
+                if inspect.isgenerator(payload):
+                    self._stream(status, payload)
+                    return
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers[0] if headers else {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, status: int, pieces):
+                # Server-sent events, one chunk per piece as the generator yields it
+                self.send_response(status)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for piece in pieces:
+                    data = piece.encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = do_POST = do_PATCH = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = _Server(("127.0.0.1", 0), self._handler_class())
+        if self.tls:
+            cert = self_signed_cert()
+            if cert is None:
+                raise RuntimeError("openssl is needed to serve a TLS fake")
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*cert)
+            # The handshake then happens on each connection's own thread
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True, do_handshake_on_connect=False)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeApollo(FakeServer):
+    # bulk_miss_every=n leaves every n-th person out of bulk_match results,
+    # the way Apollo returns null for people it couldn't match in a batch
+    def __init__(self, total_people: int = 200, bulk_miss_every: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.total_people = total_people
+        self.bulk_miss_every = bulk_miss_every
+
+    def routes(self):
+        return [
+            ("POST", re.compile(r"/mixed_people/search"), self.search),
+            ("POST", re.compile(r"/people/bulk_match"), self.bulk_match),
+            ("POST", re.compile(r"/people/match"), self.match),
+            ("POST", re.compile(r"/people/(?P<person_id>[^/]+)/reveal"), self.reveal),
+        ]
+
+    def person(self, index: int) -> dict:
+        return {
+            "id": f"p{index}",
+            "first_name": f"First{index}",
+            "last_name": f"Last{index}",
+            "title": "Head of Learning & Development",
+            "headline": "Building high-performing teams",
+            "linkedin_url": f"https://www.linkedin.com/in/person-{index}",
+            "email": None,
+            "organization": {
+                "name": f"Company {index % 17}",
+                "description": "Regional enterprise with a large workforce",
+                "linkedin_url": f"https://www.linkedin.com/company/company-{index % 17}",
+            },
+        }
+
+    def _index(self, value: str) -> int:
+        digits = re.findall(r"\d+", value or "")
+        return int(digits[-1]) if digits else 0
+
+    def search(self, body: dict):
+        page = int(body.get("page", 1))
+        per_page = int(body.get("per_page", 20))
+        start = (page - 1) * per_page
+        people = [self.person(i) for i in range(start, min(start + per_page, self.total_people))]
+        total_pages = (self.total_people + per_page - 1) // per_page
+        return 200, {
+            "people": people,
+            "pagination": {"page": page, "per_page": per_page, "total_entries": self.total_people, "total_pages": total_pages},
+        }
+
+    def match(self, body: dict):
+        index = self._index(body.get("linkedin_url"))
+        person = self.person(index)
+        person.update({
+            "email": f"person{index}@example.com",
+            "phone_numbers": [{"raw_number": f"+20 100 000 {index:04d}", "sanitized_number": f"+20100000{index:04d}"}],
+            "sanitized_phone": f"+20100000{index:04d}",
+        })
+        return 200, {"person": person}
+
+    def bulk_match(self, body: dict):
+        details = body.get("details", [])
+        if len(details) > 10:
+            return 422, {"error": "details is limited to 10 people"}
+        matches = []
+        for detail in details:
+            index = self._index(detail.get("linkedin_url"))
+            missed = self.bulk_miss_every and index % self.bulk_miss_every == 0
+            matches.append(None if missed else self.match(detail)[1]["person"])
+        return 200, {"status": "success", "matches": matches, "missing_records": matches.count(None)}
+
+    def reveal(self, body: dict, person_id: str):
+        index = self._index(person_id)
+        return 200, {"person": {
+            "id": person_id,
+            "sanitized_mobile_phone": f"+20111000{index:04d}",
+            "mobile_phone": f"+20 111 000 {index:04d}",
+        }}
+
+
+class FakeOpenAI(FakeServer):
+    # Chat completions, streamed or not. `latency` is the time to the first
+    # token and `token_delay` the gap between the following ones, so a whole
+    # completion takes latency + (tokens - 1) * token_delay either way.
+    # JSON-mode requests listing leads get {"emails": [...]} back, one
+    # `tokens`-word email per lead; drop_every=n leaves every n-th lead out.
+    # Token counts are rough (4 characters per prompt token, one token per
+    # word) but consistent between runs. max_tokens cuts completions short.
+    def __init__(self, tokens: int = 120, token_delay: float = 0.01, drop_every: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.drop_every = drop_every
+        self.usage = Counter()
+
+    def routes(self):
+        return [("POST", re.compile(r"(/v1)?/chat/completions"), self.chat)]
+
+    def _words(self, body: dict) -> list[str]:
+        name = re.findall(r"email to (\S+)", json.dumps(body.get("messages", [])))
+        words = [f"Dear {name[0] if name else 'there'},"] + [f" word{i}" for i in range(1, self.tokens)]
+        return words[:body.get("max_tokens") or len(words)]
+
+    def _batch_content(self, body: dict) -> tuple[str, int]:
+        leads = json.loads(body["messages"][-1]["content"])
+        emails = [
+            {"id": lead["id"], "email": f"Dear {lead['name']}," + "".join(f" word{i}" for i in range(1, self.tokens))}
+            for position, lead in enumerate(leads, 1)
+            if not (self.drop_every and position % self.drop_every == 0)
+        ]
+        return json.dumps({"emails": emails}), len(emails) * self.tokens
+
+    def chat(self, body: dict):
+        model = body.get("model", "gpt-3.5-turbo")
+        prompt_tokens = sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content, completion_tokens = self._batch_content(body)
+        else:
+            words = self._words(body)
+            if body.get("stream"):
+                with self._lock:
+                    self.usage.update(prompt_tokens=prompt_tokens, completion_tokens=len(words))
+                return 200, self._stream(model, words)
+            content, completion_tokens = "".join(words), len(words)
+        with self._lock:
+            self.usage.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        time.sleep(self.token_delay * max(0, completion_tokens - 1))
+        return 200, {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _stream(self, model: str, words: list[str]):
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(self.token_delay)
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+
+class FakeHubSpot(FakeServer):
+    def __init__(self, existing_emails: list[str] = (), **kwargs):
+        super().__init__(**kwargs)
+        self.contacts = {}  # lowercased email -> contact
+        for email in existing_emails:
+            self._create({"email": email})
+
+    def routes(self):
+        base = "/crm/v3/objects/contacts"
+        return [
+            ("POST", re.compile(f"{base}/search"), self.search),
+            ("POST", re.compile(f"{base}/batch/read"), self.batch_read),
+            ("POST", re.compile(f"{base}/batch/create"), self.batch_create),
+            ("POST", re.compile(f"{base}/batch/update"), self.batch_update),
+            ("POST", re.compile(base), self.create),
+            ("PATCH", re.compile(f"{base}/(?P<contact_id>\\d+)"), self.update),
+        ]
+
+    def _create(self, properties: dict) -> dict:
+        with self._lock:
+            contact = {"id": str(len(self.contacts) + 1), "properties": dict(properties)}
+            self.contacts[(properties.get("email") or "").lower()] = contact
+        return contact
+
+    def _update(self, contact_id: str, properties: dict) -> dict | None:
+        for contact in self.contacts.values():
+            if contact["id"] == contact_id:
+                contact["properties"].update(properties)
+                return contact
+        return None
+
+    def search(self, body: dict):
+        email = (body["filterGroups"][0]["filters"][0]["value"] or "").lower()
+        contact = self.contacts.get(email)
+        return 200, {"total": int(bool(contact)), "results": [contact] if contact else []}
+
+    def create(self, body: dict):
+        return 201, self._create(body["properties"])
+
+    def update(self, body: dict, contact_id: str):
+        contact = self._update(contact_id, body["properties"])
+        return (200, contact) if contact else (404, {"message": "not found"})
+
+    def _check_batch(self, body: dict):
+        if len(body.get("inputs", [])) > 100:
+            return 400, {"message": "batch inputs are limited to 100"}
+        return None
+
+    def batch_read(self, body: dict):
+        error = self._check_batch(body)
+        if error:
+            return error
+        found = [self.contacts[item["id"].lower()] for item in body["inputs"] if item["id"].lower() in self.contacts]
+        status = 200 if len(found) == len(body["inputs"]) else 207
+        return status, {"status": "COMPLETE", "results": found}
+
+    def batch_create(self, body: dict):
+        return self._check_batch(body) or (201, {"status": "COMPLETE", "results": [self._create(item["properties"]) for item in body["inputs"]]})
+
+    def batch_update(self, body: dict):
+        error = self._check_batch(body)
+        if error:
+            return error
+        updated = [self._update(item["id"], item["properties"]) for item in body["inputs"]]
+        return 200, {"status": "COMPLETE", "results": [contact for contact in updated if contact]}
+
+class FakeSMTP:
+    """Minimal ESMTP server: STARTTLS (when a cert is available), AUTH PLAIN,
+    MAIL/RCPT/DATA. `latency` is added to every reply to emulate a network
+    round trip, which is what makes per-message handshakes expensive.
+    `error_rate` rejects that share of messages with a 451 after DATA, and
+    recipients in `refuse` get a 550 at RCPT."""
+
+    def __init__(self, latency: float = 0.0, tls: bool = True, error_rate: float = 0.0, seed: int = 0, refuse=()):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.refuse = {address.lower() for address in refuse}
+        self.connections = 0
+        self.messages = 0
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._context = None
+        cert = self_signed_cert() if tls else None
+        if cert:
+            self._context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self._context.load_cert_chain(*cert)
+        self._server = None
+
+    @property
+    def starttls(self) -> bool:
+        return self._context is not None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def reply(self, line: str):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                self.wfile.write(line.encode() + b"\r\n")
+                self.wfile.flush()
+
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                secure = False
+                self.reply("220 fake ESMTP ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors="replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO"):
+                        self.wfile.write(b"250-fake\r\n")
+                        if fake.starttls and not secure:
+                            self.wfile.write(b"250-STARTTLS\r\n")
+                        self.reply("250 AUTH PLAIN LOGIN")
+                    elif verb == "STARTTLS" and fake.starttls:
+                        self.reply("220 ready to start TLS")
+                        self.connection = fake._context.wrap_socket(self.connection, server_side=True)
+                        self.rfile = self.connection.makefile("rb")
+                        self.wfile = self.connection.makefile("wb")
+                        secure = True
+                    elif verb == "AUTH":
+                        self.reply("235 authenticated")
+                    elif verb == "RCPT" and fake.refuse and any(address in command.lower() for address in fake.refuse):
+                        self.reply("550 no such user")
+                    elif verb == "DATA":
+                        self.reply("354 end with <CRLF>.<CRLF>")
+                        while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                            pass
+                        with fake._lock:
+                            failed = fake.error_rate > 0 and fake._random.random() < fake.error_rate
+                            fake.rejected += failed
+                            fake.messages += not failed
+                        self.reply("451 injected failure" if failed else "250 queued")
+                    elif verb == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("250 ok")
+
+        return Handler
+
+    def __enter__(self):
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.fakes import FakeApollo, FakeHubSpot, FakeOpenAI, FakeSMTP, bench_env, percentile
+
+
+# Load test for /find-leads, /process-leads and /create-lead against local
+# stand-ins for Apollo, HubSpot, OpenAI and SMTP, with configurable latency
+# and error rates. The app runs in-process behind an ASGI client; each
+# endpoint gets --requests requests from --concurrency workers and reports
+# throughput, p50/p95/p99 and the provider calls it made. --output writes
+# the run as JSON, and --baseline compares against such a file, exiting 1
+# when an endpoint's p95 or throughput is more than --tolerance worse.
+#
+#   cd service && python -m benchmarks.loadtest --output benchmarks/baseline.json
+#   cd service && python -m benchmarks.loadtest --baseline benchmarks/baseline.json
+
+def lead(tag: str, index: int) -> dict:
+    # Every request gets new people, so nothing is served from the email
+    # cache or skipped by the lead index
+    return {
+        "firstname": f"Load{tag}{index}", "lastname": "Lead", "email": f"load-{tag}-{index}@example.com",
+        "phone": "+20100000000", "company": f"Company {index % 13}", "job_title": "Head of Learning",
+    }
+
+
+def scenarios(args) -> dict:
+    # endpoint -> body for the n-th request
+    return {
+        "/find-leads": lambda n: {"job_title": "Head of Learning", "target_count": args.target},
+        "/process-leads": lambda n: {
+            "leads": [lead(f"p{n}", i) for i in range(args.batch)], "send_immediately": True
+        },
+        "/create-lead": lambda n: lead("c", n),
+    }
+
+
+async def drive(client: httpx.AsyncClient, path: str, body, args) -> dict:
+    latencies, statuses = [], Counter()
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request
+        while next_request < args.requests:
+            n, next_request = next_request, next_request + 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body(n))
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def measure(service, fakes: dict, args) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=service.app)
+    # ASGITransport doesn't send lifespan events, so run startup/shutdown here
+    async with service.app.router.lifespan_context(service.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            for path, body in scenarios(args).items():
+                if args.only and path not in args.only:
+                    continue
+                before = {name: Counter(fake.calls) for name, fake in fakes.items() if name != "smtp"}
+                smtp_before = fakes["smtp"].messages + fakes["smtp"].rejected
+                results[path] = await drive(client, path, body, args)
+                calls = {
+                    f"{name}.{route}": count
+                    for name, calls_before in before.items()
+                    for route, count in sorted((fakes[name].calls - calls_before).items())
+                }
+                smtp = fakes["smtp"].messages + fakes["smtp"].rejected - smtp_before
+                if smtp:
+                    calls["smtp.messages"] = smtp
+                results[path]["provider_calls"] = calls
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    # Prints each endpoint against the baseline; True if any regressed
+    regressed = False
+    print(f"\ncompared with the baseline (tolerance {tolerance:.0%}):")
+    for path, current in results.items():
+        before = baseline["endpoints"].get(path)
+        if before is None:
+            print(f"{path:<16} not in the baseline")
+            continue
+        p95 = current["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        throughput = current["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        worse = p95 > tolerance or throughput < -tolerance or current["errors"] > before["errors"]
+        regressed |= worse
+        print(
+            f"{path:<16} p95 {before['p95_ms']:8.1f} -> {current['p95_ms']:8.1f}ms ({p95:+.0%})  "
+            f"throughput {before['throughput_rps']:7.2f} -> {current['throughput_rps']:7.2f}/s ({throughput:+.0%})  "
+            f"errors {before['errors']} -> {current['errors']}" + ("  REGRESSION" if worse else "")
+        )
+    return regressed
+
+
+def run(args) -> int:
+    with (
+        FakeApollo(latency=args.apollo, error_rate=args.error_rate) as apollo,
+        FakeHubSpot(latency=args.hubspot, error_rate=args.error_rate) as hubspot,
+        FakeOpenAI(latency=args.openai, tokens=args.tokens, token_delay=0, error_rate=args.error_rate) as openai_stub,
+        FakeSMTP(latency=args.smtp, tls=False, error_rate=args.error_rate) as smtp,
+    ):
+        bench_env(apollo=apollo, hubspot=hubspot, openai=openai_stub, smtp=smtp, JOB_STORE_PATH=":memory:")
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+
+        fakes = {"apollo": apollo, "hubspot": hubspot, "openai": openai_stub, "smtp": smtp}
+        results = asyncio.run(measure(service, fakes, args))
+
+    for path, result in results.items():
+        print(
+            f"{path:<16} {result['requests']:>4} requests  {result['errors']:>3} errors  "
+            f"{result['throughput_rps']:7.2f}/s  p50={result['p50_ms']:8.1f}ms  "
+            f"p95={result['p95_ms']:8.1f}ms  p99={result['p99_ms']:8.1f}ms"
+        )
+        print(f"{'':<16} provider calls {result['provider_calls']}")
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "endpoints": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nwrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("note: the baseline was recorded with different settings")
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="*", help="endpoints to run, e.g. /find-leads")
+    parser.add_argument("--target", type=int, default=20, help="target_count for /find-leads")
+    parser.add_argument("--batch", type=int, default=10, help="leads per /process-leads request")
+    parser.add_argument("--apollo", type=float, default=0.05, help="seconds per mock Apollo call")
+    parser.add_argument("--hubspot", type=float, default=0.05, help="seconds per mock HubSpot call")
+    parser.add_argument("--openai", type=float, default=0.3, help="seconds per mock OpenAI completion")
+    parser.add_argument("--smtp", type=float, default=0.005, help="seconds per mock SMTP reply")
+    parser.add_argument("--tokens", type=int, default=120, help="words per mock completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of provider calls that fail")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON file written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,181 @@
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+
+
+# Index of leads the app has already found, processed or emailed, so a
+# search can drop them before paying for their enrichment. A lead is stored
+# under every key it is known by (email, Apollo id, LinkedIn URL) with the
+# furthest status it reached. A Bloom filter in front of the table answers
+# "never seen" from memory, so most lookups don't touch SQLite at all; a
+# possible hit is confirmed against the table.
+
+STATUSES = ("found", "processed", "emailed")  # in order of progress
+
+
+def normalize_linkedin_url(url: str | None) -> str | None:
+    if not url:
+        return None
+    url = url.strip().lower().split("?")[0].rstrip("/")
+    for prefix in ("https://", "http://", "www."):
+        if url.startswith(prefix):
+            url = url[len(prefix):]
+    return url or None
+
+
+def normalize_email(email: str | None) -> str | None:
+    email = (email or "").strip().lower()
+    # Apollo's placeholder for locked emails would make everybody the same lead
+    if not email or "@" not in email or email.startswith("email_not_unlocked@"):
+        return None
+    return email
+
+
+def lead_keys(*people: dict | None) -> list[str]:
+    keys = []
+    for person in people:
+        if not person:
+            continue
+        email = normalize_email(person.get("email"))
+        if email:
+            keys.append(f"email:{email}")
+        if person.get("id"):
+            keys.append(f"id:{person['id']}")
+        linkedin_url = normalize_linkedin_url(person.get("linkedin_url"))
+        if linkedin_url:
+            keys.append(f"linkedin:{linkedin_url}")
+    return list(dict.fromkeys(keys))
+
+
+# Keys the enrichment cache stores a person under: a search result has no
+# email yet, so only the Apollo id and LinkedIn URL
+def person_keys(*people: dict | None) -> list[str]:
+    keys = []
+    for person in people:
+        if not person:
+            continue
+        if person.get("id"):
+            keys.append(f"id:{person['id']}")
+        linkedin_url = normalize_linkedin_url(person.get("linkedin_url"))
+        if linkedin_url:
+            keys.append(f"linkedin:{linkedin_url}")
+    return list(dict.fromkeys(keys))
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class LeadIndex:
+    def __init__(self, path: str, capacity: int = 100000, error_rate: float = 0.01):
+        self.error_rate = error_rate
+        self.lookups = 0
+        self.filtered = 0  # lookups the Bloom filter answered on its own
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_leads ("
+            "key TEXT PRIMARY KEY, status INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        with self._lock:
+            self._rebuild(capacity)
+
+    def _rebuild(self, capacity: int):
+        # Filled before it replaces the old filter, which maybe_seen() reads
+        # without the lock
+        rows = self._conn.execute("SELECT COUNT(*) FROM seen_leads").fetchone()[0]
+        bloom = BloomFilter(max(capacity, 2 * rows), self.error_rate)
+        for (key,) in self._conn.execute("SELECT key FROM seen_leads"):
+            bloom.add(key)
+        self._bloom = bloom
+
+    def add(self, keys: list[str], status: str):
+        if not keys:
+            return
+        rank = STATUSES.index(status)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO seen_leads (key, status, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET status = MAX(status, excluded.status), updated_at = excluded.updated_at",
+                [(key, rank, now) for key in keys],
+            )
+            for key in keys:
+                if key not in self._bloom:
+                    self._bloom.add(key)
+            # Past its capacity the filter's false positive rate climbs, so
+            # start over with twice the room
+            if self._bloom.count > self._bloom.capacity:
+                self._rebuild(self._bloom.capacity * 2)
+
+    def status(self, keys: list[str]) -> str | None:
+        # Furthest status recorded under any of the keys, or None if unseen
+        with self._lock:
+            self.lookups += 1
+            candidates = [key for key in keys if key in self._bloom]
+            if not candidates:
+                self.filtered += 1
+                return None
+            placeholders = ",".join("?" * len(candidates))
+            rank = self._conn.execute(
+                f"SELECT MAX(status) FROM seen_leads WHERE key IN ({placeholders})", candidates
+            ).fetchone()[0]
+            if rank is None:
+                return None
+            self.hits += 1
+            return STATUSES[rank]
+
+    def maybe_seen(self, keys: list[str]) -> bool:
+        # The Bloom filter on its own, without the lock or SQLite, so async
+        # callers can ask it on the event loop: False means none of the keys
+        # was ever added, True needs confirming with status()
+        if any(key in self._bloom for key in keys):
+            return True
+        self.lookups += 1
+        self.filtered += 1
+        return False
+
+    def seen(self, keys: list[str], statuses: set[str]) -> bool:
+        return bool(statuses) and self.status(keys) in statuses
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = self._conn.execute("SELECT COUNT(*) FROM seen_leads").fetchone()[0]
+            return {
+                "keys": keys,
+                "lookups": self.lookups,
+                "filtered": self.filtered,
+                "hits": self.hits,
+                "bloom_capacity": self._bloom.capacity,
+                "bloom_bytes": len(self._bloom._bits),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
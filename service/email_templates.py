@@ -0,0 +1,144 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+
+# Named, versioned outreach email templates. A body is plain text with
+# {field} placeholders for lead fields, {field|fallback} for fields that
+# may be empty, and {{ / }} for literal braces. {opening} is the line
+# hybrid generation asks the model for; rendered without one it falls
+# back like any other field. Bodies are compiled once into literal pieces
+# and field lookups, so rendering an email is a single join.
+
+TEMPLATE_FIELDS = ("firstname", "lastname", "company", "job_title", "company_description", "opening")
+TOKEN = re.compile(r"\{\{|\}\}|\{(\w+)(?:\|([^{}]*))?\}|[{}]")
+
+DEFAULT_TEMPLATES = [
+    {
+        "name": "intro",
+        "version": 1,
+        "body": (
+            "Dear {firstname},\n\n"
+            "{opening|I hope this email finds you well.} I am reaching out from SkillUp MENA, the pioneer of "
+            "e-learning services. We offer a vast curated library of over 85,000 courses from the world's leading "
+            "training providers.\n\n"
+            "Given your role at {company}, I believe we could provide significant value to your organization's "
+            "training needs.\n\n"
+            "Would you be open to a brief call to discuss how we can support your team's development?\n\n"
+            "Best regards,\n"
+            "SkillUp MENA Team"
+        ),
+    },
+    {
+        "name": "role",
+        "version": 1,
+        "body": (
+            "Dear {firstname},\n\n"
+            "{opening|I hope this email finds you well.} As {job_title|a leader} at {company}, you know how much "
+            "your team's growth depends on the right training.\n\n"
+            "SkillUp MENA gives organizations like yours one curated library of over 85,000 e-learning courses "
+            "from the world's leading training providers, with the reporting your L&D team needs.\n\n"
+            "Would you be open to a short call next week?\n\n"
+            "Best regards,\n"
+            "SkillUp MENA Team"
+        ),
+    },
+]
+
+
+def compile_body(body: str) -> tuple[str, tuple]:
+    # -> (leading text, ((field, fallback, text after it), ...))
+    head, pieces = None, []
+    literal, position = [], 0
+    for match in TOKEN.finditer(body):
+        literal.append(body[position:match.start()])
+        position = match.end()
+        token = match.group()
+        if token in ("{{", "}}"):
+            literal.append(token[0])
+            continue
+        name = match.group(1)
+        if name is None:
+            raise ValueError(f"Unmatched {token!r} at position {match.start()}")
+        if name not in TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown template field {name!r}, expected one of {', '.join(TEMPLATE_FIELDS)}")
+        if head is None:
+            head = "".join(literal)
+        else:
+            pieces[-1][2] = "".join(literal)
+        pieces.append([name, match.group(2) or "", ""])
+        literal = []
+    literal.append(body[position:])
+    if head is None:
+        return "".join(literal), ()
+    pieces[-1][2] = "".join(literal)
+    return head, tuple(tuple(piece) for piece in pieces)
+
+
+@dataclass(slots=True)
+class EmailTemplate:
+    name: str
+    version: int
+    body: str
+    _head: str = field(init=False, repr=False)
+    _pieces: tuple = field(init=False, repr=False)
+
+    def __post_init__(self):
+        try:
+            self._head, self._pieces = compile_body(self.body)
+        except ValueError as e:
+            raise ValueError(f"Template {self.name}@{self.version}: {e}") from None
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    @property
+    def uses_opening(self) -> bool:
+        return any(name == "opening" for name, _, _ in self._pieces)
+
+    def render(self, lead, opening: str | None = None) -> str:
+        parts = [self._head]
+        for name, fallback, text in self._pieces:
+            value = opening if name == "opening" else getattr(lead, name, None)
+            parts.append(value or fallback)
+            parts.append(text)
+        return "".join(parts)
+
+    def render_batch(self, leads: list, openings: list | None = None) -> list[str]:
+        if openings is None:
+            return [self.render(lead) for lead in leads]
+        return [self.render(lead, opening) for lead, opening in zip(leads, openings)]
+
+
+class TemplateLibrary:
+    # Templates by "name@version"; a bare name means its highest version
+    def __init__(self, templates: list[dict] | None = None):
+        self._templates = {}
+        self._latest = {}
+        for spec in DEFAULT_TEMPLATES if templates is None else templates:
+            self.add(EmailTemplate(**spec))
+
+    @classmethod
+    def from_file(cls, path: str) -> "TemplateLibrary":
+        # The built-in templates plus a JSON list of {"name", "version",
+        # "body"} objects; a file entry replaces a built-in with the same
+        # name and version
+        with open(path) as f:
+            return cls(DEFAULT_TEMPLATES + json.load(f))
+
+    def add(self, template: EmailTemplate):
+        self._templates[template.key] = template
+        latest = self._latest.get(template.name)
+        if latest is None or template.version >= latest.version:
+            self._latest[template.name] = template
+
+    def get(self, ref: str) -> EmailTemplate:
+        # Raises KeyError for an unknown name or version
+        template = self._templates.get(ref) if "@" in ref else self._latest.get(ref)
+        if template is None:
+            raise KeyError(ref)
+        return template
+
+    def templates(self) -> list[EmailTemplate]:
+        return sorted(self._templates.values(), key=lambda template: (template.name, template.version))
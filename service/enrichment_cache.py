@@ -0,0 +1,115 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+# On-disk cache of Apollo people/match + reveal results. An entry is stored
+# under every key the caller knows the person by (Apollo id and LinkedIn
+# URL, see dedup.person_keys), so a later search hits it whichever of the
+# two it returns. Entries expire after `ttl` seconds and the least recently
+# used ones are evicted once the table holds more than `max_entries` keys.
+# Phone reveals cost credits, so they are also kept in a separate table that
+# never expires.
+
+class EnrichmentCache:
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enrichments ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS enrichments_accessed_at ON enrichments (accessed_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS revealed (key TEXT PRIMARY KEY, value TEXT NOT NULL, revealed_at REAL NOT NULL)"
+        )
+
+    def get(self, keys: list[str]) -> dict | None:
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT value, stored_at FROM enrichments WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                if now - row[1] > self.ttl:
+                    self._conn.execute("DELETE FROM enrichments WHERE key = ?", (key,))
+                    continue
+                self._conn.execute("UPDATE enrichments SET accessed_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def set_many(self, entries: list[tuple[list[str], dict]]):
+        # entries: (keys, value) pairs, written in a single transaction
+        if not entries:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(value), now, now) for keys, value in entries for key in keys]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO enrichments (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)", rows
+                )
+                self._evict(now)
+            except BaseException:
+                # Otherwise the connection stays inside the transaction and
+                # every later BEGIN fails
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get_revealed(self, keys: list[str]) -> dict | None:
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute("SELECT value FROM revealed WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    return json.loads(row[0])
+        return None
+
+    def set_revealed(self, keys: list[str], value: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO revealed (key, value, revealed_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key in keys]
+            )
+
+    def _evict(self, now: float):
+        expired = self._conn.execute("DELETE FROM enrichments WHERE stored_at < ?", (now - self.ttl,)).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM enrichments").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM enrichments WHERE key IN (SELECT key FROM enrichments ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+        self.evictions += expired + max(0, overflow)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM enrichments").fetchone()[0]
+            revealed = self._conn.execute("SELECT COUNT(*) FROM revealed").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "revealed": revealed,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
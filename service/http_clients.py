@@ -0,0 +1,73 @@
+import importlib.util
+import itertools
+import logging
+import math
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+# Pooled, keep-alive httpx clients per provider for the app's lifetime, so
+# calls reuse open connections instead of paying DNS, TCP and TLS setup
+# every time. Clients are created by start() at startup (or on first use
+# outside the app, e.g. from a script) and closed by aclose().
+#
+# A provider's connections are split over several clients of at most
+# `shard_size` connections, handed out round-robin: httpcore rescans its
+# whole pool for every queued request, which gets slow with dozens of busy
+# connections behind one client.
+
+class ClientRegistry:
+    def __init__(self, shard_size: int = 8):
+        self.shard_size = max(1, shard_size)
+        self._configs = {}
+        self._clients = {}
+        self._cycles = {}
+
+    def register(
+        self,
+        name: str,
+        timeout: float = 15,
+        max_connections: int = 20,
+        keepalive_expiry: float = 30,
+        http2: bool = False,
+        shard_size: int | None = None,
+        **client_kwargs,
+    ):
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning(f"HTTP/2 requested for {name} but h2 is not installed, using HTTP/1.1")
+            http2 = False
+        max_connections = max(1, max_connections)
+        shards = math.ceil(max_connections / max(1, shard_size or self.shard_size))
+        per_shard = math.ceil(max_connections / shards)
+        self._configs[name] = (shards, {
+            "timeout": timeout,
+            "limits": httpx.Limits(
+                max_connections=per_shard,
+                max_keepalive_connections=per_shard,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            "http2": http2,
+            **client_kwargs,
+        })
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        clients = self._clients.get(name)
+        if clients is None or clients[0].is_closed:
+            shards, config = self._configs[name]
+            clients = self._clients[name] = [httpx.AsyncClient(**config) for _ in range(shards)]
+            self._cycles[name] = itertools.cycle(clients)
+        return next(self._cycles[name])
+
+    def start(self):
+        for name in self._configs:
+            self.get(name)
+
+    async def aclose(self):
+        clients, self._clients, self._cycles = self._clients, {}, {}
+        for shard in clients.values():
+            for client in shard:
+                await client.aclose()
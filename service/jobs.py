@@ -0,0 +1,420 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+# Background jobs for bulk work. A job is a list of JSON items plus an
+# options dict, persisted in SQLite together with one row per item, so
+# progress and partial results survive a restart. A running job is leased
+# to the runner that claimed it (claimed_by), which renews the lease by
+# touching updated_at while it works; a job whose lease has gone stale,
+# because its process died, goes back to the queue and only its unfinished
+# items are processed again. Jobs still importing after import_timeout were
+# abandoned by their upload and are failed. Large jobs are imported,
+# processed and read back in chunks, so none of that needs the whole job
+# in memory.
+
+class JobStore:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, options TEXT NOT NULL, "
+            "total INTEGER NOT NULL, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, claimed_by TEXT)"
+        )
+        # Databases created before leases
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "claimed_by" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, status TEXT NOT NULL, item TEXT NOT NULL, result TEXT, "
+            "PRIMARY KEY (job_id, idx))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def create(self, kind: str, items: list[dict], options: dict | None = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, status, options, total, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(options or {}), len(items), now, now)
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, status, item) VALUES (?, ?, 'pending', ?)",
+                    [(job_id, idx, json.dumps(item)) for idx, item in enumerate(items)]
+                )
+            except BaseException:
+                # Otherwise the shared connection stays inside the
+                # transaction and every later BEGIN fails
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def start_import(self, kind: str, options: dict | None = None) -> str:
+        # A job that add_items() fills chunk by chunk; it isn't picked up
+        # until finish_import()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, options, total, created_at, updated_at) VALUES (?, ?, 'importing', ?, 0, ?, ?)",
+                (job_id, kind, json.dumps(options or {}), now, now)
+            )
+        return job_id
+
+    def add_items(self, job_id: str, rows: list[tuple[int, dict, dict | None]]):
+        # (idx, item, result) rows; a row with a result is stored as already
+        # failed, e.g. an input line that didn't parse
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, status, item, result) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (job_id, idx, "pending" if result is None else "failed", json.dumps(item), None if result is None else json.dumps(result))
+                        for idx, item, result in rows
+                    ]
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET total = total + ?, updated_at = ? WHERE id = ?", (len(rows), time.time(), job_id)
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def finish_import(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE id = ? AND status = 'importing'", (time.time(), job_id)
+            )
+
+    def claim_next(self, owner: str) -> dict | None:
+        # Oldest queued job, flipped to running and leased to owner so no
+        # other worker takes it. The status check in the UPDATE keeps this
+        # safe across processes sharing the same database file.
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', claimed_by = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (owner, time.time(), row[0])
+                ).rowcount
+                if claimed:
+                    break
+        return self.get(row[0])
+
+    def pending_items(self, job_id: str, after: int = -1, limit: int = -1) -> list[tuple[int, dict]]:
+        # Pending items with idx > after, up to limit (-1: all of them)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, item FROM job_items WHERE job_id = ? AND status = 'pending' AND idx > ? ORDER BY idx LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+        return [(idx, json.loads(item)) for idx, item in rows]
+
+    def record_results(self, job_id: str, results: list[tuple[int, dict, bool]]):
+        # (idx, result, failed) rows, committed together
+        if not results:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE job_items SET status = ?, result = ? WHERE job_id = ? AND idx = ?",
+                    [("failed" if failed else "done", json.dumps(result), job_id, idx) for idx, result, failed in results]
+                )
+                self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def finish(self, job_id: str, error: str | None = None, owner: str | None = None):
+        # With an owner, only while the job is still leased to it
+        with self._lock:
+            if owner is None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    ("failed" if error else "completed", error, time.time(), job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                    ("failed" if error else "completed", error, time.time(), job_id, owner)
+                )
+
+    def renew(self, owner: str, job_ids: list[str]) -> set[str]:
+        # Extends owner's leases on job_ids -> the ids it still holds
+        if not job_ids:
+            return set()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                held = {
+                    job_id for job_id in job_ids
+                    if self._conn.execute(
+                        "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                        (time.time(), job_id, owner)
+                    ).rowcount
+                }
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return held
+
+    def release(self, owner: str) -> int:
+        # Owner's running jobs back to the queue, on a clean shutdown
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', claimed_by = NULL, updated_at = ? WHERE status = 'running' AND claimed_by = ?",
+                (time.time(), owner)
+            ).rowcount
+
+    def requeue_stale(self, lease_seconds: float) -> int:
+        # Running jobs whose lease wasn't renewed in lease_seconds
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', claimed_by = NULL, updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now, now - lease_seconds)
+            ).rowcount
+
+    def expire_imports(self, timeout: float) -> int:
+        # Imports that haven't added a chunk in timeout seconds
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Import abandoned', updated_at = ? WHERE status = 'importing' AND updated_at < ?",
+                (now, now - timeout)
+            ).rowcount
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, options, total, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "options": json.loads(row[3]),
+            "total": row[4],
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "pending": counts.get("pending", 0),
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100, after: int = -1) -> list[dict]:
+        # Finished items with idx > after, in submission order
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, status, result FROM job_items WHERE job_id = ? AND idx > ? AND status != 'pending' "
+                "ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, after, limit, offset)
+            ).fetchall()
+        return [{"index": idx, "status": status, "result": json.loads(result)} for idx, status, result in rows]
+
+    def iter_results(self, job_id: str, page_size: int = 500):
+        # Every finished item, in pages of page_size read one at a time
+        after = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT idx, status, result FROM job_items WHERE job_id = ? AND idx > ? AND status != 'pending' "
+                    "ORDER BY idx LIMIT ?",
+                    (job_id, after, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [{"index": idx, "status": status, "result": json.loads(result)} for idx, status, result in rows]
+            after = rows[-1][0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobRunner:
+    # Runs queued jobs on `workers` asyncio tasks. Each job kind has an
+    # `async handler(job, items, on_result)`, where items is a list of up
+    # to `chunk_size` (idx, item) pairs still pending and
+    # on_result(idx, result, failed) records each item once it is finished.
+    # The handler is called once per chunk. Results are written in one
+    # transaction at the end of each chunk, and every flush_interval seconds
+    # while a slow chunk runs, so progress stays visible. Every lease_seconds / 3
+    # the runner renews the leases on its jobs, stops working on any it lost,
+    # and requeues other runners' stale jobs and expires abandoned imports.
+    # Store calls run in worker threads, off the event loop; a store error
+    # is logged and the runner carries on.
+
+    def __init__(
+        self, store: JobStore, workers: int = 2, poll_interval: float = 1.0, chunk_size: int = 1000,
+        lease_seconds: float = 60, import_timeout: float = 3600, flush_interval: float = 1.0
+    ):
+        self.store = store
+        self.handlers = {}
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.chunk_size = max(1, chunk_size)
+        self.lease_seconds = lease_seconds
+        self.import_timeout = import_timeout
+        self.flush_interval = flush_interval
+        self.owner = uuid.uuid4().hex
+        self._wakeup = None
+        self._tasks = []
+        self._running = {}  # job id -> the task running it
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        # Jobs this runner was working on go back to the queue for the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await asyncio.to_thread(self.store.release, self.owner)
+        if released:
+            logger.info(f"Released {released} unfinished job(s)")
+
+    async def _expire(self):
+        requeued = await asyncio.to_thread(self.store.requeue_stale, self.lease_seconds)
+        if requeued:
+            logger.info(f"Resuming {requeued} interrupted job(s)")
+            self.notify()
+        expired = await asyncio.to_thread(self.store.expire_imports, self.import_timeout)
+        if expired:
+            logger.warning(f"Failed {expired} abandoned import(s)")
+
+    async def _maintain(self):
+        # The first pass, right at start, resumes jobs a dead runner left behind
+        while True:
+            try:
+                # Only the jobs renewed here; others may start meanwhile
+                running = dict(self._running)
+                held = await asyncio.to_thread(self.store.renew, self.owner, list(running))
+                for job_id, task in running.items():
+                    if job_id not in held and not task.done():
+                        logger.warning(f"Lost the lease on job {job_id}, stopping it")
+                        task.cancel()
+                await self._expire()
+            except sqlite3.Error as e:
+                logger.error(f"Job lease maintenance failed: {e}")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _work(self):
+        while True:
+            # Clear before looking, so a notify() that lands in between isn't lost
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.store.claim_next, self.owner)
+            except sqlite3.Error as e:
+                logger.error(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Run in a task of its own, so losing the lease cancels the job
+            # and not this worker
+            task = asyncio.create_task(self._run(job))
+            self._running[job["job_id"]] = task
+            try:
+                await asyncio.wait([task])
+                if not task.cancelled() and task.exception() is not None:
+                    # The store failed while finishing the job; its lease
+                    # lapses and another pass picks it up again
+                    logger.error(f"Job {job['job_id']} stopped: {task.exception()}")
+            finally:
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                self._running.pop(job["job_id"], None)
+
+    async def _run(self, job: dict):
+        job_id = job["job_id"]
+
+        results = []
+
+        def on_result(idx: int, result: dict, failed: bool = False):
+            results.append((idx, result, failed))
+
+        async def flush():
+            nonlocal results
+            if results:
+                batch, results = results, []
+                await asyncio.to_thread(self.store.record_results, job_id, batch)
+
+        async def run_chunk(items: list):
+            chunk = asyncio.create_task(handler(job, items, on_result))
+            try:
+                while not chunk.done():
+                    await asyncio.wait([chunk], timeout=self.flush_interval)
+                    await flush()
+                chunk.result()
+            finally:
+                # Whatever finished is kept, even when the job is cancelled
+                if not chunk.done():
+                    chunk.cancel()
+                    await asyncio.gather(chunk, return_exceptions=True)
+                await asyncio.shield(flush())
+
+        started = time.perf_counter()
+        error = None
+        try:
+            handler = self.handlers[job["kind"]]
+            after = -1
+            while items := await asyncio.to_thread(self.store.pending_items, job_id, after, self.chunk_size):
+                await run_chunk(items)
+                after = items[-1][0]
+            unfinished = (await asyncio.to_thread(self.store.get, job_id))["pending"]
+            if unfinished:
+                raise RuntimeError(f"{unfinished} item(s) were never finished")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            error = str(e)
+        # Stop renewing the lease; finish() still checks that it is ours
+        self._running.pop(job_id, None)
+        await asyncio.to_thread(self.store.finish, job_id, error=error, owner=self.owner)
+        if error is None:
+            logger.info(f"Job {job_id} finished {job['total']} item(s) in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,159 @@
+import codecs
+import csv
+import io
+import json
+import re
+
+
+# Lead files in and out of bulk jobs. LeadFileParser takes an upload in
+# whatever chunks it arrives in and hands back the complete rows in each,
+# so a file is never held in memory whole: CSV with a header row (column
+# names are matched loosely, "First Name" and "first_name" both work) or
+# JSONL with one lead object per line. Export goes the other way, turning
+# job results into CSV or JSONL text a page at a time.
+
+LEAD_COLUMNS = (
+    "firstname", "lastname", "email", "phone", "company", "company_description", "company_linkedin_url",
+    "job_title", "description", "linkedin_url", "message",
+)
+COLUMN_ALIASES = {
+    **{re.sub(r"[^a-z0-9]", "", name): name for name in LEAD_COLUMNS},
+    "first": "firstname", "last": "lastname", "emailaddress": "email", "phonenumber": "phone",
+    "companyname": "company", "organization": "company", "organizationname": "company",
+    "title": "job_title", "jobtitle": "job_title", "linkedin": "linkedin_url", "personlinkedinurl": "linkedin_url",
+}
+MAX_RECORD_CHARS = 65536  # a quoted value still open after this much text is an error, not a lead
+EXPORT_COLUMNS = (
+    "index", "status", "firstname", "lastname", "email", "company", "job_title",
+    "email_text", "template", "score", "hubspot_id", "email_sent", "error",
+)
+
+
+def column_name(header: str) -> str | None:
+    return COLUMN_ALIASES.get(re.sub(r"[^a-z0-9]", "", header.lower()))
+
+
+class LeadFileParser:
+    # feed() returns (line number, lead dict or error message) for each row
+    # completed by the chunk; close() returns whatever the last chunk left
+    # open. Unknown CSV columns and empty values are dropped.
+
+    def __init__(self, file_format: str):
+        if file_format not in ("csv", "jsonl"):
+            raise ValueError(f"Unsupported lead file format {file_format!r}")
+        self.format = file_format
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._partial = ""
+        self._record = []  # CSV lines of a quoted value that spans lines
+        self._record_chars = 0
+        self._record_quotes = 0
+        self._line = 0
+        self._record_line = 0
+        self._columns = None
+
+    def feed(self, chunk: bytes) -> list[tuple[int, dict | str]]:
+        text = self._partial + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return self._rows(lines)
+
+    def close(self) -> list[tuple[int, dict | str]]:
+        text = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        rows = self._rows([text] if text else [])
+        if self._record:
+            rows.append((self._record_line, "Unterminated quoted value"))
+            self._record = []
+        return rows
+
+    def _rows(self, lines: list[str]) -> list[tuple[int, dict | str]]:
+        rows = []
+        for line in lines:
+            self._line += 1
+            if self.format == "jsonl":
+                row = self._jsonl_row(line)
+            else:
+                row = self._csv_row(line)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def _jsonl_row(self, line: str):
+        if not line.strip():
+            return None
+        try:
+            lead = json.loads(line)
+        except ValueError as e:
+            return self._line, f"Invalid JSON: {e}"
+        if not isinstance(lead, dict):
+            return self._line, "Expected a JSON object"
+        return self._line, lead
+
+    def _csv_row(self, line: str):
+        # A record is complete once its quotes are balanced; "" inside a
+        # quoted value counts twice, so it doesn't throw that off
+        if not self._record:
+            self._record_line = self._line
+            self._record_chars = self._record_quotes = 0
+        self._record.append(line)
+        self._record_chars += len(line)
+        self._record_quotes += line.count('"')
+        if self._record_quotes % 2:
+            if self._record_chars > MAX_RECORD_CHARS:
+                self._record = []
+                return self._record_line, "Unterminated quoted value"
+            return None
+        text = "\n".join(self._record)
+        self._record = []
+        if not text.strip():
+            return None
+        values = next(csv.reader([text]))
+        if self._columns is None:
+            self._columns = [column_name(header) for header in values]
+            return None
+        if len(values) > len(self._columns):
+            return self._record_line, f"Expected {len(self._columns)} columns, got {len(values)}"
+        return self._record_line, {
+            column: value.strip() for column, value in zip(self._columns, values) if column and value.strip()
+        }
+
+
+def export_row(entry: dict) -> dict:
+    # One job_store result ({"index", "status", "result"}) as an
+    # EXPORT_COLUMNS row
+    result = entry["result"]
+    lead = result.get("lead") or {}
+    score = result.get("score")
+    return {
+        "index": entry["index"],
+        "status": entry["status"],
+        "firstname": lead.get("firstname"),
+        "lastname": lead.get("lastname"),
+        "email": lead.get("email"),
+        "company": lead.get("company"),
+        "job_title": lead.get("job_title"),
+        "email_text": result.get("email"),
+        "template": result.get("template"),
+        "score": (result.get("score_details") or {}).get("score", score),
+        "hubspot_id": (result.get("hubspot") or {}).get("id"),
+        "email_sent": result.get("email_sent"),
+        "error": result.get("error"),
+    }
+
+
+def export_chunks(pages, file_format: str):
+    # Yields one text chunk per page of job results, CSV starting with
+    # its header row
+    if file_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, EXPORT_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for page in pages:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(export_row(entry) for entry in page)
+            yield buffer.getvalue()
+    else:
+        for page in pages:
+            yield "".join(json.dumps(export_row(entry)) + "\n" for entry in page)
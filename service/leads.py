@@ -0,0 +1,133 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+try:
+    import orjson
+except ImportError:  # optional: compact responses fall back to the json module
+    orjson = None
+
+
+# The parts of an Apollo person that lead cards are built from, and the
+# cards themselves. Apollo match/reveal responses carry dozens of fields;
+# project_person() keeps only the ones read here, so cached enrichments
+# and in-flight results stay small. A card holds one deduplicated,
+# normalized phone list instead of every raw/sanitized/enriched/revealed
+# variant.
+
+PERSON_FIELDS = ("id", "first_name", "last_name", "email", "phone_number", "title", "headline", "summary", "linkedin_url")
+ORGANIZATION_FIELDS = ("name", "description", "linkedin_url")
+# Most reliable first: Apollo's sanitized numbers, then the other single
+# fields, then the lists
+SANITIZED_PHONE_FIELDS = ("sanitized_phone", "sanitized_mobile_phone")
+OTHER_PHONE_FIELDS = ("direct_phone", "mobile_phone", "home_phone", "other_phone")
+PHONE_LIST_FIELDS = ("phone_numbers", "raw_phone_numbers")
+LEAD_FIELDS = (
+    "firstname", "lastname", "email", "phone", "company", "company_description", "company_linkedin_url",
+    "job_title", "description", "linkedin_url", "message",
+)
+
+
+def project_person(data: dict | None) -> dict:
+    if not data:
+        return {}
+    projected = {
+        name: data[name]
+        for name in PERSON_FIELDS + SANITIZED_PHONE_FIELDS + OTHER_PHONE_FIELDS + PHONE_LIST_FIELDS
+        if data.get(name)
+    }
+    organization = data.get("organization") or {}
+    organization = {name: organization[name] for name in ORGANIZATION_FIELDS if organization.get(name)}
+    if organization:
+        projected["organization"] = organization
+    return projected
+
+
+def normalize_phone(value) -> str | None:
+    # "+20 (100) 000-0001" -> "+201000000001"; anything with fewer than 7
+    # digits isn't a phone number
+    if isinstance(value, dict):
+        value = value.get("sanitized_number") or value.get("raw_number")
+    if not isinstance(value, str):
+        return None
+    digits = re.sub(r"\D", "", value)
+    if len(digits) < 7:
+        return None
+    return ("+" if value.strip().startswith("+") else "") + digits
+
+
+def collect_phones(*sources: dict | None) -> list[str]:
+    sources = [source for source in sources if source]
+    candidates = [source.get(name) for name in SANITIZED_PHONE_FIELDS for source in sources]
+    candidates += [source.get(name) for name in OTHER_PHONE_FIELDS for source in sources]
+    for name in PHONE_LIST_FIELDS:
+        for source in sources:
+            candidates.extend(source.get(name) or [])
+    phones = []
+    for candidate in candidates:
+        phone = normalize_phone(candidate)
+        if phone and phone not in phones:
+            phones.append(phone)
+    return phones
+
+
+def apollo_contact_info(person: dict, enriched: dict | None = None, revealed: dict | None = None) -> dict:
+    # The raw phone fields of each source, as default (non-compact) cards
+    # have always carried them; enriched_*/revealed_* keys only when that
+    # source is there
+    info = {
+        "phone_numbers": person.get("phone_numbers", []),
+        **{name: person.get(name) for name in SANITIZED_PHONE_FIELDS + OTHER_PHONE_FIELDS},
+        "raw_phone_numbers": person.get("raw_phone_numbers", []),
+    }
+    for prefix, source in (("enriched", enriched), ("revealed", revealed)):
+        if source:
+            info[f"{prefix}_phone_numbers"] = source.get("phone_numbers", [])
+            for name in SANITIZED_PHONE_FIELDS + ("direct_phone", "mobile_phone"):
+                info[f"{prefix}_{name}"] = source.get(name)
+    return info
+
+
+@dataclass(slots=True)
+class LeadCard:
+    firstname: str
+    lastname: str
+    company: str
+    email: str | None = None
+    phone: str | None = None
+    company_description: str | None = None
+    company_linkedin_url: str | None = None
+    job_title: str | None = None
+    description: str | None = None
+    linkedin_url: str | None = None
+    message: str = ""
+    phones: list[str] = field(default_factory=list)
+    apollo_contact_info: dict | None = None  # raw phone fields, default cards only
+    apollo_id: str | None = None  # for /reveal-phones
+    revealed: bool = False  # phones already include the person's reveal
+
+    def to_dict(self, compact: bool = False) -> dict:
+        # {"lead": <LeadRequest fields>, "apollo_contact_info": {...},
+        # "phones": [...], "apollo_id": ..., "revealed": ...}; compact leaves
+        # out apollo_contact_info, None fields, an empty message or phone
+        # list and revealed=false
+        lead = {name: getattr(self, name) for name in LEAD_FIELDS}
+        if not compact:
+            return {
+                "lead": lead, "apollo_contact_info": self.apollo_contact_info or {},
+                "phones": self.phones, "apollo_id": self.apollo_id, "revealed": self.revealed,
+            }
+        card = {"lead": {name: value for name, value in lead.items() if value is not None and value != ""}}
+        if self.phones:
+            card["phones"] = self.phones
+        if self.apollo_id:
+            card["apollo_id"] = self.apollo_id
+        if self.revealed:
+            card["revealed"] = True
+        return card
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
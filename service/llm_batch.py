@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+# Helpers for generating many emails per OpenAI request: parsing the JSON a
+# multi-lead prompt answers with, and a local stand-in for the OpenAI Batch
+# API. The stand-in takes the same JSONL request lines ({"custom_id",
+# "method", "url", "body"}), writes the same input, output and error files
+# and runs the requests itself, so swapping in the real API means replacing
+# process() with a file upload, batches.create() and polling.
+
+def parse_batch_emails(content: str | None, ids: list[str]) -> tuple[dict, list[str]]:
+    # Returns ({id: email} for the ids with a usable email, ids without one).
+    # Expects {"emails": [{"id": ..., "email": ...}, ...]}; unknown ids and
+    # empty emails are ignored, so only the leads that were missed get retried.
+    try:
+        entries = json.loads(content or "").get("emails")
+    except (ValueError, AttributeError):
+        entries = None
+    emails = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        entry_id, email = str(entry.get("id")), entry.get("email")
+        if entry_id in ids and entry_id not in emails and isinstance(email, str) and email.strip():
+            emails[entry_id] = email.strip()
+    return emails, [entry_id for entry_id in ids if entry_id not in emails]
+
+
+def batch_request(custom_id: str, body: dict, url: str = "/v1/chat/completions") -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": url, "body": body}
+
+
+class LocalBatchRunner:
+    # `execute(body)` sends one request body and returns the response body
+    # as a dict; at most `concurrency` run at once. run() deletes a batch's
+    # files once its results are read unless `keep_files` is set. The async
+    # methods do their file I/O on a worker thread.
+    def __init__(self, directory: str, execute, concurrency: int = 4, keep_files: bool = False):
+        self.directory = directory
+        self.execute = execute
+        self.concurrency = max(1, concurrency)
+        self.keep_files = keep_files
+
+    def _path(self, batch_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    def _write_status(self, batch_id: str, status: str, **counts):
+        with open(os.path.join(self.directory, f"{batch_id}.json"), "w") as f:
+            json.dump({"id": batch_id, "status": status, "updated_at": int(time.time()), **counts}, f)
+
+    def submit(self, requests: list[dict]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with open(self._path(batch_id, "input"), "w") as f:
+            for request in requests:
+                f.write(json.dumps(request) + "\n")
+        self._write_status(batch_id, "validating", total=len(requests))
+        return batch_id
+
+    def _start(self, batch_id: str) -> list[dict]:
+        with open(self._path(batch_id, "input")) as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        self._write_status(batch_id, "in_progress", total=len(requests))
+        return requests
+
+    def _write_output(self, batch_id: str, lines: list[dict]):
+        failed = 0
+        with open(self._path(batch_id, "output"), "w") as output, open(self._path(batch_id, "errors"), "w") as errors:
+            for line in lines:
+                failed += line["error"] is not None
+                (errors if line["error"] else output).write(json.dumps(line) + "\n")
+        self._write_status(batch_id, "completed", total=len(lines), completed=len(lines) - failed, failed=failed)
+
+    def _remove(self, batch_id: str):
+        for name in ("input.jsonl", "output.jsonl", "errors.jsonl", "json"):
+            os.remove(os.path.join(self.directory, f"{batch_id}.{name}"))
+
+    async def process(self, batch_id: str):
+        requests = await asyncio.to_thread(self._start, batch_id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(request: dict) -> dict:
+            line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"], "response": None, "error": None}
+            async with semaphore:
+                try:
+                    line["response"] = {"status_code": 200, "body": await self.execute(request["body"])}
+                except Exception as e:
+                    line["error"] = {"code": type(e).__name__, "message": str(e)}
+            return line
+
+        lines = await asyncio.gather(*(run_one(request) for request in requests))
+        await asyncio.to_thread(self._write_output, batch_id, lines)
+
+    def results(self, batch_id: str) -> dict:
+        # custom_id -> response body, or an Exception for failed requests
+        results = {}
+        for kind in ("output", "errors"):
+            with open(self._path(batch_id, kind)) as f:
+                for line in map(json.loads, filter(str.strip, f)):
+                    if line["error"]:
+                        results[line["custom_id"]] = RuntimeError(line["error"]["message"])
+                    else:
+                        results[line["custom_id"]] = line["response"]["body"]
+        return results
+
+    async def run(self, requests: list[dict]) -> dict:
+        batch_id = await asyncio.to_thread(self.submit, requests)
+        await self.process(batch_id)
+        results = await asyncio.to_thread(self.results, batch_id)
+        failed = sum(isinstance(result, Exception) for result in results.values())
+        logger.info(f"Batch {batch_id} finished {len(requests)} requests, {failed} failed")
+        if not self.keep_files:
+            await asyncio.to_thread(self._remove, batch_id)
+        return results
@@ -1,38 +1,122 @@
 import os
-import smtplib
+import re
+import json
+import hashlib
+import time
+import asyncio
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import requests
+import sqlite3
+from collections import deque
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import TYPE_CHECKING, Literal
+import httpx
 from dotenv import load_dotenv
-import openai
-from langchain_openai.llms import OpenAI as LangChainLLM
-from langchain.agents import initialize_agent, Tool
-from openai import OpenAI
-from langchain.agents.agent_types import AgentType
 from fastapi.middleware.cors import CORSMiddleware
+from smtp_pool import SMTPPool
+from pipeline import Stage, BatchStage, run_pipeline
+from scoring import LeadScore, LeadScorer, ScoringRules
+from enrichment_cache import EnrichmentCache
+from dedup import LeadIndex, lead_keys, normalize_email, person_keys
+from leads import LeadCard, apollo_contact_info, collect_phones, dumps, project_person
+from email_templates import EmailTemplate, TemplateLibrary
+from lead_files import LeadFileParser, export_chunks
+from ttl_cache import TTLCache
+from shared_stream import SharedWalks
+from jobs import JobStore, JobRunner
+from outbound import Provider, CircuitOpenError
+from http_clients import ClientRegistry
+from llm_batch import LocalBatchRunner, batch_request, parse_batch_emails
+from metrics import Metrics, TraceIdFilter, TraceMiddleware, sampled_debug
+
+# The OpenAI SDK is imported on first use, it adds a noticeable chunk to startup
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; every line carries the trace id of the request it came from
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(levelname)s:%(name)s:%(trace_id)s:%(message)s")
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
 # Config
 HUBSPOT_TOKEN = os.getenv("HUBSPOT_PRIVATE_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-APOLLO_API_KEY = os.getenv("APOLLO_API_KEY")
+APOLLO_API_KEY = os.getenv("APOLLO_API_KEY", "")
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-
-# Initialize OpenAI
-openai.api_key = OPENAI_API_KEY
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+APOLLO_BASE_URL = os.getenv("APOLLO_BASE_URL", "https://api.apollo.io/api/v1")
+APOLLO_TIMEOUT = float(os.getenv("APOLLO_TIMEOUT", 15))
+APOLLO_ENRICH_CONCURRENCY = int(os.getenv("APOLLO_ENRICH_CONCURRENCY", 8))
+APOLLO_PER_PAGE = max(1, min(100, int(os.getenv("APOLLO_PER_PAGE", 25))))  # Apollo caps per_page at 100
+APOLLO_MAX_PAGES = int(os.getenv("APOLLO_MAX_PAGES", 40))
+APOLLO_PAGE_PREFETCH = max(1, int(os.getenv("APOLLO_PAGE_PREFETCH", 2)))  # search pages in flight at once, only while more leads are needed
+APOLLO_BULK_MATCH_SIZE = max(0, min(10, int(os.getenv("APOLLO_BULK_MATCH_SIZE", 10))))  # people per bulk_match call (max 10), 0 = single matches
+APOLLO_REVEAL = os.getenv("APOLLO_REVEAL", "lazy")  # "lazy": reveal phones on /reveal-phones; "eager": for every search hit
+ENRICHMENT_CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", "enrichment_cache.sqlite3")
+ENRICHMENT_CACHE_TTL = float(os.getenv("ENRICHMENT_CACHE_TTL", 7 * 24 * 3600))
+ENRICHMENT_CACHE_MAX_ENTRIES = int(os.getenv("ENRICHMENT_CACHE_MAX_ENTRIES", 50000))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 300))  # seconds identical /find-leads searches share results; 0 disables
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 128))
+LEAD_INDEX_PATH = os.getenv("LEAD_INDEX_PATH", "lead_index.sqlite3")
+LEAD_INDEX_CAPACITY = int(os.getenv("LEAD_INDEX_CAPACITY", 100000))  # keys the Bloom filter is sized for, it grows past that
+# Statuses that keep a lead out of search results ("found", "processed", "emailed"); empty disables
+LEAD_DEDUP_EXCLUDE = {status.strip() for status in os.getenv("LEAD_DEDUP_EXCLUDE", "processed,emailed").split(",") if status.strip()}
+APOLLO_RATE_LIMIT = float(os.getenv("APOLLO_RATE_LIMIT", 5))  # requests per second, 0 disables pacing
+APOLLO_BURST = int(os.getenv("APOLLO_BURST", 10))
+HUBSPOT_RATE_LIMIT = float(os.getenv("HUBSPOT_RATE_LIMIT", 10))  # private apps get 100 requests per 10s
+HUBSPOT_BURST = int(os.getenv("HUBSPOT_BURST", 10))
+OPENAI_RATE_LIMIT = float(os.getenv("OPENAI_RATE_LIMIT", 10))
+OPENAI_BURST = int(os.getenv("OPENAI_BURST", 20))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_BREAKER_THRESHOLD = int(os.getenv("OUTBOUND_BREAKER_THRESHOLD", 5))
+OUTBOUND_BREAKER_RESET = float(os.getenv("OUTBOUND_BREAKER_RESET", 30))
+APOLLO_MAX_CONNECTIONS = int(os.getenv("APOLLO_MAX_CONNECTIONS", 20))
+HUBSPOT_MAX_CONNECTIONS = int(os.getenv("HUBSPOT_MAX_CONNECTIONS", 10))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() != "false"
+HTTP_POOL_SHARD_SIZE = int(os.getenv("HTTP_POOL_SHARD_SIZE", 8))  # connections per pooled client
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # jobs processed at once by this instance
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 1000))  # items a job worker loads and processes at a time
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))  # a running job not renewed for this long is requeued
+JOB_IMPORT_TIMEOUT = float(os.getenv("JOB_IMPORT_TIMEOUT", 3600))  # an import idle for this long is failed
+HUBSPOT_BASE_URL = os.getenv("HUBSPOT_BASE_URL", "https://api.hubapi.com")
+HUBSPOT_TIMEOUT = float(os.getenv("HUBSPOT_TIMEOUT", 15))
+HUBSPOT_BATCH_SIZE = max(1, min(100, int(os.getenv("HUBSPOT_BATCH_SIZE", 100))))  # HubSpot caps batch inputs at 100
+HUBSPOT_BATCH_WAIT = float(os.getenv("HUBSPOT_BATCH_WAIT", 0.05))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", 8))
+EMAIL_MODEL = os.getenv("EMAIL_MODEL", "gpt-3.5-turbo")
+EMAIL_CACHE_MAX_ENTRIES = int(os.getenv("EMAIL_CACHE_MAX_ENTRIES", 2048))
+EMAIL_CACHE_TTL = float(os.getenv("EMAIL_CACHE_TTL", 24 * 3600))
+EMAIL_GENERATION = os.getenv("EMAIL_GENERATION", "single")  # "single", "batched" or "offline"
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 10))  # leads per multi-lead completion
+EMAIL_BATCH_WAIT = float(os.getenv("EMAIL_BATCH_WAIT", 0.1))  # seconds to wait for a batch to fill
+EMAIL_BATCH_RETRIES = int(os.getenv("EMAIL_BATCH_RETRIES", 1))  # batched retries for leads a completion missed
+EMAIL_OFFLINE_BATCH_SIZE = int(os.getenv("EMAIL_OFFLINE_BATCH_SIZE", 1000))  # leads per offline batch file
+EMAIL_OFFLINE_BATCH_WAIT = float(os.getenv("EMAIL_OFFLINE_BATCH_WAIT", 2))
+EMAIL_BATCH_DIR = os.getenv("EMAIL_BATCH_DIR", "email_batches")
+EMAIL_MODE = os.getenv("EMAIL_MODE", "llm")  # "llm", "template" or "hybrid" (a template with a model-written opening line)
+EMAIL_TEMPLATE = os.getenv("EMAIL_TEMPLATE", "intro")  # "name" or "name@version"
+EMAIL_TEMPLATES_PATH = os.getenv("EMAIL_TEMPLATES_PATH")  # optional JSON list of templates added to the built-in ones
+EMAIL_OPENING_MAX_TOKENS = int(os.getenv("EMAIL_OPENING_MAX_TOKENS", 60))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))  # share of people whose payloads are logged at DEBUG
+LEAD_SCORING_RULES = os.getenv("LEAD_SCORING_RULES")  # optional path to a JSON ScoringRules file
+LEAD_SCORING_LLM = os.getenv("LEAD_SCORING_LLM", "off")  # "off" or "borderline"
+LEAD_SCORING_LLM_CONCURRENCY = int(os.getenv("LEAD_SCORING_LLM_CONCURRENCY", 4))
+LEAD_SCORING_MODEL = os.getenv("LEAD_SCORING_MODEL", EMAIL_MODEL)
 
 # Initialize FastAPI
 app = FastAPI()
@@ -45,6 +129,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics, served at /metrics. Provider calls are timed by their
+# Provider; the rest of the hot path is timed where it happens.
+metrics = Metrics()
+metrics.describe("provider_call_duration_seconds", "Time per provider call attempt, by provider, operation and outcome")
+metrics.describe("provider_calls_total", "Provider call retries and circuit breaker rejections")
+metrics.describe("stage_duration_seconds", "Time spent in non-provider steps: SMTP, scoring, template rendering and per-person enrichment")
+app.add_middleware(TraceMiddleware, metrics=metrics)
+
 # Models
 class LeadRequest(BaseModel):
     firstname: str
@@ -64,68 +156,441 @@ class ApolloSearchRequest(BaseModel):
     organization_name: str = ""
     location: str = ""
     industry_tag: str = ""
-    exclude_emails: list[str] = [] # List of emails to exclude from results
+    exclude_emails: set[str] = set() # Emails to exclude from results
+    target_count: int = Field(20, ge=1, le=1000)  # Stop walking Apollo pages once this many leads are found
+    stream: bool = False  # Stream leads back as NDJSON as they are enriched
+    compact: bool = False  # Leave None fields out of lead cards
+
+class RevealRequest(BaseModel):
+    ids: list[str] = Field(..., min_length=1, max_length=100)  # apollo_id of each lead card
 
 class EmailGenerationRequest(BaseModel):
     leads: list[LeadRequest]
     send_immediately: bool = False
+    generation: Literal["single", "batched", "offline"] | None = None  # defaults to EMAIL_GENERATION
+    mode: Literal["llm", "template", "hybrid"] | None = None  # defaults to EMAIL_MODE
+    template: str | None = None  # "name" or "name@version" for template/hybrid, defaults to EMAIL_TEMPLATE
+
+# Lead scoring rules are compiled once at startup
+lead_scorer = LeadScorer(ScoringRules.from_file(LEAD_SCORING_RULES) if LEAD_SCORING_RULES else None)
+
+# Email templates too
+email_templates = TemplateLibrary.from_file(EMAIL_TEMPLATES_PATH) if EMAIL_TEMPLATES_PATH else TemplateLibrary()
+email_templates.get(EMAIL_TEMPLATE)  # fail at startup, not on the first request
+
+# SMTP sessions are opened on first send and reused across requests
+smtp_pool = SMTPPool(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, size=SMTP_POOL_SIZE, starttls=SMTP_STARTTLS)
+
+@app.on_event("shutdown")
+async def close_smtp_pool():
+    await run_in_threadpool(smtp_pool.close)
+
+# Bulk jobs are persisted so they survive a restart. The store is opened
+# at startup from JOB_STORE_PATH; without a writable one (e.g. a read-only
+# filesystem) jobs are disabled and their endpoints answer 503. Workers are
+# stopped before the clients they use are closed.
+job_store = None
+job_runner = None
+
+def open_store(name: str, factory, path: str):
+    # None for an empty path or one that can't be opened
+    if not path:
+        return None
+    try:
+        return factory(path)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Can't open the {name} at {path}: {e}")
+        return None
+
+@app.on_event("startup")
+async def start_job_runner():
+    global job_store, job_runner
+    job_store = open_store("job store", JobStore, JOB_STORE_PATH)
+    if job_store is None:
+        logger.info("Bulk jobs are disabled: no writable JOB_STORE_PATH")
+        return
+    job_runner = JobRunner(
+        job_store, workers=JOB_WORKERS, chunk_size=JOB_CHUNK_SIZE,
+        lease_seconds=JOB_LEASE_SECONDS, import_timeout=JOB_IMPORT_TIMEOUT
+    )
+    job_runner.register("process-leads", run_process_leads_job)
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    global job_store, job_runner
+    if job_runner is not None:
+        await job_runner.stop()
+        await asyncio.to_thread(job_store.close)
+        job_store = job_runner = None
+
+def require_job_store() -> JobStore:
+    if job_store is None:
+        raise HTTPException(status_code=503, detail="Bulk jobs are disabled on this server.")
+    return job_store
 
-# LangChain Setup
-llm = LangChainLLM(temperature=0, openai_api_key=OPENAI_API_KEY)
+# Pooled keep-alive HTTP clients, one per provider, shared by every request
+http_clients = ClientRegistry(shard_size=HTTP_POOL_SHARD_SIZE)
+http_clients.register(
+    "apollo", timeout=APOLLO_TIMEOUT, max_connections=APOLLO_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED
+)
+http_clients.register(
+    "hubspot", timeout=HUBSPOT_TIMEOUT, max_connections=HUBSPOT_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED
+)
+# The OpenAI SDK wraps a single client, so this one isn't sharded
+http_clients.register(
+    "openai", timeout=OPENAI_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2_ENABLED, shard_size=OPENAI_MAX_CONNECTIONS
+)
+
+@app.on_event("startup")
+async def open_http_clients():
+    http_clients.start()
+
+# Apollo match/reveal results, keyed by Apollo person id and LinkedIn URL.
+# Kept in memory only when ENRICHMENT_CACHE_PATH can't be opened.
+enrichment_cache = None
+
+@app.on_event("startup")
+async def open_enrichment_cache():
+    global enrichment_cache
+    options = {"ttl": ENRICHMENT_CACHE_TTL, "max_entries": ENRICHMENT_CACHE_MAX_ENTRIES}
+    enrichment_cache = (
+        open_store("enrichment cache", lambda path: EnrichmentCache(path, **options), ENRICHMENT_CACHE_PATH)
+        or EnrichmentCache(":memory:", **options)
+    )
+
+@app.on_event("shutdown")
+async def close_enrichment_cache():
+    enrichment_cache.close()
 
-lead_score_tool = Tool(
-    name="LeadScorer",
-    func=lambda x: f"Score for lead '{x}': High potential (based on title and industry match)",
-    description="Scores a lead based on description and role"
+# Leads already found, processed or emailed, by email, Apollo id and LinkedIn
+# URL. Kept in memory only when LEAD_INDEX_PATH can't be opened. Like the
+# other SQLite stores, it is used from request handlers through
+# asyncio.to_thread, so disk I/O never blocks the event loop (and doesn't
+# queue behind SMTP sends in Starlette's thread pool).
+lead_index = None
+
+@app.on_event("startup")
+async def open_lead_index():
+    global lead_index
+    lead_index = (
+        open_store("lead index", lambda path: LeadIndex(path, capacity=LEAD_INDEX_CAPACITY), LEAD_INDEX_PATH)
+        or LeadIndex(":memory:", capacity=LEAD_INDEX_CAPACITY)
+    )
+
+@app.on_event("shutdown")
+async def close_lead_index():
+    lead_index.close()
+
+# Every provider call goes through its Provider: rate limited, retried on
+# 429/5xx/connection errors, and cut off by a circuit breaker when it keeps failing
+apollo = Provider(
+    "apollo", APOLLO_RATE_LIMIT, APOLLO_BURST, max_retries=OUTBOUND_MAX_RETRIES,
+    failure_threshold=OUTBOUND_BREAKER_THRESHOLD, reset_timeout=OUTBOUND_BREAKER_RESET, metrics=metrics
+)
+hubspot = Provider(
+    "hubspot", HUBSPOT_RATE_LIMIT, HUBSPOT_BURST, max_retries=OUTBOUND_MAX_RETRIES,
+    failure_threshold=OUTBOUND_BREAKER_THRESHOLD, reset_timeout=OUTBOUND_BREAKER_RESET, metrics=metrics
 )
+openai_provider = Provider(
+    "openai", OPENAI_RATE_LIMIT, OPENAI_BURST, max_retries=OUTBOUND_MAX_RETRIES,
+    failure_threshold=OUTBOUND_BREAKER_THRESHOLD, reset_timeout=OUTBOUND_BREAKER_RESET, metrics=metrics
+)  # also retries openai.APIConnectionError, added by get_openai_client() once the SDK is loaded
+
+# One OpenAI client for the app's lifetime, on the pooled "openai" HTTP
+# client. Its own retries are off so they don't stack on top of
+# openai_provider's.
+openai_client = None
+
+def get_openai_client() -> "AsyncOpenAI":
+    global openai_client
+    if openai_client is None:
+        from openai import APIConnectionError, AsyncOpenAI
+        openai_provider.retry_exceptions = (httpx.TransportError, APIConnectionError)
+        openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0, http_client=http_clients.get("openai"))
+    return openai_client
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    global openai_client
+    openai_client = None  # built on the "openai" HTTP client closed below
+    await http_clients.aclose()
 
-agent = initialize_agent([lead_score_tool], llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=False)
+# Generated emails keyed by a hash of model + prompt
+email_cache = TTLCache(max_entries=EMAIL_CACHE_MAX_ENTRIES, ttl=EMAIL_CACHE_TTL)
+
+# Running and recent /find-leads searches, as SharedStreams of lead cards
+search_cache = TTLCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL)
+
+# Recent /reveal-phones results by Apollo id; mostly there so concurrent
+# requests for the same person share one reveal (the store is permanent)
+reveal_cache = TTLCache(max_entries=4096, ttl=3600)
 
 # Utils
-def generate_email(lead: LeadRequest) -> str:
-    prompt = f"""
-    SkillUp MENA is the pioneer of e-learning services, with our vast curated e-learning library of over 85000 courses, all offered by the world's leading training providers. Our aim is to simplify the corporate training process by offering a unique engaging learning experience, whilst marinating our partners' business needs.
+COMPANY_PITCH = "SkillUp MENA is the pioneer of e-learning services, with our vast curated e-learning library of over 85000 courses, all offered by the world's leading training providers. Our aim is to simplify the corporate training process by offering a unique engaging learning experience, whilst marinating our partners' business needs."
+
+def email_prompt(lead: LeadRequest) -> str:
+    return f"""
+    {COMPANY_PITCH}
     Write a personalized cold outreach email to {lead.firstname} {lead.lastname} at {lead.company}.
     Mention potential value and request a short call. Keep it under 120 words.
     """
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+
+def email_cache_key(prompt: str) -> str:
+    return hashlib.sha256(f"{EMAIL_MODEL}\n{prompt}".encode()).hexdigest()
+
+async def generate_email(lead: LeadRequest) -> str:
+    prompt = email_prompt(lead)
+    cache_key = email_cache_key(prompt)
+
+    async def create() -> str:
+        response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
+            model=EMAIL_MODEL,
             messages=[{"role": "user", "content": prompt}]
-        )
+        ), "email")
         return response.choices[0].message.content
+
+    try:
+        # Resubmitted leads are served from the cache, and identical
+        # concurrent requests share a single completion
+        return await email_cache.get_or_compute(cache_key, create)
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
         raise HTTPException(status_code=500, detail="Error generating email content.")
 
-def send_email_smtp(to_email: str, subject: str, body: str):
-    msg = MIMEMultipart()
-    msg['From'] = SMTP_USER
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
+def email_template(ref: str | None) -> EmailTemplate:
+    try:
+        return email_templates.get(ref or EMAIL_TEMPLATE)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown email template {ref!r}.")
+
+def opening_prompt(lead: LeadRequest) -> str:
+    return f"""
+    {COMPANY_PITCH}
+    Write the opening sentence of a cold outreach email to {lead.firstname} {lead.lastname}, {lead.job_title or "a leader"} at {lead.company}.
+    About the company: {lead.company_description or "unknown"}
+    Make it specific to them and their company, under 30 words, without a greeting. Reply with the sentence only.
+    """
+
+async def generate_opening(lead: LeadRequest) -> str | None:
+    # The one model-written line of a hybrid email; None (the template's
+    # fallback line) if the model fails, the rest of the email doesn't
+    # depend on it
+    prompt = opening_prompt(lead)
+
+    async def create() -> str:
+        response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
+            model=EMAIL_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=EMAIL_OPENING_MAX_TOKENS
+        ), "email_opening")
+        return (response.choices[0].message.content or "").strip().strip('"')
+
+    try:
+        return await email_cache.get_or_compute(email_cache_key(prompt), create) or None
+    except Exception as e:
+        logger.error(f"OpenAI opening line error: {e}")
+        return None
+
+async def compose_email(lead: LeadRequest, mode: str, template: EmailTemplate | None) -> str:
+    if mode == "template":
+        return template.render(lead)
+    if mode == "hybrid":
+        return template.render(lead, await generate_opening(lead) if template.uses_opening else None)
+    return await generate_email(lead)
+
+def batch_email_request(leads: list[LeadRequest]) -> dict:
+    # One completion for several leads: the pitch and instructions are sent
+    # once, and the model answers with JSON keyed by each lead's position
+    instructions = (
+        f"{COMPANY_PITCH}\n"
+        "Write a personalized cold outreach email to each lead below. Mention potential value and "
+        "request a short call. Keep each email under 120 words. Reply with JSON only, in the form "
+        '{"emails": [{"id": "<lead id>", "email": "<email text>"}]}, with one entry per lead.'
+    )
+    people = [
+        {"id": str(position), "name": f"{lead.firstname} {lead.lastname}", "company": lead.company, "role": lead.job_title}
+        for position, lead in enumerate(leads, 1)
+    ]
+    return {
+        "model": EMAIL_MODEL,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": json.dumps(people)},
+        ],
+    }
+
+async def generate_emails_batched(leads: list[LeadRequest]) -> list:
+    # One email (or the exception that stopped it) per lead, in order.
+    # Cached emails are reused, the rest are written EMAIL_BATCH_SIZE leads
+    # per completion. Leads a completion misses or garbles are retried in a
+    # smaller batch, then one at a time through generate_email.
+    results = [None] * len(leads)
+    keys = [email_cache_key(email_prompt(lead)) for lead in leads]
+    pending = []
+    for index, key in enumerate(keys):
+        results[index] = email_cache.get(key)
+        if results[index] is None:
+            pending.append(index)
+
+    async def write(indexes: list[int]) -> list[int]:
+        # Returns the indexes the completion didn't produce an email for
+        ids = [str(position) for position in range(1, len(indexes) + 1)]
+        try:
+            response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
+                **batch_email_request([leads[index] for index in indexes])
+            ), "email_batch")
+            emails, missed = parse_batch_emails(response.choices[0].message.content, ids)
+        except Exception as e:
+            logger.error(f"Batched email generation failed for {len(indexes)} leads: {e}")
+            emails, missed = {}, ids
+        for entry_id, email in emails.items():
+            index = indexes[int(entry_id) - 1]
+            results[index] = email
+            email_cache.set(keys[index], email)
+        return [indexes[int(entry_id) - 1] for entry_id in missed]
 
+    size = max(1, EMAIL_BATCH_SIZE)
+    for attempt in range(max(0, EMAIL_BATCH_RETRIES) + 1):
+        if not pending:
+            break
+        if attempt:
+            logger.warning(f"Retrying {len(pending)} leads missing from batched completions")
+        chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+        pending = [index for missed in await asyncio.gather(*(write(chunk) for chunk in chunks)) for index in missed]
+
+    async def write_one(index: int):
+        try:
+            results[index] = await generate_email(leads[index])
+        except Exception as e:
+            results[index] = e
+
+    await asyncio.gather(*(write_one(index) for index in pending))
+    return results
+
+async def run_batch_request(body: dict) -> dict:
+    response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(**body), "email_offline")
+    return response.model_dump()
+
+# Stand-in for the OpenAI Batch API: request files are written to
+# EMAIL_BATCH_DIR and run locally through openai_provider
+email_batch_runner = LocalBatchRunner(EMAIL_BATCH_DIR, run_batch_request, concurrency=OPENAI_CONCURRENCY)
+
+async def generate_emails_offline(leads: list[LeadRequest]) -> list:
+    # Like generate_emails_batched, but the multi-lead completions go out as
+    # one batch file. Leads the batch doesn't produce go through the online
+    # batched path.
+    results = [email_cache.get(email_cache_key(email_prompt(lead))) for lead in leads]
+    pending = [index for index, email in enumerate(results) if email is None]
+    size = max(1, EMAIL_BATCH_SIZE)
+    chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+    batch_requests = [
+        batch_request(f"chunk-{number}", batch_email_request([leads[index] for index in chunk]))
+        for number, chunk in enumerate(chunks)
+    ]
+    responses = await email_batch_runner.run(batch_requests) if batch_requests else {}
+
+    missed = []
+    for number, chunk in enumerate(chunks):
+        response = responses.get(f"chunk-{number}")
+        ids = [str(position) for position in range(1, len(chunk) + 1)]
+        if isinstance(response, dict):
+            emails, missing = parse_batch_emails(response["choices"][0]["message"]["content"], ids)
+        else:
+            emails, missing = {}, ids
+        for entry_id, email in emails.items():
+            index = chunk[int(entry_id) - 1]
+            results[index] = email
+            email_cache.set(email_cache_key(email_prompt(leads[index])), email)
+        missed.extend(chunk[int(entry_id) - 1] for entry_id in missing)
+
+    if missed:
+        logger.warning(f"Offline batch missed {len(missed)} leads, generating them online")
+        for index, email in zip(missed, await generate_emails_batched([leads[index] for index in missed])):
+            results[index] = email
+    return results
+
+async def stream_email(lead: LeadRequest):
+    # Yields the email in pieces as the model writes it. A cached email comes
+    # back in one piece, and a finished stream is cached for generate_email.
+    # Retries only cover opening the stream; tokens already sent can't be
+    # taken back.
+    prompt = email_prompt(lead)
+    cache_key = email_cache_key(prompt)
+    cached = email_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
+        model=EMAIL_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True
+    ), "email_stream")
+    parts = []
+    async for chunk in stream:
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if text:
+            parts.append(text)
+            yield text
+    email_cache.set(cache_key, "".join(parts))
+
+async def llm_score_lead(lead: LeadRequest, rule_score: LeadScore) -> LeadScore:
+    # Second opinion for borderline leads; falls back to the rule score
+    prompt = f"""
+    SkillUp MENA sells a curated corporate e-learning library of over 85000 courses.
+    Rate from 0 to 100 how likely this lead is to buy it for their organization.
+    Name: {lead.firstname} {lead.lastname}
+    Role: {lead.job_title or "unknown"}
+    Company: {lead.company}
+    Company description: {lead.company_description or "unknown"}
+    Profile: {lead.description or "unknown"}
+    Reply with the number only.
+    """
     try:
-        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.sendmail(SMTP_USER, to_email, msg.as_string())
-        server.quit()
+        response = await openai_provider.call(lambda: get_openai_client().chat.completions.create(
+            model=LEAD_SCORING_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=5
+        ), "score")
+        match = re.search(r"\d+", response.choices[0].message.content or "")
+        if not match:
+            return rule_score
+        return lead_scorer.make_score(int(match.group()), rule_score.matches, source="llm")
+    except Exception as e:
+        logger.error(f"OpenAI scoring error: {e}")
+        return rule_score
+
+async def score_lead(lead: LeadRequest) -> LeadScore:
+    with metrics.timer("stage_duration_seconds", stage="score_rules"):
+        result = lead_scorer.score(lead)
+    if LEAD_SCORING_LLM == "borderline" and lead_scorer.is_borderline(result):
+        result = await llm_score_lead(lead, result)
+    return result
+
+def send_email_smtp(to_email: str, subject: str, body: str):
+    try:
+        with metrics.timer("stage_duration_seconds", stage="smtp"):
+            smtp_pool.send(to_email, subject, body)
         logger.info(f"Email sent to {to_email}")
         return {"status": "success", "message": "Email sent successfully."}
     except Exception as e:
         logger.error(f"SMTP error: {e}")
         raise HTTPException(status_code=500, detail="Error sending email.")
 
-def push_to_hubspot(lead: LeadRequest):
+async def push_to_hubspot(lead: LeadRequest):
     headers = {
         "Authorization": f"Bearer {HUBSPOT_TOKEN}",
         "Content-Type": "application/json"
     }
 
     # Check if contact exists
-    search_url = "https://api.hubapi.com/crm/v3/objects/contacts/search"
+    search_url = f"{HUBSPOT_BASE_URL}/crm/v3/objects/contacts/search"
     search_body = {
         "filterGroups": [
             {
@@ -141,14 +606,15 @@ def push_to_hubspot(lead: LeadRequest):
     }
 
     try:
-        search_resp = requests.post(search_url, json=search_body, headers=headers)
+        client = http_clients.get("hubspot")
+        search_resp = await hubspot.request(client, "POST", search_url, operation="search", json=search_body, headers=headers)
         search_resp.raise_for_status()
         results = search_resp.json().get("results", [])
 
         if results:
             contact_id = results[0]["id"]
             # Update existing contact
-            update_url = f"https://api.hubapi.com/crm/v3/objects/contacts/{contact_id}"
+            update_url = f"{HUBSPOT_BASE_URL}/crm/v3/objects/contacts/{contact_id}"
             update_data = {
                 "properties": {
                     "firstname": lead.firstname,
@@ -157,13 +623,15 @@ def push_to_hubspot(lead: LeadRequest):
                     "company": lead.company
                 }
             }
-            update_resp = requests.patch(update_url, json=update_data, headers=headers)
+            update_resp = await hubspot.request(client, "PATCH", update_url, operation="update", json=update_data, headers=headers)
             update_resp.raise_for_status()
-            logger.info(f"Contact updated in HubSpot: {lead.email} - {update_resp.json()}")
+            logger.info(f"Contact updated in HubSpot: {lead.email}")
+            if sampled_debug(logger, LOG_SAMPLE_RATE):
+                logger.debug(f"HubSpot update response for {lead.email}: {update_resp.json()}")
             return update_resp.json()
         else:
             # Create new contact
-            create_url = "https://api.hubapi.com/crm/v3/objects/contacts"
+            create_url = f"{HUBSPOT_BASE_URL}/crm/v3/objects/contacts"
             data = {
                 "properties": {
                     "email": lead.email,
@@ -173,39 +641,364 @@ def push_to_hubspot(lead: LeadRequest):
                     "company": lead.company
                 }
             }
-            create_resp = requests.post(create_url, json=data, headers=headers)
+            create_resp = await hubspot.request(client, "POST", create_url, operation="create", json=data, headers=headers)
             create_resp.raise_for_status()
-            logger.info(f"Lead pushed to HubSpot: {lead.email} - {create_resp.json()}")
+            logger.info(f"Lead pushed to HubSpot: {lead.email}")
+            if sampled_debug(logger, LOG_SAMPLE_RATE):
+                logger.debug(f"HubSpot create response for {lead.email}: {create_resp.json()}")
             return create_resp.json()
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, CircuitOpenError) as e:
         logger.error(f"HubSpot API error: {e}")
         raise HTTPException(status_code=500, detail="Error pushing lead to HubSpot.")
 
-    
+
+async def sync_hubspot_chunk(client: httpx.AsyncClient, chunk: dict[str, LeadRequest], headers: dict) -> dict[str, dict]:
+    # Upsert up to HUBSPOT_BATCH_SIZE contacts (keyed by lowercased email) in
+    # at most three calls: batch read by email, then batch update / create.
+    contacts_url = f"{HUBSPOT_BASE_URL}/crm/v3/objects/contacts"
+
+    read_resp = await hubspot.request(client, "POST", f"{contacts_url}/batch/read", operation="batch_read", headers=headers, json={
+        "idProperty": "email",
+        "properties": ["email"],
+        "inputs": [{"id": email} for email in chunk]
+    })
+    read_resp.raise_for_status()
+    existing = {}
+    for contact in read_resp.json().get("results", []):
+        email = (contact.get("properties", {}).get("email") or "").lower()
+        existing[email] = contact["id"]
+
+    synced = {}
+    updates = [
+        {
+            "id": existing[email],
+            "properties": {
+                "firstname": lead.firstname,
+                "lastname": lead.lastname,
+                "phone": lead.phone,
+                "company": lead.company
+            }
+        }
+        for email, lead in chunk.items() if email in existing
+    ]
+    if updates:
+        update_resp = await hubspot.request(
+            client, "POST", f"{contacts_url}/batch/update", operation="batch_update", headers=headers, json={"inputs": updates}
+        )
+        update_resp.raise_for_status()
+        email_by_id = {contact_id: email for email, contact_id in existing.items()}
+        for contact in update_resp.json().get("results", []):
+            if contact.get("id") in email_by_id:
+                synced[email_by_id[contact["id"]]] = contact
+        logger.info(f"Contacts updated in HubSpot: {len(updates)}")
+
+    creates = [
+        {
+            "properties": {
+                "email": lead.email.strip(),
+                "firstname": lead.firstname,
+                "lastname": lead.lastname,
+                "phone": lead.phone,
+                "company": lead.company
+            }
+        }
+        for email, lead in chunk.items() if email not in existing
+    ]
+    if creates:
+        create_resp = await hubspot.request(
+            client, "POST", f"{contacts_url}/batch/create", operation="batch_create", headers=headers, json={"inputs": creates}
+        )
+        create_resp.raise_for_status()
+        for contact in create_resp.json().get("results", []):
+            email = (contact.get("properties", {}).get("email") or "").lower()
+            synced[email] = contact
+        logger.info(f"Leads pushed to HubSpot: {len(creates)}")
+
+    return synced
+
+async def push_to_hubspot_batch(leads: list[LeadRequest]) -> list[dict]:
+    # Returns one {"result": contact} or {"error": message} per lead, in order.
+    # Leads sharing an email are synced once and share the outcome.
+    outcomes = [None] * len(leads)
+    indexes_by_email = {}
+    for index, lead in enumerate(leads):
+        if lead.email:
+            indexes_by_email.setdefault(lead.email.strip().lower(), []).append(index)
+        else:
+            outcomes[index] = {"error": "Lead has no email address."}
+
+    headers = {
+        "Authorization": f"Bearer {HUBSPOT_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    emails = list(indexes_by_email)
+
+    client = http_clients.get("hubspot")
+    for start in range(0, len(emails), HUBSPOT_BATCH_SIZE):
+        chunk = {email: leads[indexes_by_email[email][-1]] for email in emails[start:start + HUBSPOT_BATCH_SIZE]}
+        try:
+            synced = await sync_hubspot_chunk(client, chunk, headers)
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            logger.error(f"HubSpot API error: {e}")
+            synced = {}
+
+        for email in chunk:
+            if email in synced:
+                outcome = {"result": synced[email]}
+            else:
+                outcome = {"error": "Error pushing lead to HubSpot."}
+            for index in indexes_by_email[email]:
+                outcomes[index] = outcome
+
+    return outcomes
+
 # Endpoints
 @app.post("/create-lead")
-async def create_lead(lead: LeadRequest):
-    email_text = generate_email(lead)
-    hubspot_response = push_to_hubspot(lead)
-    lead_score = agent.run(f"Score this lead: {lead.firstname} {lead.lastname}, role at {lead.company}")
+async def create_lead(lead: LeadRequest, mode: Literal["llm", "template", "hybrid"] | None = None, template: str | None = None):
+    mode = mode or EMAIL_MODE
+    email_text = await compose_email(lead, mode, email_template(template) if mode != "llm" else None)
+    hubspot_response = await push_to_hubspot(lead)
+    lead_score = await score_lead(lead)
     
     # Send email using SMTP
     email_subject = f"Exciting Opportunity for {lead.firstname} {lead.lastname} at {lead.company}"
-    send_email_smtp(lead.email, email_subject, email_text)
+    await run_in_threadpool(send_email_smtp, lead.email, email_subject, email_text)
+    await asyncio.to_thread(lead_index.add, lead_keys(lead.dict()), "emailed")
     
-    return {"hubspot": hubspot_response, "email": email_text, "score": lead_score}
+    return {"hubspot": hubspot_response, "email": email_text, "score": lead_score.label, "score_details": lead_score.to_dict()}
 
-@app.post("/find-leads")
-async def find_leads(query: ApolloSearchRequest):
-    url = "https://api.apollo.io/api/v1/mixed_people/search"
-    headers = {
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def email_pieces(lead: LeadRequest, mode: str, template: EmailTemplate | None):
+    # Only LLM emails are worth streaming; the others come in one piece
+    if mode == "llm":
+        async for text in stream_email(lead):
+            yield text
+    else:
+        yield await compose_email(lead, mode, template)
+
+async def create_lead_events(lead: LeadRequest, mode: str, template: EmailTemplate | None):
+    # Server-sent events: "token" events with the email as it is generated,
+    # then one "done" event with the same fields as /create-lead plus timings,
+    # or an "error" event. HubSpot and scoring run while the model writes;
+    # the email is only sent once both succeeded, like /create-lead.
+    started = time.perf_counter()
+    hubspot_task = asyncio.create_task(push_to_hubspot(lead))
+    score_task = asyncio.create_task(score_lead(lead))
+    first_token = None
+    parts = []
+    try:
+        async for text in email_pieces(lead, mode, template):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(text)
+            yield sse("token", {"text": text})
+        email_text = "".join(parts)
+        hubspot_response = await hubspot_task
+        lead_score = await score_task
+
+        email_subject = f"Exciting Opportunity for {lead.firstname} {lead.lastname} at {lead.company}"
+        await run_in_threadpool(send_email_smtp, lead.email, email_subject, email_text)
+        await asyncio.to_thread(lead_index.add, lead_keys(lead.dict()), "emailed")
+    except Exception as e:
+        logger.error(f"Error creating lead {lead.email}: {e}")
+        yield sse("error", {"detail": getattr(e, "detail", None) or "Error creating lead."})
+        return
+    finally:
+        # Left running if the client went away or a step failed; don't leave
+        # their errors unretrieved
+        for task in (hubspot_task, score_task):
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    total = time.perf_counter() - started
+    ttft = first_token if first_token is not None else total
+    logger.info(f"Streamed email for {lead.email}: first token after {ttft * 1000:.0f}ms, done after {total * 1000:.0f}ms")
+    yield sse("done", {
+        "hubspot": hubspot_response,
+        "email": email_text,
+        "score": lead_score.label,
+        "score_details": lead_score.to_dict(),
+        "ttft_ms": round(ttft * 1000, 1),
+        "total_ms": round(total * 1000, 1)
+    })
+
+@app.post("/create-lead/stream")
+async def create_lead_stream(lead: LeadRequest, mode: Literal["llm", "template", "hybrid"] | None = None, template: str | None = None):
+    mode = mode or EMAIL_MODE
+    events = create_lead_events(lead, mode, email_template(template) if mode != "llm" else None)
+    return StreamingResponse(
+        events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def match_details(person: dict) -> dict:
+    company_info = person.get("organization", {})
+    details = {
+        "first_name": person.get("first_name", ""),
+        "last_name": person.get("last_name", ""),
+        "organization_name": company_info.get("name", ""),
+        "linkedin_url": person.get("linkedin_url", ""),
+    }
+    if person.get("id"):
+        details["id"] = person["id"]
+    return details
+
+async def bulk_match_people(client: httpx.AsyncClient, people: list[dict], headers: dict) -> list[dict]:
+    # One people/bulk_match call for up to 10 people. Matches are merged back
+    # by Apollo id or LinkedIn URL; anyone the call missed (or all of them,
+    # if it failed) gets an empty dict and is matched on its own later.
+    try:
+        response = await apollo.request(
+            client, "POST", f"{APOLLO_BASE_URL}/people/bulk_match", operation="bulk_match", headers=headers, json={
+                "details": [match_details(person) for person in people],
+                "reveal_personal_emails": True,
+                "reveal_phone_numbers": True,
+            }
+        )
+        response.raise_for_status()
+        matches = [match for match in response.json().get("matches") or [] if match]
+    except Exception as e:
+        logger.error(f"Bulk match failed for {len(people)} people, matching them one by one: {e}")
+        return [{} for _ in people]
+
+    by_key = {}
+    for match in matches:
+        for key in person_keys(match):
+            by_key.setdefault(key, match)
+    merged = []
+    for person in people:
+        merged.append(next((by_key[key] for key in person_keys(person) if key in by_key), {}))
+    missed = sum(1 for match in merged if not match)
+    if missed:
+        logger.info(f"Bulk match missed {missed} of {len(people)} people, matching them one by one")
+    return merged
+
+async def enrich_person(
+    client: httpx.AsyncClient, person: dict, headers: dict, matched: dict | None = None
+) -> tuple[dict, dict | None]:
+    # `matched` is the person's bulk_match result, if it had one
+    verbose = sampled_debug(logger, LOG_SAMPLE_RATE)
+    started = time.perf_counter()
+    try:
+        enriched_data = matched
+        if not enriched_data:
+            enrich_payload = {
+                **match_details(person),
+                "reveal_personal_emails": True,
+                "reveal_phone_numbers": True,
+                "contact_details": True
+            }
+            enrich_payload.pop("id", None)
+
+            enrich_response = await apollo.request(
+                client, "POST", f"{APOLLO_BASE_URL}/people/match", operation="match", headers=headers, json=enrich_payload
+            )
+            enrich_response.raise_for_status()
+            enriched_data = enrich_response.json().get("person") or {}
+
+        if verbose:
+            logger.debug(f"Enriched data phone fields: {enriched_data.get('phone_numbers', [])}, sanitized: {enriched_data.get('sanitized_phone')}, mobile: {enriched_data.get('sanitized_mobile_phone')}")
+        enriched_data = project_person(enriched_data)
+
+        # Revealing phone numbers costs credits; by default it waits until
+        # someone asks for them through /reveal-phones
+        revealed_data = None
+        if APOLLO_REVEAL == "eager" and enriched_data.get("id"):
+            try:
+                revealed_data = await reveal_person(client, enriched_data["id"], headers, enriched_data)
+            except (httpx.HTTPError, CircuitOpenError) as e:
+                logger.error(f"Error revealing contact: {e}")
+            if verbose and revealed_data:
+                logger.debug(f"Revealed data phone fields: {revealed_data.get('phone_numbers', [])}, sanitized: {revealed_data.get('sanitized_phone')}, mobile: {revealed_data.get('sanitized_mobile_phone')}")
+
+        return enriched_data, revealed_data
+    except Exception as e:
+        logger.error(f"Error enriching/revealing contact: {e}")
+        return {}, None
+    finally:
+        metrics.observe("stage_duration_seconds", time.perf_counter() - started, stage="enrich_person")
+
+async def reveal_person(client: httpx.AsyncClient, person_id: str, headers: dict, person: dict | None = None) -> dict:
+    # Returns the person's revealed contact data; each person is revealed
+    # at most once, after that it comes from the enrichment cache's store.
+    # `person` adds the other keys the reveal is stored under.
+    keys = person_keys({"id": person_id}, person)
+    revealed_data = await asyncio.to_thread(enrichment_cache.get_revealed, keys)
+    if revealed_data is not None:
+        return revealed_data
+    reveal_url = f"{APOLLO_BASE_URL}/people/{person_id}/reveal"
+    reveal_response = await apollo.request(client, "POST", reveal_url, operation="reveal", headers=headers, json={"reveal_phone_numbers": True})
+    reveal_response.raise_for_status()
+    revealed_data = project_person(reveal_response.json().get("person"))
+    await asyncio.to_thread(enrichment_cache.set_revealed, keys, revealed_data)
+    return revealed_data
+
+async def start_enrichment(client: httpx.AsyncClient, people: list[dict], headers: dict, semaphore: asyncio.Semaphore) -> list[asyncio.Task]:
+    # One task per person, in search order, so callers can hand each lead on
+    # as soon as it is ready. People enriched recently come straight from the
+    # cache. The rest are matched APOLLO_BULK_MATCH_SIZE at a time through
+    # bulk_match, then (with APOLLO_REVEAL=eager) revealed one by one. Every
+    # Apollo call holds `semaphore`, which the caller shares across all the
+    # pages of a search. Phones revealed earlier are picked up from the store
+    # either way. enrich_person never raises, so one slow or failing person
+    # can't sink the others. The cache is read and written on a worker
+    # thread.
+
+    async def bulk_match(batch: list[dict]) -> list[dict]:
+        async with semaphore:
+            return await bulk_match_people(client, batch, headers)
+
+    def store(person: dict, enriched_data: dict, revealed_data: dict | None, fresh: bool) -> dict | None:
+        # Caches a fresh enrichment and returns the person's reveal, from the
+        # store if it was revealed earlier
+        if fresh and enriched_data:
+            enrichment_cache.set_many([
+                (person_keys(person, enriched_data), {"enriched": enriched_data, "revealed": revealed_data})
+            ])
+        if revealed_data is None:
+            revealed_data = enrichment_cache.get_revealed(person_keys(person, enriched_data))
+        return revealed_data
+
+    async def enrich(person: dict, cached: dict | None, matches: asyncio.Task | None, index: int) -> tuple[dict, dict | None]:
+        if cached is not None:
+            enriched_data, revealed_data = cached["enriched"], cached["revealed"]
+        else:
+            # Cancelling a person waiting on its batch cancels the batch too,
+            # which is fine: callers only cancel whatever is left over at once
+            matched = (await matches)[index] if matches is not None else None
+            async with semaphore:
+                enriched_data, revealed_data = await enrich_person(client, person, headers, matched)
+        if cached is None or revealed_data is None:
+            revealed_data = await asyncio.to_thread(store, person, enriched_data, revealed_data, cached is None)
+        return enriched_data, revealed_data
+
+    cached = await asyncio.to_thread(lambda: [enrichment_cache.get(person_keys(person)) for person in people])
+    misses = [person for person, entry in zip(people, cached) if entry is None]
+    batches = {}
+    if APOLLO_BULK_MATCH_SIZE:
+        for start in range(0, len(misses), APOLLO_BULK_MATCH_SIZE):
+            batch = misses[start:start + APOLLO_BULK_MATCH_SIZE]
+            task = asyncio.create_task(bulk_match(batch))
+            for index, person in enumerate(batch):
+                batches[id(person)] = (task, index)
+
+    return [
+        asyncio.create_task(enrich(person, entry, *batches.get(id(person), (None, 0))))
+        for person, entry in zip(people, cached)
+    ]
+
+def apollo_headers() -> dict:
+    return {
         "Cache-Control": "no-cache",
         "Content-Type": "application/json",
         "X-Api-Key": APOLLO_API_KEY
     }
+
+def build_search_payload(query: ApolloSearchRequest, page: int) -> dict:
     payload = {
-        "per_page": 20,
+        "page": page,
+        "per_page": APOLLO_PER_PAGE,
         "contact_details": True,
         "reveal_phone_numbers": True,
         "enrich_company": True  # Add this to get company details
@@ -223,221 +1016,538 @@ async def find_leads(query: ApolloSearchRequest):
     if query.industry_tag:
         payload["industry_tags"] = [query.industry_tag]
 
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        people = response.json().get("people", [])
-        leads_created = []
-        
-        # Log the first person's data to see the structure
-        if people:
-            logger.info(f"Sample person data: {people[0]}")
-        
-        # Enrich each person's data to get emails and phones
-        for person in people:
-            # Get company information
-            company_info = person.get("organization", {})
-            
-            # Collect all phone numbers
-            phone_info = {
-                "phone_numbers": person.get("phone_numbers", []),
-                "sanitized_phone": person.get("sanitized_phone"),
-                "sanitized_mobile_phone": person.get("sanitized_mobile_phone"),
-                "direct_phone": person.get("direct_phone"),
-                "home_phone": person.get("home_phone"),
-                "mobile_phone": person.get("mobile_phone"),
-                "other_phone": person.get("other_phone"),
-                "raw_phone_numbers": person.get("raw_phone_numbers", [])
-            }
+    return payload
+
+async def fetch_people_page(client: httpx.AsyncClient, query: ApolloSearchRequest, page: int) -> tuple[list[dict], int]:
+    response = await apollo.request(
+        client, "POST", f"{APOLLO_BASE_URL}/mixed_people/search", operation="search", headers=apollo_headers(), json=build_search_payload(query, page)
+    )
+    response.raise_for_status()
+    data = response.json()
+    total_pages = (data.get("pagination") or {}).get("total_pages") or page
+    return [project_person(person) for person in data.get("people", [])], total_pages
+
+async def lead_seen(keys: list[str]) -> bool:
+    # The lead index's Bloom filter rules most leads out in memory; only a
+    # possible hit is looked up in SQLite, on a worker thread
+    if not LEAD_DEDUP_EXCLUDE or not lead_index.maybe_seen(keys):
+        return False
+    return await asyncio.to_thread(lead_index.seen, keys, LEAD_DEDUP_EXCLUDE)
+
+async def lead_excluded(exclude_emails: set[str], *people: dict | None) -> bool:
+    # Normalized request exclusions first, then the lead index
+    for person in people:
+        if person and normalize_email(person.get("email")) in exclude_emails:
+            return True
+    return await lead_seen(lead_keys(*people))
+
+def build_lead_result(person: dict, enriched_data: dict, revealed_data: dict | None, exclude_emails: set[str]) -> LeadCard | None:
+    # Returns the lead card for one person, or None if it should be skipped.
+    # Enriched fields win over search fields.
+    email = enriched_data.get("email") or person.get("email")
+    if email and normalize_email(email) in exclude_emails:
+        return None
+
+    company_info = person.get("organization") or {}
+    enriched_company = enriched_data.get("organization") or {}
+    phones = collect_phones(person, enriched_data, revealed_data)
+    if sampled_debug(logger, LOG_SAMPLE_RATE):
+        logger.debug(f"Phones for {email}: {phones} from person {person}, enriched {enriched_data}, revealed {revealed_data}")
+
+    return LeadCard(
+        firstname=enriched_data.get("first_name") or person.get("first_name") or "Unknown",
+        lastname=enriched_data.get("last_name") or person.get("last_name") or "Unknown",
+        email=email,
+        company=enriched_company.get("name") or company_info.get("name") or "Unknown Company",
+        company_description=enriched_company.get("description") or company_info.get("description"),
+        company_linkedin_url=enriched_company.get("linkedin_url") or company_info.get("linkedin_url"),
+        job_title=enriched_data.get("title") or person.get("title"),
+        description=(
+            person.get("headline") or person.get("summary")
+            or enriched_data.get("headline") or enriched_data.get("summary")
+        ),
+        linkedin_url=enriched_data.get("linkedin_url") or person.get("linkedin_url"),
+        phones=phones,
+        apollo_contact_info=apollo_contact_info(person, enriched_data, revealed_data),
+        apollo_id=enriched_data.get("id") or person.get("id"),
+        revealed=revealed_data is not None,
+    )
 
-            # Log initial phone info
-            logger.info(f"Initial phone info from person: {phone_info}")
+async def iter_leads(query: ApolloSearchRequest):
+    # Yields lead cards in search order as soon as each one is enriched,
+    # stopping at query.target_count. The next search page is only asked
+    # for while the people read, being enriched and being fetched so far
+    # (a full page for each fetch) can't reach the target, with at most
+    # APOLLO_PAGE_PREFETCH fetches in flight; its people start enriching
+    # as soon as it arrives, while earlier pages are still being read. At
+    # most APOLLO_ENRICH_CONCURRENCY enrichment calls run at once for the
+    # whole search. Errors on the first page propagate; later ones end the
+    # listing early.
+    headers = apollo_headers()
+    excluded = {normalize_email(email) for email in query.exclude_emails} - {None}
+    found = 0
+    client = http_clients.get("apollo")
+    semaphore = asyncio.Semaphore(max(1, APOLLO_ENRICH_CONCURRENCY))
+    fetches = deque()  # (page, search task), in page order
+    started = deque()  # (people, enrichment tasks) per page, oldest first
+    unread = 0  # people left on the page being read
+    next_page, total_pages = 1, None  # total_pages is known once page 1 is in
+    exhausted = False
 
-            # Initialize revealed_data as None
-            revealed_data = None
+    def needed() -> int:
+        pending = unread + sum(len(people) for people, _ in started) + APOLLO_PER_PAGE * len(fetches)
+        return query.target_count - found - pending
 
+    def fetch_pages():
+        nonlocal next_page
+        while not exhausted and needed() > 0 and len(fetches) < APOLLO_PAGE_PREFETCH:
+            if next_page > 1 and (total_pages is None or next_page > min(total_pages, APOLLO_MAX_PAGES)):
+                return
+            task = asyncio.create_task(fetch_people_page(client, query, next_page))
+            # A fetch cancelled or dropped after an error elsewhere is never awaited
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            fetches.append((next_page, task))
+            next_page += 1
+
+    def stop_fetching():
+        nonlocal exhausted
+        exhausted = True
+        while fetches:
+            fetches.popleft()[1].cancel()
+
+    async def start_pages(wait: bool):
+        # Starts enriching the pages that have arrived, in order; with
+        # `wait`, waits for the next one if none has
+        nonlocal total_pages
+        fetch_pages()
+        while fetches and (wait or fetches[0][1].done()):
+            wait = False
+            page, task = fetches.popleft()
             try:
-                enrich_url = "https://api.apollo.io/api/v1/people/match"
-                enrich_payload = {
-                    "first_name": person.get("first_name", ""),
-                    "last_name": person.get("last_name", ""),
-                    "organization_name": company_info.get("name", ""),
-                    "linkedin_url": person.get("linkedin_url", ""),
-                    "reveal_personal_emails": True,
-                    "reveal_phone_numbers": True,
-                    "contact_details": True
-                }
-                
-                enrich_response = requests.post(enrich_url, headers=headers, json=enrich_payload)
-                enrich_response.raise_for_status()
-                enriched_data = enrich_response.json().get("person", {})
-                enriched_company = enriched_data.get("organization", {})
-                
-                # Log enriched data phone fields
-                logger.info(f"Enriched data phone fields: {enriched_data.get('phone_numbers', [])}, sanitized: {enriched_data.get('sanitized_phone')}, mobile: {enriched_data.get('sanitized_mobile_phone')}")
-                
-                # Add enriched phone numbers
-                if enriched_data:
-                    phone_info.update({
-                        "enriched_phone_numbers": enriched_data.get("phone_numbers", []),
-                        "enriched_sanitized_phone": enriched_data.get("sanitized_phone"),
-                        "enriched_sanitized_mobile_phone": enriched_data.get("sanitized_mobile_phone"),
-                        "enriched_direct_phone": enriched_data.get("direct_phone"),
-                        "enriched_mobile_phone": enriched_data.get("mobile_phone")
-                    })
-                    logger.info(f"Updated phone info after enrichment: {phone_info}")
-                
-                # Try to reveal phone numbers specifically
-                if enriched_data.get("id"):
-                    reveal_url = f"https://api.apollo.io/api/v1/people/{enriched_data['id']}/reveal"
-                    reveal_response = requests.post(reveal_url, headers=headers, json={"reveal_phone_numbers": True})
-                    if reveal_response.status_code == 200:
-                        revealed_data = reveal_response.json().get("person", {})
-                        # Log revealed data phone fields
-                        logger.info(f"Revealed data phone fields: {revealed_data.get('phone_numbers', [])}, sanitized: {revealed_data.get('sanitized_phone')}, mobile: {revealed_data.get('sanitized_mobile_phone')}")
-                        # Update phone info with revealed data
-                        if revealed_data:
-                            phone_info.update({
-                                "revealed_phone_numbers": revealed_data.get("phone_numbers", []),
-                                "revealed_sanitized_phone": revealed_data.get("sanitized_phone"),
-                                "revealed_sanitized_mobile_phone": revealed_data.get("sanitized_mobile_phone"),
-                                "revealed_direct_phone": revealed_data.get("direct_phone"),
-                                "revealed_mobile_phone": revealed_data.get("mobile_phone")
-                            })
-                            logger.info(f"Final phone info after reveal: {phone_info}")
+                people, total_pages = await task
             except Exception as e:
-                logger.error(f"Error enriching/revealing contact: {e}")
-                enriched_data = {}
-                enriched_company = {}
-                revealed_data = None
-            
-            # Get email from enriched data
-            email = enriched_data.get("email") or person.get("email")
-            
-            # Skip if email is in exclude list
-            if email and email in query.exclude_emails:
-                continue
-                
-            # Get job title and description
-            job_title = (
-                enriched_data.get("title") or 
-                person.get("title") or 
-                None
-            )
-            
-            description = None
-            if person.get("headline"):
-                description = person["headline"]
-            elif person.get("summary"):
-                description = person["summary"]
-            elif enriched_data.get("headline"):
-                description = enriched_data["headline"]
-            elif enriched_data.get("summary"):
-                description = enriched_data["summary"]
-
-            # Get company information
-            company_name = enriched_company.get("name") or company_info.get("name", "")
-            company_description = (
-                enriched_company.get("description") or 
-                company_info.get("description") or 
-                None
-            )
-            company_linkedin_url = (
-                enriched_company.get("linkedin_url") or 
-                company_info.get("linkedin_url") or 
-                None
-            )
+                stop_fetching()
+                if page == 1:
+                    raise
+                logger.error(f"Apollo API error on page {page}: {e}")
+                return
+            if not people:
+                stop_fetching()
+                return
 
-            # Get first and last name with fallbacks
-            firstname = (
-                enriched_data.get("first_name") or 
-                person.get("first_name") or 
-                "Unknown"
-            )
-            lastname = (
-                enriched_data.get("last_name") or 
-                person.get("last_name") or 
-                "Unknown"
-            )
-            
-            # Use enriched data if available, otherwise fall back to original data
-            lead_data = LeadRequest(
-                firstname=firstname,
-                lastname=lastname,
-                email=email,
-                phone=None,  # We'll add phone separately in the response
-                company=company_name or "Unknown Company",
-                company_description=company_description,
-                company_linkedin_url=company_linkedin_url,
-                job_title=job_title,
-                description=description,
-                linkedin_url=enriched_data.get("linkedin_url") or person.get("linkedin_url"),
-                message=""
-            )
-            
-            # Log final phone info before sending to frontend
-            logger.info(f"Final phone info being sent to frontend: {phone_info}")
-
-            # Only add leads that have at least a company name
-            if lead_data.company:
-                # Create response with Apollo contact details
-                lead_response = {
-                    "lead": lead_data.dict(),
-                    "apollo_contact_info": phone_info
-                }
-                
-                leads_created.append(lead_response)
+            # Log the first person's data to see the structure
+            if page == 1 and sampled_debug(logger, LOG_SAMPLE_RATE):
+                logger.debug(f"Sample person data: {people[0]}")
+
+            # Drop people we already know about before paying to enrich them
+            people = [person for person in people if not await lead_excluded(excluded, person)]
+            started.append((people, await start_enrichment(client, people, headers, semaphore)))
+            fetch_pages()
+
+    try:
+        while found < query.target_count:
+            await start_pages(wait=not started)
+            if not started:
+                break
+            people, tasks = started.popleft()
+            unread = len(people)
+            try:
+                for person, task in zip(people, tasks):
+                    unread -= 1
+                    enriched_data, revealed_data = await task
+                    # Search results often hide the email; enrichment may turn up a known one
+                    card = None if await lead_excluded(excluded, enriched_data) else build_lead_result(person, enriched_data, revealed_data, excluded)
+                    if card is not None:
+                        await asyncio.to_thread(lead_index.add, lead_keys(person, enriched_data), "found")
+                        yield card
+                        found += 1
+                        if found >= query.target_count:
+                            break
+                    # A skipped person may mean another page is needed
+                    await start_pages(wait=False)
+            finally:
+                # Don't keep paying for enrichments nobody will read
+                for task in tasks:
+                    task.cancel()
+    finally:
+        stop_fetching()
+        for _, tasks in started:
+            for task in tasks:
+                task.cancel()
+
+def search_cache_key(query: ApolloSearchRequest) -> tuple:
+    # Case and whitespace don't change what Apollo returns
+    filters = (query.job_title, query.organization_name, query.location, query.industry_tag)
+    return tuple(" ".join(value.split()).casefold() for value in filters) + (query.target_count,)
+
+def card_keys(card: LeadCard) -> list[str]:
+    return lead_keys({"email": card.email, "linkedin_url": card.linkedin_url})
+
+shared_searches = SharedWalks(search_cache, iter_leads, card_keys)
+
+def iter_shared_leads(query: ApolloSearchRequest):
+    # iter_leads, with identical searches sharing one Apollo walk: while it
+    # runs, and for SEARCH_CACHE_TTL seconds after. Each caller's
+    # exclude_emails and a fresh lead index check are applied on top of the
+    # shared cards; if they drop any, the caller tops up with its own walk,
+    # which mostly hits the enrichment cache for the pages already seen.
+    if SEARCH_CACHE_TTL <= 0:
+        return iter_leads(query)
+
+    excluded = {normalize_email(email) for email in query.exclude_emails} - {None}
+
+    async def skip(card: LeadCard, keys: list[str]) -> bool:
+        return normalize_email(card.email) in excluded or await lead_seen(keys)
 
-                # Break if we have enough unique leads
-                if len(leads_created) >= 20:
-                    break
+    # The shared walk leaves exclude_emails to each caller
+    shared_query = query.model_copy(update={"exclude_emails": set()})
+    return shared_searches.iter(search_cache_key(query), shared_query, query, skip, query.target_count)
 
-        return {"results": leads_created}
+async def stream_leads(query: ApolloSearchRequest):
+    # NDJSON: one lead card per line, then a final {"done": true} line, or an
+    # {"error": ...} line if the search itself failed
+    count = 0
+    try:
+        async for card in iter_shared_leads(query):
+            count += 1
+            yield dumps(card.to_dict(query.compact)) + b"\n"
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        logger.error(f"Apollo API error: {e}")
+        yield dumps({"error": "Error fetching leads from Apollo."}) + b"\n"
+        return
+    yield dumps({"done": True, "count": count}) + b"\n"
 
-    except requests.exceptions.RequestException as e:
+@app.post("/find-leads")
+async def find_leads(query: ApolloSearchRequest):
+    if query.stream:
+        return StreamingResponse(stream_leads(query), media_type="application/x-ndjson")
+
+    try:
+        leads_created = [card.to_dict(query.compact) async for card in iter_shared_leads(query)]
+    except (httpx.HTTPError, CircuitOpenError) as e:
         logger.error(f"Apollo API error: {e}")
         raise HTTPException(status_code=500, detail="Error fetching leads from Apollo.")
+    if query.compact:
+        # Already plain JSON types, so skip FastAPI's encoder
+        return Response(dumps({"results": leads_created}), media_type="application/json")
+    return {"results": leads_created}
+
+@app.post("/reveal-phones")
+async def reveal_phones(request: RevealRequest):
+    # Phones for the people a user picked, revealed now if they never were
+    client = http_clients.get("apollo")
+    headers = apollo_headers()
+    semaphore = asyncio.Semaphore(max(1, APOLLO_ENRICH_CONCURRENCY))
+
+    async def reveal(person_id: str) -> dict:
+        async with semaphore:
+            return await reveal_cache.get_or_compute(person_id, lambda: reveal_person(client, person_id, headers))
+
+    person_ids = list(dict.fromkeys(request.ids))
+    outcomes = await asyncio.gather(*(reveal(person_id) for person_id in person_ids), return_exceptions=True)
+    results = {}
+    for person_id, outcome in zip(person_ids, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Error revealing contact {person_id}: {outcome}")
+            results[person_id] = {"phones": [], "error": "Error revealing phone numbers."}
+        else:
+            results[person_id] = {"phones": collect_phones(outcome)}
+    return {"results": results}
+
+# Lead pipeline stages. They are shared by all requests, so each
+# provider's concurrency limit holds across concurrent batches.
+async def generate_lead_email(record: dict) -> dict:
+    record["email"] = await generate_email(record["lead"])
+    return record
+
+async def render_lead_emails(records: list[dict]) -> list:
+    with metrics.timer("stage_duration_seconds", stage="render_templates"):
+        for record in records:
+            record["email"] = record["template"].render(record["lead"])
+    return records
+
+async def write_hybrid_email(record: dict) -> dict:
+    template = record["template"]
+    opening = await generate_opening(record["lead"]) if template.uses_opening else None
+    record["email"] = template.render(record["lead"], opening)
+    return record
+
+def lead_email_batch(generate):
+    # BatchStage func writing emails for a batch of records with `generate`
+    async def run(records: list[dict]) -> list:
+        emails = await generate([record["lead"] for record in records])
+        outcomes = []
+        for record, email in zip(records, emails):
+            if not isinstance(email, Exception):
+                record["email"] = email
+            outcomes.append(email if isinstance(email, Exception) else record)
+        return outcomes
+    return run
+
+async def rescore_borderline_lead(record: dict) -> dict:
+    if lead_scorer.is_borderline(record["score"]):
+        record["score"] = await llm_score_lead(record["lead"], record["score"])
+    return record
+
+async def sync_leads_to_hubspot(records: list[dict]) -> list:
+    outcomes = await push_to_hubspot_batch([record["lead"] for record in records])
+    results = []
+    for record, outcome in zip(records, outcomes):
+        if "error" in outcome:
+            results.append(RuntimeError(outcome["error"]))
+        else:
+            record["hubspot"] = outcome["result"]
+            results.append(record)
+    return results
+
+async def send_lead_emails(records: list[dict]) -> list:
+    to_send = [record for record in records if record["lead"].email]
+    messages = [
+        (
+            record["lead"].email,
+            f"Exciting Opportunity for {record['lead'].firstname} {record['lead'].lastname} at {record['lead'].company}",
+            record["email"]
+        )
+        for record in to_send
+    ]
+    with metrics.timer("stage_duration_seconds", stage="smtp_batch"):
+        send_results = await run_in_threadpool(smtp_pool.send_batch, messages)
+    failures = {}
+    for record, result in zip(to_send, send_results):
+        if result["status"] == "sent":
+            record["email_sent"] = True
+        else:
+            failures[id(record)] = RuntimeError(result["error"])
+    return [failures.get(id(record), record) for record in records]
+
+generate_stage = Stage("openai", generate_lead_email, OPENAI_CONCURRENCY)
+batched_generate_stage = BatchStage(
+    "openai-batched", lead_email_batch(generate_emails_batched), EMAIL_BATCH_SIZE, EMAIL_BATCH_WAIT, concurrency=OPENAI_CONCURRENCY
+)
+offline_generate_stage = BatchStage(
+    "openai-offline", lead_email_batch(generate_emails_offline), EMAIL_OFFLINE_BATCH_SIZE, EMAIL_OFFLINE_BATCH_WAIT
+)
+generate_stages = {"single": generate_stage, "batched": batched_generate_stage, "offline": offline_generate_stage}
+template_stage = BatchStage("templates", render_lead_emails, batch_size=1000, max_wait=0)
+hybrid_stage = Stage("openai-opening", write_hybrid_email, OPENAI_CONCURRENCY)
+llm_score_stage = Stage("openai-scoring", rescore_borderline_lead, LEAD_SCORING_LLM_CONCURRENCY)
+hubspot_stage = BatchStage("hubspot", sync_leads_to_hubspot, HUBSPOT_BATCH_SIZE, HUBSPOT_BATCH_WAIT)
+smtp_stage = BatchStage("smtp", send_lead_emails, batch_size=50, max_wait=0.05)
+
+def lead_stages(send_immediately: bool, generation: str | None = None, mode: str | None = None) -> list:
+    # `generation` picks how LLM emails are written; template and hybrid
+    # emails have a stage of their own
+    mode = mode or EMAIL_MODE
+    if mode == "template":
+        stages = [template_stage, hubspot_stage]
+    elif mode == "hybrid":
+        stages = [hybrid_stage, hubspot_stage]
+    else:
+        stages = [generate_stages.get(generation or EMAIL_GENERATION, generate_stage), hubspot_stage]
+    if LEAD_SCORING_LLM == "borderline":
+        stages.insert(1, llm_score_stage)
+    if send_immediately:
+        stages.append(smtp_stage)
+    return stages
+
+def new_lead_records(leads: list[LeadRequest], template: EmailTemplate | None = None) -> list[dict]:
+    # Rule scores for the whole batch up front; only borderline leads reach the LLM stage
+    with metrics.timer("stage_duration_seconds", stage="score_rules_batch"):
+        scores = lead_scorer.score_batch(leads)
+    return [
+        {"lead": lead, "email": None, "template": template, "score": score, "hubspot": None, "email_sent": False}
+        for lead, score in zip(leads, scores)
+    ]
+
+def email_options(mode: str | None, template: str | None) -> tuple[str, EmailTemplate | None]:
+    mode = mode or EMAIL_MODE
+    return mode, email_template(template) if mode != "llm" else None
+
+def remember_leads(records: list[dict], outcomes: list):
+    # Blocking; callers run it on a worker thread
+    for record, outcome in zip(records, outcomes):
+        if not isinstance(outcome, Exception):
+            lead_index.add(lead_keys(record["lead"].dict()), "emailed" if record["email_sent"] else "processed")
+
+def lead_result(record: dict, outcome) -> dict:
+    lead = record["lead"]
+    if isinstance(outcome, Exception):
+        logger.error(f"Error processing lead {lead.email}: {outcome}")
+        return {
+            "lead": lead.dict(),
+            "error": str(outcome)
+        }
+    return {
+        "lead": lead.dict(),
+        "email": record["email"],
+        "template": record["template"].key if record["template"] else None,
+        "score": record["score"].label,
+        "score_details": record["score"].to_dict(),
+        "hubspot": record["hubspot"],
+        "email_sent": record["email_sent"]
+    }
 
 @app.post("/process-leads")
 async def process_leads(request: EmailGenerationRequest):
-    processed_leads = []
-    
-    for lead in request.leads:
-        try:
-            # Generate email
-            email_text = generate_email(lead)
-            
-            # Score the lead
-            lead_score = agent.run(
-                f"Score this lead: {lead.firstname} {lead.lastname}, role at {lead.company}, "
-                "given that this what we do, SkillUp MENA is the pioneer of e-learning services, "
-                "with our vast curated e-learning library of over 85000 courses, all offered by "
-                "the world's leading training providers."
-            )
-            
-            # Push to HubSpot
-            hubspot_response = push_to_hubspot(lead)
-            
-            # Send email if requested
-            email_sent = False
-            if request.send_immediately and lead.email:
-                email_subject = f"Exciting Opportunity for {lead.firstname} {lead.lastname} at {lead.company}"
-                send_email_smtp(lead.email, email_subject, email_text)
-                email_sent = True
-            
-            processed_leads.append({
-                "lead": lead.dict(),
-                "email": email_text,
-                "score": lead_score,
-                "hubspot": hubspot_response,
-                "email_sent": email_sent
-            })
-            
-        except Exception as e:
-            logger.error(f"Error processing lead {lead.email}: {e}")
-            processed_leads.append({
-                "lead": lead.dict(),
-                "error": str(e)
-            })
-    
-    return {"results": processed_leads}
\ No newline at end of file
+    mode, template = email_options(request.mode, request.template)
+    records = new_lead_records(request.leads, template)
+    outcomes = await run_pipeline(records, lead_stages(request.send_immediately, request.generation, mode))
+    await asyncio.to_thread(remember_leads, records, outcomes)
+    return {"results": [lead_result(record, outcome) for record, outcome in zip(records, outcomes)]}
+
+# Bulk processing jobs: same pipeline as /process-leads, but the request
+# returns a job id right away and results are stored as they land
+async def run_process_leads_job(job: dict, items: list[tuple[int, dict]], on_result):
+    options = job["options"]
+    template = email_templates.get(options["template"]) if options.get("template") else None
+    records = new_lead_records([LeadRequest(**item) for _, item in items], template)
+
+    def record_outcome(position: int, outcome):
+        idx = items[position][0]
+        on_result(idx, lead_result(records[position], outcome), failed=isinstance(outcome, Exception))
+
+    stages = lead_stages(options.get("send_immediately", False), options.get("generation"), options.get("mode", "llm"))
+    outcomes = await run_pipeline(records, stages, on_result=record_outcome)
+    await asyncio.to_thread(remember_leads, records, outcomes)
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: EmailGenerationRequest):
+    require_job_store()
+    # The template version is fixed when the job is submitted
+    mode, template = email_options(request.mode, request.template)
+    job_id = await asyncio.to_thread(
+        job_store.create,
+        "process-leads", [lead.dict() for lead in request.leads],
+        {
+            "send_immediately": request.send_immediately, "generation": request.generation,
+            "mode": mode, "template": template.key if template else None
+        }
+    )
+    job_runner.notify()
+    return await asyncio.to_thread(job_store.get, job_id)
+
+def import_row(idx: int, line: int, row: dict | str) -> tuple:
+    # (idx, item, result) for job_store.add_items; rows that aren't valid
+    # leads go in as failed items, so indexes still follow the file
+    if isinstance(row, str):
+        return idx, {}, {"lead": {}, "error": f"Line {line}: {row}"}
+    try:
+        return idx, LeadRequest(**row).dict(), None
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        return idx, row, {"lead": row, "error": f"Line {line}: {problems}"}
+
+@app.post("/jobs/import", status_code=202)
+async def import_job(
+    request: Request,
+    file_format: Literal["csv", "jsonl"] | None = Query(None, alias="format"),  # defaults from the Content-Type
+    send_immediately: bool = False,
+    generation: Literal["single", "batched", "offline"] | None = None,
+    mode: Literal["llm", "template", "hybrid"] | None = None,
+    template: str | None = None,
+):
+    # A /jobs job from a CSV or JSONL file sent as the request body. Rows
+    # are parsed and stored as the upload arrives; the job is queued once
+    # the whole file is in.
+    require_job_store()
+    mode, template = email_options(mode, template)
+    content_type = request.headers.get("content-type", "")
+    parser = LeadFileParser(file_format or ("jsonl" if "json" in content_type else "csv"))
+    job_id = await asyncio.to_thread(
+        job_store.start_import,"process-leads", {
+        "send_immediately": send_immediately, "generation": generation,
+        "mode": mode, "template": template.key if template else None
+    })
+    rows, count = [], 0
+    try:
+        async for chunk in request.stream():
+            for line, row in parser.feed(chunk):
+                rows.append(import_row(count, line, row))
+                count += 1
+            if len(rows) >= 500:
+                await asyncio.to_thread(job_store.add_items, job_id, rows)
+                rows = []
+        for line, row in parser.close():
+            rows.append(import_row(count, line, row))
+            count += 1
+        if rows:
+            await asyncio.to_thread(job_store.add_items, job_id, rows)
+    except Exception as e:
+        logger.error(f"Import of job {job_id} failed after {count} rows: {e}")
+        await asyncio.to_thread(job_store.finish, job_id, error=f"Import failed after {count} rows.")
+        raise HTTPException(status_code=400, detail=f"Import failed after {count} rows.")
+    await asyncio.to_thread(job_store.finish_import, job_id)
+    job_runner.notify()
+    logger.info(f"Imported {count} rows into job {job_id}")
+    return await asyncio.to_thread(job_store.get, job_id)
+
+@app.get("/jobs/{job_id}/export")
+async def export_job(job_id: str, file_format: Literal["csv", "jsonl"] = Query("csv", alias="format")):
+    # Finished results so far, streamed a page at a time
+    if await asyncio.to_thread(require_job_store().get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return StreamingResponse(
+        export_chunks(job_store.iter_results(job_id), file_format),
+        media_type="text/csv" if file_format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="job-{job_id}.{file_format}"'}
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(require_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100, after: int = -1):
+    # Pollers pass after= the last index they have instead of an offset, so
+    # each poll only returns results past it
+    job = await asyncio.to_thread(require_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    limit = max(1, min(1000, limit))
+    results = await asyncio.to_thread(job_store.results, job_id, max(0, offset), limit, after)
+    return {**job, "results": results}
+
+@app.get("/email-templates")
+async def list_email_templates():
+    return {
+        "mode": EMAIL_MODE,
+        "default": email_templates.get(EMAIL_TEMPLATE).key,
+        "templates": [
+            {"key": template.key, "name": template.name, "version": template.version, "body": template.body}
+            for template in email_templates.templates()
+        ],
+    }
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {"enrichment": await asyncio.to_thread(enrichment_cache.stats), "email": email_cache.stats(), "search": search_cache.stats()}
+
+@app.get("/lead-index-stats")
+async def lead_index_stats():
+    return await asyncio.to_thread(lead_index.stats)
+
+@app.get("/outbound-stats")
+async def outbound_stats():
+    return {provider.name: provider.stats() for provider in (apollo, hubspot, openai_provider)}
+
+# Read at scrape time, so they cost nothing between scrapes
+metrics.gauge(
+    "provider_circuit_open", "1 while a provider's circuit breaker is open",
+    lambda: [({"provider": p.name}, p.breaker.state == "open") for p in (apollo, hubspot, openai_provider)]
+)
+metrics.gauge("enrichment_cache_entries", "Entries in the enrichment cache", lambda: enrichment_cache.stats()["entries"])
+metrics.gauge("email_cache_entries", "Entries in the generated email cache", lambda: email_cache.stats()["entries"])
+metrics.gauge("search_cache_entries", "Running and recent searches in the search cache", lambda: search_cache.stats()["entries"])
+metrics.gauge("lead_index_keys", "Keys in the lead index", lambda: lead_index.stats()["keys"])
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Gauges count rows in the SQLite stores
+    return PlainTextResponse(await asyncio.to_thread(metrics.render), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+async def health_check():
+    return {"status": "ok"}
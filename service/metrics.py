@@ -0,0 +1,167 @@
+import contextvars
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# In-process counters and histograms rendered in the Prometheus text format,
+# plus request-scoped trace ids: TraceMiddleware gives every request an id
+# (the caller's X-Trace-Id if it sent one), returns it as a header and times
+# the request, and TraceIdFilter stamps it on every log record.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+trace_id = contextvars.ContextVar("trace_id", default="-")
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def sampled_debug(logger: logging.Logger, rate: float) -> bool:
+    # For verbose payload logging on hot paths: true for roughly `rate` of
+    # calls, and only when the logger is at DEBUG, so the message isn't even
+    # formatted by default
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < rate
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id.get()
+        return True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._help = {}  # name -> help text
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+        self._gauges = {}  # name -> callable read at scrape time
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def gauge(self, name: str, help_text: str, read):
+        # `read()` is called at scrape time and returns a number, or a list
+        # of (labels dict, number) pairs
+        self._help[name] = help_text
+        self._gauges[name] = read
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(series)) for key, series in self._histograms.items())
+        lines = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name in described:
+                return
+            described.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), series in histograms:
+            header(name, "histogram")
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{bound:g}"'
+                lines.append(f"{name}_bucket{_labels(labels, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_labels(labels, le)} {series[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {series[-2]:g}")
+            lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+        for name, read in sorted(self._gauges.items()):
+            header(name, "gauge")
+            value = read()
+            samples = value if isinstance(value, list) else [({}, value)]
+            for labels, sample in samples:
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {float(sample):g}")
+        return "\n".join(lines) + "\n"
+
+
+class TraceMiddleware:
+    # Plain ASGI middleware, so streamed responses are timed to their last
+    # byte and run with the request's trace id set
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+        metrics.describe("http_request_duration_seconds", "Time to serve a request, by route and status")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_trace_id = headers.get(b"x-trace-id", b"").decode("latin-1")
+        if not re.fullmatch(r"[A-Za-z0-9._-]{1,64}", request_trace_id):
+            request_trace_id = new_trace_id()
+        token = trace_id.set(request_trace_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [(b"x-trace-id", request_trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            # The router records the matched route in the scope; grouping by
+            # its template keeps ids out of the label values
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.observe(
+                "http_request_duration_seconds", time.perf_counter() - started,
+                method=scope["method"], route=route, status=str(status)
+            )
+            trace_id.reset(token)
@@ -0,0 +1,234 @@
+import asyncio
+import email.utils
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# Shared policy for calls to third-party APIs. Each provider gets a token
+# bucket that paces requests to its rate limit, retries 429s, 5xx and
+# connection errors with jittered exponential backoff (or however long the
+# provider's Retry-After asks for), and a circuit breaker that fails fast
+# while the provider keeps erroring instead of piling more load on it.
+# Given a metrics registry, every attempt is timed by provider, operation
+# and outcome.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, abort=None) -> bool:
+        # Returns False without taking a token if `abort()` turns true
+        # while waiting
+        if self.rate <= 0:
+            return True
+        # The lock makes waiters queue up in order, so a burst is spread
+        # out at `rate` instead of everybody waking at once
+        async with self._lock:
+            while True:
+                if abort is not None and abort():
+                    return False
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        # A 429 means the provider wants everybody to back off, not just the
+        # caller. The bucket starts empty when the pause ends, instead of
+        # having refilled while paused.
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._updated = self._paused_until
+        self._tokens = 0.0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            # Let one trial call through and hold the rest back until it
+            # succeeds (closing the circuit) or fails (reopening it)
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        retry_exceptions: tuple = (httpx.TransportError,),
+        metrics=None,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_exceptions = retry_exceptions
+        self.metrics = metrics
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter: spreads retries from many callers over the whole window
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def request(
+        self, client: httpx.AsyncClient, method: str, url: str, operation: str = "request", **kwargs
+    ) -> httpx.Response:
+        # Returns the final response, including a non-2xx one once retries
+        # are used up, so callers keep using raise_for_status as before
+        return await self.call(lambda: client.request(method, url, **kwargs), operation)
+
+    def _record(self, operation: str, outcome: str, started: float | None = None):
+        if self.metrics is None:
+            return
+        if started is None:
+            self.metrics.inc("provider_calls_total", provider=self.name, operation=operation, outcome=outcome)
+            return
+        self.metrics.observe(
+            "provider_call_duration_seconds", time.perf_counter() - started,
+            provider=self.name, operation=operation, outcome=outcome
+        )
+
+    async def call(self, func, operation: str = "request"):
+        # `func` makes one attempt; it may return an httpx.Response or raise
+        # an error carrying one (as the OpenAI SDK does). `operation` labels
+        # the attempt in metrics.
+        attempt = 0
+        while True:
+            # An open circuit fails fast, including calls already queued for
+            # a token when it opened
+            if not await self.bucket.acquire(abort=lambda: self.breaker.state == "open"):
+                self._reject(operation)
+            if not self.breaker.allow():
+                self._reject(operation)
+            self.calls += 1
+
+            response, error = None, None
+            started = time.perf_counter()
+            try:
+                result = await func()
+            except self.retry_exceptions as e:
+                error = e
+            except Exception as e:
+                response = getattr(e, "response", None)
+                if not isinstance(response, httpx.Response) or response.status_code not in RETRY_STATUSES:
+                    self._record(operation, "error", started)
+                    raise
+                error = e
+            else:
+                if not isinstance(result, httpx.Response) or result.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    failed = isinstance(result, httpx.Response) and result.status_code >= 400
+                    self._record(operation, str(result.status_code) if failed else "ok", started)
+                    return result
+                response = result
+            self._record(operation, str(response.status_code) if response is not None else "error", started)
+
+            if response is not None and response.status_code == 429:
+                self.throttled += 1
+                delay = self.backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                self.bucket.pause(delay)
+            else:
+                delay = self.backoff(attempt)
+                # Only server and connection failures count towards tripping
+                # the breaker; a 429 is the provider working as intended
+                self.breaker.record_failure()
+
+            if attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+
+            status = response.status_code if response is not None else type(error).__name__
+            logger.warning(f"{self.name} call failed ({status}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            self.retries += 1
+            self._record(operation, "retry")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _reject(self, operation: str):
+        self.rejected += 1
+        self._record(operation, "rejected")
+        raise CircuitOpenError(f"{self.name} circuit is open after {self.breaker.failures} failures")
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "circuit": self.breaker.state,
+        }
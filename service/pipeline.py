@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Items flow through a list of stages one after another, while many items
+# are in flight at once. Each stage caps how many items it works on at the
+# same time, so a stage can be sized to its provider's rate limit. Stages
+# are meant to be created once and shared, which makes the limit hold
+# across concurrent requests too.
+
+class Stage:
+    def __init__(self, name: str, func, concurrency: int):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def run(self, item):
+        async with self._semaphore:
+            return await self.func(item)
+
+
+class BatchStage:
+    # Groups items into calls of up to `batch_size`, flushing a partial
+    # batch once the oldest item has waited `max_wait` seconds. `func` takes
+    # a list of items and returns one result per item; an Exception in that
+    # list fails only its own item.
+
+    def __init__(self, name: str, func, batch_size: int, max_wait: float = 0.05, concurrency: int = 1):
+        self.name = name
+        self.func = func
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def run(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        async with self._semaphore:
+            try:
+                results = await self.func([item for item, _ in batch])
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                results = [e] * len(batch)
+
+        if len(results) != len(batch):
+            error = RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+            results = [error] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+async def run_pipeline(items: list, stages: list, on_result=None) -> list:
+    # Returns, in input order, each item's final value or the exception
+    # that stopped it. A failing item skips its remaining stages and never
+    # affects the others. `on_result(index, outcome)` is called as soon as
+    # each item is finished, for callers that report progress.
+    async def flow(index, item):
+        try:
+            for stage in stages:
+                item = await stage.run(item)
+        except Exception as e:
+            item = e
+        if on_result is not None:
+            on_result(index, item)
+        return item
+
+    return await asyncio.gather(*(flow(index, item) for index, item in enumerate(items)), return_exceptions=True)
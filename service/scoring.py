@@ -0,0 +1,100 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+
+# Rule-based lead scoring. Each scored field has its own keyword -> points
+# table; a lead's score is the base plus the points of every distinct
+# keyword found, clamped to 0..100. Tables are compiled into one regex per
+# field, so scoring a lead is a handful of regex scans.
+
+DEFAULT_KEYWORDS = {
+    "job_title": {
+        "learning": 30, "l&d": 30, "training": 25, "talent": 20, "enablement": 15,
+        "hr": 20, "human resources": 20, "people": 15, "organizational development": 20,
+        "chief": 20, "head": 15, "vp": 15, "vice president": 15, "director": 15, "manager": 8,
+        "intern": -40, "student": -40, "assistant": -10,
+    },
+    "description": {
+        "learning": 10, "training": 10, "upskilling": 12, "reskilling": 12, "talent": 8,
+        "development": 5, "people": 5, "hr": 5, "culture": 4,
+    },
+    "company_description": {
+        "enterprise": 10, "employees": 5, "workforce": 8, "bank": 8, "telecom": 8,
+        "government": 8, "consulting": 5, "healthcare": 5,
+        "e-learning": -20, "training provider": -15,
+    },
+}
+
+
+@dataclass
+class ScoringRules:
+    keywords: dict[str, dict[str, float]] = field(default_factory=lambda: DEFAULT_KEYWORDS)
+    base: float = 20
+    high_threshold: float = 60
+    low_threshold: float = 35
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScoringRules":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+@dataclass(slots=True)
+class LeadScore:
+    score: int
+    tier: str
+    matches: list[str]
+    source: str = "rules"
+
+    @property
+    def label(self) -> str:
+        return f"{self.tier} potential ({self.score}/100)"
+
+    def to_dict(self) -> dict:
+        return {"score": self.score, "tier": self.tier, "matches": self.matches, "source": self.source}
+
+
+class LeadScorer:
+    def __init__(self, rules: ScoringRules | None = None):
+        self.rules = rules or ScoringRules()
+        self._patterns = {}
+        for field_name, weights in self.rules.keywords.items():
+            if not weights:
+                continue
+            # Longest first so "human resources" wins over "hr"
+            alternatives = "|".join(re.escape(keyword.lower()) for keyword in sorted(weights, key=len, reverse=True))
+            self._patterns[field_name] = (
+                re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE),
+                {keyword.lower(): points for keyword, points in weights.items()},
+            )
+
+    def tier(self, score: float) -> str:
+        if score >= self.rules.high_threshold:
+            return "High"
+        if score >= self.rules.low_threshold:
+            return "Medium"
+        return "Low"
+
+    def make_score(self, score: float, matches: list[str], source: str = "rules") -> LeadScore:
+        score = int(max(0, min(100, round(score))))
+        return LeadScore(score=score, tier=self.tier(score), matches=matches, source=source)
+
+    def score(self, lead) -> LeadScore:
+        total = self.rules.base
+        matches = []
+        for field_name, (pattern, weights) in self._patterns.items():
+            text = getattr(lead, field_name, None)
+            if not text:
+                continue
+            for keyword in {match.lower() for match in pattern.findall(text)}:
+                total += weights[keyword]
+                matches.append(f"{field_name}:{keyword}")
+        return self.make_score(total, sorted(matches))
+
+    def score_batch(self, leads: list) -> list[LeadScore]:
+        return [self.score(lead) for lead in leads]
+
+    def is_borderline(self, result: LeadScore) -> bool:
+        # Close enough to the High cut-off that a second opinion could flip it
+        return self.rules.low_threshold <= result.score < self.rules.high_threshold
@@ -0,0 +1,108 @@
+import asyncio
+from contextlib import aclosing
+
+
+# Runs an async iterator once, in its own task, and lets any number of
+# readers iterate over everything it yields from the start: readers that
+# arrive while it is running catch up and then follow along, readers that
+# arrive after it finished replay the items. A failure is re-raised to
+# every reader once it has seen the items produced before it. The task
+# belongs to the stream, so a reader going away doesn't stop it for the
+# others; once the last reader leaves before it finished, though, it is
+# cancelled, since nobody may ever read what it would still produce.
+
+class SharedStream:
+    def __init__(self, source):
+        self.items = []
+        self.error = None
+        self.done = False
+        self._changed = asyncio.Event()
+        self._readers = 0
+        self._task = asyncio.create_task(self._run(source))
+
+    async def _run(self, source):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("shared stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def __aiter__(self):
+        self._readers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(self.items):
+                    index += 1
+                    yield self.items[index - 1]
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self._readers -= 1
+            if not self._readers and not self.done:
+                self._task.cancel()
+
+
+# Identical searches sharing one walk, while it runs and for as long as
+# `cache` (a TTLCache) keeps its SharedStream. A walk that failed, or that
+# every reader left before it finished, is started again by the next
+# search. Each caller filters the shared items with its own `skip`; if that
+# drops any, the caller tops up with a walk of its own, skipping the items
+# it already returned.
+
+class SharedWalks:
+    def __init__(self, cache, walk, item_keys):
+        self.cache = cache
+        self.walk = walk  # walk(query) -> async iterator of items
+        self.item_keys = item_keys  # item -> the keys it is known by
+
+    def stream(self, key, query) -> SharedStream:
+        return self.cache.get_or_create(
+            key, lambda: SharedStream(self.walk(query)), reusable=lambda stream: stream.error is None
+        )
+
+    async def iter(self, key, shared_query, query, skip, target: int):
+        # Items of walk(shared_query) shared under key, less those for which
+        # `await skip(item, keys)` is true, topped up from walk(query) to
+        # target if any were skipped
+        returned = set()
+        found = 0
+        dropped = False
+        # Closed as soon as this caller stops, so an abandoned walk stops too
+        async with aclosing(aiter(self.stream(key, shared_query))) as items:
+            async for item in items:
+                keys = self.item_keys(item)
+                if await skip(item, keys):
+                    dropped = True
+                    continue
+                returned.update(keys)
+                found += 1
+                yield item
+        if not dropped:
+            return
+
+        # The caller's own walk yields the items above again first; skip those
+        async for item in self.walk(query):
+            keys = self.item_keys(item)
+            if returned.intersection(keys):
+                continue
+            returned.update(keys)
+            found += 1
+            yield item
+            if found >= target:
+                break
@@ -0,0 +1,152 @@
+import logging
+import queue
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+logger = logging.getLogger(__name__)
+
+
+def is_connection_error(e: Exception) -> bool:
+    # A dropped session or a socket error, as opposed to an SMTP reply.
+    # smtplib.SMTPException subclasses OSError, so check for it first.
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+class SMTPPool:
+    """Keeps up to `size` authenticated SMTP sessions open and reuses them.
+
+    Sessions are opened lazily, handed out LIFO so the warmest one is used
+    first, and replaced when the server drops them or after
+    `max_messages_per_connection` sends.
+    """
+
+    def __init__(self, host: str, port: int, user: str | None, password: str | None,
+                 size: int = 4, starttls: bool = True, timeout: float = 30,
+                 max_messages_per_connection: int = 100, retries: int = 1):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = max(1, size)
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.retries = retries
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.user:
+            server.login(self.user, self.password)
+        return server
+
+    def _acquire(self) -> tuple[smtplib.SMTP, int]:
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect(), 0
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, server: smtplib.SMTP, sent: int, broken: bool = False):
+        if broken or sent >= self.max_messages_per_connection:
+            self._quit(server)
+        else:
+            self._idle.put((server, sent))
+        self._slots.release()
+
+    def _quit(self, server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def build_message(self, to_email: str, subject: str, body: str) -> str:
+        msg = MIMEMultipart()
+        msg['From'] = self.user
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        return msg.as_string()
+
+    def _reset(self, server: smtplib.SMTP, sent: int):
+        # After a refusal the session itself is fine once the transaction is reset
+        try:
+            server.rset()
+        except Exception:
+            self._release(server, sent, broken=True)
+            return
+        self._release(server, sent)
+
+    def send(self, to_email: str, subject: str, body: str):
+        # Only a session that is lost before DATA is retried, on a fresh one.
+        # Once DATA went out the message may already be delivered, and a
+        # refusal from the server is final either way.
+        message = self.build_message(to_email, subject, body)
+
+        for attempt in range(self.retries + 1):
+            server, data_sent = None, False
+            try:
+                server, sent = self._acquire()
+                server.ehlo_or_helo_if_needed()
+                code, response = server.mail(self.user)
+                if code != 250:
+                    raise smtplib.SMTPSenderRefused(code, response, self.user)
+                code, response = server.rcpt(to_email)
+                if code not in (250, 251):
+                    raise smtplib.SMTPRecipientsRefused({to_email: (code, response)})
+                data_sent = True
+                code, response = server.data(message)
+                if code != 250:
+                    raise smtplib.SMTPDataError(code, response)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                if server is not None:
+                    self._reset(server, sent + 1)
+                raise
+            except Exception as e:
+                if server is not None:
+                    self._release(server, sent, broken=True)
+                if data_sent or attempt == self.retries or not is_connection_error(e):
+                    raise
+                logger.warning(f"SMTP session lost ({e}), reconnecting")
+                continue
+            self._release(server, sent + 1)
+            return
+
+    def _send_one(self, message: tuple[str, str, str]) -> dict:
+        to_email, subject, body = message
+        try:
+            self.send(to_email, subject, body)
+            logger.info(f"Email sent to {to_email}")
+            return {"to": to_email, "status": "sent"}
+        except Exception as e:
+            logger.error(f"SMTP error for {to_email}: {e}")
+            return {"to": to_email, "status": "failed", "error": str(e)}
+
+    def send_batch(self, messages: list[tuple[str, str, str]]) -> list[dict]:
+        # One result per (to, subject, body), in input order. At most `size`
+        # sessions carry the whole batch.
+        if not messages:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.size, len(messages))) as executor:
+            return list(executor.map(self._send_one, messages))
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(server)
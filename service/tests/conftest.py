@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import bench_env
+
+
+# main reads its settings on import, so the environment is set up here,
+# before any test imports it. Tests point the providers at fakes by
+# assigning the base URL globals, which are read at call time.
+bench_env()
+
+
+@pytest.fixture
+def service():
+    import main
+    return main
+
+
+@pytest.fixture
+def run(service):
+    # Runs a coroutine function inside the app's startup/shutdown, on a
+    # fresh event loop per call
+    def run(func, *args):
+        async def inside():
+            async with service.app.router.lifespan_context(service.app):
+                return await func(*args)
+        return asyncio.run(inside())
+    return run
@@ -0,0 +1,37 @@
+import httpx
+
+from benchmarks.fakes import FakeApollo
+
+
+def find_leads(service, target: int) -> list[dict]:
+    async def find():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/find-leads", json={"job_title": "Head of Learning", "target_count": target})
+            response.raise_for_status()
+            return response.json()["results"]
+    return find
+
+
+def test_bulk_match_finds_the_same_leads_in_fewer_calls(service, run, monkeypatch):
+    with FakeApollo(total_people=40, bulk_miss_every=7) as apollo:
+        monkeypatch.setattr(service, "APOLLO_BASE_URL", apollo.url)
+        monkeypatch.setattr(service, "APOLLO_PER_PAGE", 20)
+
+        monkeypatch.setattr(service, "APOLLO_BULK_MATCH_SIZE", 0)
+        single = run(find_leads(service, 40))
+        assert apollo.calls["bulk_match"] == 0
+        assert apollo.calls["match"] == 40
+
+        apollo.calls.clear()
+        monkeypatch.setattr(service, "APOLLO_BULK_MATCH_SIZE", 10)
+        bulk = run(find_leads(service, 40))
+
+    assert len(bulk) == 40
+    assert bulk == single
+    assert all(lead["lead"]["email"] for lead in bulk)
+    # Everybody is wanted, so no enrichment is cut short. Two pages of 20
+    # people, matched 10 at a time; the 6 that bulk_match misses (p0, p7,
+    # ... p35) are matched on their own
+    assert apollo.calls["bulk_match"] == 4
+    assert apollo.calls["match"] == 6
@@ -0,0 +1,15 @@
+from dedup import LeadIndex, lead_keys
+
+
+def test_maybe_seen_has_no_false_negatives_across_rebuilds():
+    index = LeadIndex(":memory:", capacity=100)
+    people = [{"email": f"lead{i}@example.com", "id": f"p{i}"} for i in range(500)]
+    for person in people:
+        index.add(lead_keys(person), "found")
+    # Past capacity the filter was rebuilt, twice as large, with every key
+    assert index.stats()["bloom_capacity"] > 100
+    assert all(index.maybe_seen(lead_keys(person)) for person in people)
+    assert index.seen(lead_keys(people[7]), {"found"})
+
+    unseen = [lead_keys({"email": f"new{i}@example.com"}) for i in range(1000)]
+    assert sum(index.maybe_seen(keys) for keys in unseen) < 50
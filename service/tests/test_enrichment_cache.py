@@ -0,0 +1,21 @@
+import pytest
+
+from enrichment_cache import EnrichmentCache
+
+
+def test_failed_write_is_rolled_back(monkeypatch):
+    cache = EnrichmentCache(":memory:")
+    evict = cache._evict
+
+    def fail(now):
+        raise MemoryError("evicting failed")
+
+    monkeypatch.setattr(cache, "_evict", fail)
+    with pytest.raises(MemoryError):
+        cache.set_many([(["id:p1"], {"enriched": {"id": "p1"}})])
+    assert cache.get(["id:p1"]) is None
+
+    # The connection isn't left inside the failed transaction
+    monkeypatch.setattr(cache, "_evict", evict)
+    cache.set_many([(["id:p2"], {"enriched": {"id": "p2"}})])
+    assert cache.get(["id:p2"]) == {"enriched": {"id": "p2"}}
@@ -0,0 +1,62 @@
+from benchmarks.fakes import FakeHubSpot
+from outbound import Provider
+
+
+def lead(service, i: int, **fields):
+    return service.LeadRequest(**{
+        "firstname": f"First{i}", "lastname": f"Last{i}", "email": f"lead{i}@example.com", "company": f"Company {i}", **fields
+    })
+
+
+def test_batch_upsert_updates_existing_and_creates_new(service, run, monkeypatch):
+    with FakeHubSpot(existing_emails=[f"lead{i}@example.com" for i in range(0, 120, 2)]) as hubspot:
+        monkeypatch.setattr(service, "HUBSPOT_BASE_URL", hubspot.url)
+        monkeypatch.setattr(service, "HUBSPOT_BATCH_SIZE", 50)
+        leads = [lead(service, i) for i in range(120)]
+        outcomes = run(service.push_to_hubspot_batch, leads)
+
+    assert len(outcomes) == 120
+    assert all("result" in outcome for outcome in outcomes), outcomes
+    # Three chunks of 50/50/20, one read plus one update and one create each
+    assert hubspot.calls["batch_read"] == 3
+    assert hubspot.calls["batch_update"] == 3
+    assert hubspot.calls["batch_create"] == 3
+    assert hubspot.calls["search"] == hubspot.calls["create"] == hubspot.calls["update"] == 0
+    assert len(hubspot.contacts) == 120
+    for i, outcome in enumerate(outcomes):
+        assert outcome["result"]["properties"]["firstname"] == f"First{i}"
+    # Existing contacts keep their id; new ones get one after them
+    assert outcomes[0]["result"]["id"] == "1"
+    assert int(outcomes[1]["result"]["id"]) > 60
+
+
+def test_batch_upsert_dedupes_emails_and_reports_per_lead(service, run, monkeypatch):
+    with FakeHubSpot(existing_emails=["lead1@example.com"]) as hubspot:
+        monkeypatch.setattr(service, "HUBSPOT_BASE_URL", hubspot.url)
+        leads = [
+            lead(service, 1),
+            lead(service, 2),
+            lead(service, 3, email=None),
+            lead(service, 2, email="LEAD2@example.com ", firstname="Second"),
+        ]
+        outcomes = run(service.push_to_hubspot_batch, leads)
+
+    assert hubspot.calls["batch_read"] == hubspot.calls["batch_update"] == hubspot.calls["batch_create"] == 1
+    assert len(hubspot.contacts) == 2
+    assert outcomes[0]["result"]["id"] == "1"
+    assert outcomes[2] == {"error": "Lead has no email address."}
+    # Both leads with lead2's address share one contact, synced from the last
+    assert outcomes[1] == outcomes[3]
+    assert outcomes[3]["result"]["properties"]["firstname"] == "Second"
+
+
+def test_batch_upsert_reports_errors_for_failed_chunks(service, run, monkeypatch):
+    with FakeHubSpot(error_rate=1.0) as hubspot:
+        monkeypatch.setattr(service, "HUBSPOT_BASE_URL", hubspot.url)
+        # A provider of its own, so the failures don't trip the app's breaker
+        monkeypatch.setattr(service, "hubspot", Provider("hubspot", rate=0, burst=1, max_retries=1, base_delay=0))
+        outcomes = run(service.push_to_hubspot_batch, [lead(service, i) for i in range(3)])
+
+    assert outcomes == [{"error": "Error pushing lead to HubSpot."}] * 3
+    assert hubspot.calls["batch_read"] == 2
+    assert hubspot.calls["batch_create"] == 0
@@ -0,0 +1,62 @@
+import asyncio
+import csv
+import io
+import json
+
+import httpx
+import pytest
+
+from benchmarks.bench_import import call, file_chunks, write_leads
+
+
+async def stub_hubspot(leads):
+    return [{"result": {"id": str(i)}} for i, _ in enumerate(leads)]
+
+
+def round_trip(service, path, file_format: str):
+    # Streams the file into /jobs/import, waits for the job and exports it
+    # again -> (job, exported rows)
+    async def run():
+        query = f"format={file_format}&mode=template"
+        status, _, _, head = await call(service.app, "POST", f"/jobs/import?{query}", file_chunks(path))
+        assert status == 202, head[:200]
+        job_id = json.loads(head)["job_id"]
+        while service.job_store.get(job_id)["status"] not in ("completed", "failed"):
+            await asyncio.sleep(0.05)
+
+        # httpx's ASGITransport buffers the whole export, which is what we want here
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get(f"/jobs/{job_id}/export", params={"format": file_format})
+        assert response.status_code == 200
+        if file_format == "csv":
+            rows = list(csv.DictReader(io.StringIO(response.text)))
+        else:
+            rows = [json.loads(line) for line in response.text.splitlines()]
+        return service.job_store.get(job_id), rows
+    return run
+
+
+@pytest.mark.parametrize("file_format", ["csv", "jsonl"])
+def test_import_and_export_round_trip(service, run, monkeypatch, tmp_path, file_format):
+    monkeypatch.setattr(service, "JOB_STORE_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(service, "push_to_hubspot_batch", stub_hubspot)
+    count = 20000
+    path = tmp_path / f"leads.{file_format}"
+    write_leads(path, file_format, count)
+
+    job, rows = run(round_trip(service, path, file_format))
+
+    # Every 500th row has no company and fails validation
+    failed = count // 500
+    assert job["status"] == "completed"
+    assert (job["total"], job["done"], job["failed"]) == (count, count - failed, failed)
+    # Every row comes back exactly once, in file order
+    assert [int(row["index"]) for row in rows] == list(range(count))
+    for i in (0, 1, 498, count - 2):
+        assert rows[i]["status"] == "done"
+        assert rows[i]["email"] == f"lead{i}@example.com"
+        assert rows[i]["email_text"]
+        assert rows[i]["hubspot_id"]
+    assert all(row["status"] == "failed" and row["error"] for row in rows[499::500])
+    assert sum(row["status"] == "failed" for row in rows) == failed
@@ -0,0 +1,203 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from jobs import JobRunner, JobStore
+
+
+def age(store: JobStore, job_id: str, seconds: float):
+    store._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - seconds, job_id))
+
+
+def test_only_stale_leases_are_requeued():
+    store = JobStore(":memory:")
+    live = store.create("echo", [{}])
+    dead = store.create("echo", [{}])
+    assert store.claim_next("live")["job_id"] == live
+    assert store.claim_next("dead")["job_id"] == dead
+    age(store, dead, 120)
+    assert store.requeue_stale(60) == 1
+    assert store.get(live)["status"] == "running"
+    assert store.get(dead)["status"] == "queued"
+    # The live owner renews its lease; the dead one has lost its job
+    assert store.renew("live", [live]) == {live}
+    assert store.renew("dead", [dead]) == set()
+
+
+def test_finish_needs_the_lease():
+    store = JobStore(":memory:")
+    job_id = store.create("echo", [{}])
+    store.claim_next("first")
+    age(store, job_id, 120)
+    store.requeue_stale(60)
+    store.claim_next("second")
+    store.finish(job_id, owner="first")
+    assert store.get(job_id)["status"] == "running"
+    store.finish(job_id, owner="second")
+    assert store.get(job_id)["status"] == "completed"
+
+
+def test_abandoned_imports_expire():
+    store = JobStore(":memory:")
+    fresh = store.start_import("echo")
+    abandoned = store.start_import("echo")
+    age(store, abandoned, 7200)
+    assert store.expire_imports(3600) == 1
+    assert store.get(fresh)["status"] == "importing"
+    assert store.get(abandoned)["status"] == "failed"
+
+
+def test_runner_processes_and_releases_jobs():
+    store = JobStore(":memory:")
+    started = asyncio.Event()
+
+    async def echo(job, items, on_result):
+        for idx, item in items:
+            on_result(idx, item)
+
+    async def hang(job, items, on_result):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def run():
+        runner = JobRunner(store, workers=1, poll_interval=0.01, chunk_size=2, lease_seconds=0.3)
+        runner.register("echo", echo)
+        runner.register("hang", hang)
+        done = store.create("echo", [{"n": n} for n in range(5)])
+        runner.start()
+        while store.get(done)["status"] != "completed":
+            await asyncio.sleep(0.01)
+        hung = store.create("hang", [{}])
+        runner.notify()
+        await started.wait()
+        await asyncio.sleep(0.3)  # a few renewals keep the lease
+        assert store.get(hung)["status"] == "running"
+        await runner.stop()
+        return done, hung
+
+    done, hung = asyncio.run(run())
+    assert [entry["result"] for entry in store.results(done)] == [{"n": n} for n in range(5)]
+    assert store.get(hung)["status"] == "queued"
+
+
+def test_runner_stops_a_job_whose_lease_was_taken():
+    store = JobStore(":memory:")
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def hang(job, items, on_result):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def run():
+        runner = JobRunner(store, workers=1, poll_interval=0.01, lease_seconds=0.15)
+        runner.register("hang", hang)
+        job_id = store.create("hang", [{}])
+        runner.start()
+        await started.wait()
+        store._conn.execute("UPDATE jobs SET claimed_by = 'other' WHERE id = ?", (job_id,))
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await runner.stop()
+        return job_id
+
+    job_id = asyncio.run(run())
+    assert store.get(job_id)["status"] == "running"  # still the other runner's
+
+
+def test_runner_commits_results_per_chunk():
+    store = JobStore(":memory:")
+    commits = []
+    record_results = store.record_results
+    store.record_results = lambda job_id, results: commits.append(len(results)) or record_results(job_id, results)
+    stopped = asyncio.Event()
+
+    async def echo(job, items, on_result):
+        for idx, item in items:
+            on_result(idx, item)
+
+    async def slow(job, items, on_result):
+        # Results of a chunk still running are flushed every flush_interval,
+        # and whatever finished is kept when the job stops
+        on_result(*items[0])
+        await asyncio.sleep(0.25)
+        on_result(*items[1])
+        stopped.set()
+        await asyncio.sleep(60)
+
+    async def run():
+        runner = JobRunner(store, workers=1, poll_interval=0.01, chunk_size=10, flush_interval=0.1)
+        runner.register("echo", echo)
+        runner.register("slow", slow)
+        done = store.create("echo", [{"n": n} for n in range(25)])
+        runner.start()
+        while store.get(done)["status"] != "completed":
+            await asyncio.sleep(0.01)
+        assert commits == [10, 10, 5]
+        commits.clear()
+        stopped_job = store.create("slow", [{"n": n} for n in range(3)])
+        runner.notify()
+        await stopped.wait()
+        await runner.stop()
+        return done, stopped_job
+
+    done, stopped_job = asyncio.run(run())
+    assert commits == [1, 1]
+    assert len(store.results(done, limit=100)) == 25
+    assert store.get(stopped_job)["done"] == 2
+
+
+def test_failed_write_is_rolled_back():
+    store = JobStore(":memory:")
+    job_id = store.create("echo", [{"n": 0}, {"n": 1}])
+    with pytest.raises(ValueError):
+        store.record_results(job_id, [(0, {"n": 0}, False), (1, {"n": 1})])
+    assert store.get(job_id)["pending"] == 2
+    with pytest.raises(TypeError):
+        store.create("echo", [{"n": object()}])
+
+    # The connection isn't left inside the failed transaction
+    assert store.get(store.create("echo", [{}]))["status"] == "queued"
+    store.record_results(job_id, [(0, {"n": 0}, False)])
+    assert store.get(job_id)["done"] == 1
+
+
+def test_runner_keeps_going_after_a_store_error():
+    store = JobStore(":memory:")
+    failures = {"claim_next": 2, "renew": 2}
+
+    def flaky(name):
+        method = getattr(store, name)
+
+        def call(*args):
+            if failures[name]:
+                failures[name] -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return method(*args)
+        return call
+
+    store.claim_next = flaky("claim_next")
+    store.renew = flaky("renew")
+
+    async def echo(job, items, on_result):
+        for idx, item in items:
+            on_result(idx, item)
+
+    async def run():
+        runner = JobRunner(store, workers=1, poll_interval=0.01, lease_seconds=0.03)
+        runner.register("echo", echo)
+        job_id = store.create("echo", [{"n": n} for n in range(3)])
+        runner.start()
+        while store.get(job_id)["status"] != "completed":
+            await asyncio.sleep(0.01)
+        await runner.stop()
+        return job_id
+
+    job_id = asyncio.run(asyncio.wait_for(run(), 5))
+    assert failures == {"claim_next": 0, "renew": 0}
+    assert store.get(job_id)["done"] == 3
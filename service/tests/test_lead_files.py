@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+
+from benchmarks.bench_import import FIELDS, write_leads
+from lead_files import EXPORT_COLUMNS, LeadFileParser, export_chunks
+
+
+def parse(data: bytes, file_format: str, chunk_size: int) -> list:
+    parser = LeadFileParser(file_format)
+    rows = []
+    for start in range(0, len(data), chunk_size):
+        rows.extend(parser.feed(data[start:start + chunk_size]))
+    return rows + parser.close()
+
+
+def test_csv_rows_survive_any_chunking(tmp_path):
+    path = tmp_path / "leads.csv"
+    write_leads(path, "csv", 2000)
+    data = path.read_bytes()
+    # Quoted values spanning lines and multi-byte characters, which odd
+    # chunk sizes cut in half
+    data += 'Zoë,Ångström,zoe@example.com,"Acme, ""Intl""",CTO,"two\nlines"\n'.encode()
+
+    expected = parse(data, "csv", len(data))
+    assert len(expected) == 2001
+    assert expected[-1] == (2002, {
+        "firstname": "Zoë", "lastname": "Ångström", "email": "zoe@example.com",
+        "company": 'Acme, "Intl"', "job_title": "CTO", "company_description": "two\nlines",
+    })
+    for chunk_size in (1, 7, 4096):
+        assert parse(data, "csv", chunk_size) == expected
+
+
+def test_jsonl_rows_and_errors_keep_their_line_numbers(tmp_path):
+    path = tmp_path / "leads.jsonl"
+    write_leads(path, "jsonl", 1000)
+    data = path.read_bytes() + b"not json\n\n[1]\n" + json.dumps({"firstname": "Zoë"}).encode()
+
+    rows = parse(data, "jsonl", 13)
+    assert len(rows) == 1003
+    assert rows[0] == (1, {name: value for name, value in zip(FIELDS, (
+        "First0", "Last0", "lead0@example.com", "Company 0", "HR Manager", 'Regional group, 0 offices, "est." 1900',
+    ))})
+    assert rows[1000][0] == 1001 and rows[1000][1].startswith("Invalid JSON")
+    assert rows[1001] == (1003, "Expected a JSON object")
+    assert rows[1002] == (1004, {"firstname": "Zoë"})
+
+
+def test_unterminated_quote_is_an_error_not_the_rest_of_the_file():
+    data = b'firstname,company\n"Ann,Acme\nBob,Acme\n'
+    assert parse(data, "csv", 5) == [(2, "Unterminated quoted value")]
+
+
+def test_csv_export_reads_back():
+    pages = [
+        [{"index": i, "status": "done", "result": {"lead": {"firstname": f"First{i}", "email": f"lead{i}@example.com"},
+                                                   "email": f"Hi First{i},\n\"quoted\"", "hubspot": {"id": str(i)}}}
+         for i in range(start, start + 100)]
+        for start in range(0, 300, 100)
+    ]
+    rows = list(csv.DictReader(io.StringIO("".join(export_chunks(iter(pages), "csv")))))
+    assert list(rows[0]) == list(EXPORT_COLUMNS)
+    assert [row["index"] for row in rows] == [str(i) for i in range(300)]
+    assert rows[7]["email_text"] == 'Hi First7,\n"quoted"'
+    assert rows[7]["hubspot_id"] == "7"
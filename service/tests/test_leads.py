@@ -0,0 +1,45 @@
+from leads import LeadCard, apollo_contact_info, collect_phones, project_person
+
+
+PERSON = project_person({
+    "id": "p1", "first_name": "Ann", "last_name": "Lee", "email": "ann@example.com", "title": "CTO",
+    "phone_numbers": [{"raw_number": "+20 100 000 0001", "sanitized_number": "+201000000001"}],
+    "sanitized_phone": "+201000000001", "departments": ["engineering"],
+    "organization": {"name": "Acme", "description": None, "industry": "Software"},
+})
+REVEALED = {"sanitized_mobile_phone": "+201110000001", "mobile_phone": "+20 111 000 0001"}
+
+
+def card() -> LeadCard:
+    return LeadCard(
+        firstname="Ann", lastname="Lee", company="Acme", email="ann@example.com", job_title="CTO",
+        phones=collect_phones(PERSON, REVEALED), apollo_id="p1", revealed=True,
+        apollo_contact_info=apollo_contact_info(PERSON, revealed=REVEALED),
+    )
+
+
+def test_projection_keeps_only_what_cards_read():
+    assert "departments" not in PERSON
+    assert PERSON["organization"] == {"name": "Acme"}
+
+
+def test_default_cards_keep_the_full_lead_and_contact_info():
+    result = card().to_dict()
+    assert result["lead"]["phone"] is None
+    assert result["lead"]["message"] == ""
+    assert result["lead"]["company_description"] is None
+    info = result["apollo_contact_info"]
+    assert info["phone_numbers"] == PERSON["phone_numbers"]
+    assert info["sanitized_phone"] == "+201000000001"
+    assert info["revealed_sanitized_mobile_phone"] == "+201110000001"
+    assert "enriched_phone_numbers" not in info
+    assert result["phones"] == ["+201000000001", "+201110000001"]
+
+
+def test_compact_cards_drop_empty_fields():
+    assert card().to_dict(compact=True) == {
+        "lead": {"firstname": "Ann", "lastname": "Lee", "email": "ann@example.com", "company": "Acme", "job_title": "CTO"},
+        "phones": ["+201000000001", "+201110000001"],
+        "apollo_id": "p1",
+        "revealed": True,
+    }
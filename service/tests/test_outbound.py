@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from benchmarks.fakes import FakeApollo
+from outbound import CircuitOpenError, Provider, TokenBucket
+
+
+def search(provider: Provider, url: str, count: int = 1) -> list[httpx.Response]:
+    async def calls():
+        async with httpx.AsyncClient(base_url=url) as client:
+            return [
+                await provider.request(client, "POST", "/mixed_people/search", json={"page": 1, "per_page": 1})
+                for _ in range(count)
+            ]
+    return asyncio.run(calls())
+
+
+def test_server_errors_are_retried():
+    provider = Provider("apollo", rate=0, burst=1, max_retries=10, base_delay=0, failure_threshold=100)
+    with FakeApollo(error_rate=0.3, seed=1) as apollo:
+        responses = search(provider, apollo.url, count=20)
+
+    assert all(response.status_code == 200 for response in responses)
+    assert apollo.statuses[500] > 0
+    assert provider.retries == apollo.statuses[500]
+    assert provider.calls == apollo.calls["search"] == 20 + apollo.statuses[500]
+    assert provider.breaker.state == "closed"
+
+
+def test_retry_after_is_honored():
+    provider = Provider("apollo", rate=0, burst=1, base_delay=0)
+    with FakeApollo(rate_limit=1) as apollo:
+        started = time.monotonic()
+        responses = search(provider, apollo.url, count=2)
+        elapsed = time.monotonic() - started
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert apollo.statuses[429] == 1
+    assert provider.throttled == 1
+    # Retry-After: 1 rather than the immediate retry base_delay=0 would give
+    assert elapsed >= 0.9
+    # 429s don't count towards the breaker
+    assert provider.breaker.failures == 0
+
+
+def test_breaker_opens_after_repeated_failures():
+    provider = Provider("apollo", rate=0, burst=1, max_retries=2, base_delay=0, failure_threshold=3, reset_timeout=0.2)
+    with FakeApollo(error_rate=1.0) as apollo:
+        # Out of retries, the last response is handed back
+        assert search(provider, apollo.url)[0].status_code == 500
+        assert apollo.calls["search"] == 3
+        assert provider.breaker.state == "open"
+
+        # Open: fail fast without calling the provider
+        with pytest.raises(CircuitOpenError):
+            search(provider, apollo.url)
+        assert apollo.calls["search"] == 3
+        assert provider.rejected == 1
+
+        # Half-open after reset_timeout: one trial call, which closes it again
+        apollo.error_rate = 0.0
+        time.sleep(0.2)
+        assert search(provider, apollo.url)[0].status_code == 200
+        assert provider.breaker.state == "closed"
+        assert apollo.calls["search"] == 4
+
+
+def test_bucket_starts_empty_after_a_pause():
+    async def acquire_all(bucket, count: int) -> float:
+        bucket.pause(0.3)
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Nothing is refilled during the pause, so 4 tokens at 20/s take
+    # another 0.2s after it instead of coming out of a full burst
+    elapsed = asyncio.run(acquire_all(TokenBucket(rate=20, burst=10), 4))
+    assert elapsed >= 0.48
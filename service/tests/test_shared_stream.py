@@ -0,0 +1,48 @@
+import asyncio
+from contextlib import aclosing
+
+from shared_stream import SharedWalks
+from ttl_cache import TTLCache
+
+
+def walks():
+    produced = []
+
+    async def walk(query):
+        for n in range(query):
+            await asyncio.sleep(0.01)
+            produced.append(n)
+            yield n
+
+    async def keep(item, keys):
+        return False
+
+    return SharedWalks(TTLCache(), walk, lambda item: [item]), keep, produced
+
+
+async def read(shared: SharedWalks, keep, count: int | None = None) -> list:
+    async with aclosing(shared.iter("key", 20, 20, keep, 20)) as items:
+        return [item async for item in items] if count is None else [await anext(items) for _ in range(count)]
+
+
+def test_a_walk_is_shared_until_its_last_reader_leaves():
+    shared, keep, produced = walks()
+
+    async def run():
+        # One reader leaving early doesn't stop the walk for the other
+        full, partial = await asyncio.gather(read(shared, keep), read(shared, keep, 3))
+        assert full == list(range(20)) and partial == [0, 1, 2]
+        assert await read(shared, keep) == list(range(20))
+        assert (shared.cache.misses, shared.cache.hits) == (1, 2)
+
+        # Once every reader has left, the walk stops and the next search
+        # starts a new one
+        shared.cache = TTLCache()
+        produced.clear()
+        assert await read(shared, keep, 3) == [0, 1, 2]
+        await asyncio.sleep(0.05)
+        assert produced == [0, 1, 2]
+        assert await read(shared, keep) == list(range(20))
+        assert shared.cache.misses == 2
+
+    asyncio.run(run())
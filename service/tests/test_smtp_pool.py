@@ -0,0 +1,70 @@
+import smtplib
+
+import pytest
+
+from benchmarks.fakes import FakeSMTP
+from smtp_pool import SMTPPool
+
+
+def make_pool(fake: FakeSMTP) -> SMTPPool:
+    host, port = fake.address
+    return SMTPPool(host, port, "sender@example.com", "secret", size=1, starttls=False, timeout=5)
+
+
+def test_reuses_one_session():
+    with FakeSMTP(tls=False) as fake:
+        pool = make_pool(fake)
+        for i in range(3):
+            pool.send(f"lead{i}@example.com", "Hello", "Body")
+        pool.close()
+    assert fake.messages == 3
+    assert fake.connections == 1
+
+
+def test_rejection_after_data_is_not_resent():
+    with FakeSMTP(tls=False, error_rate=1.0) as fake:
+        pool = make_pool(fake)
+        with pytest.raises(smtplib.SMTPDataError):
+            pool.send("lead@example.com", "Hello", "Body")
+        assert fake.rejected == 1
+        # The session survives a refusal
+        fake.error_rate = 0
+        pool.send("lead@example.com", "Hello", "Body")
+        pool.close()
+    assert fake.messages == 1
+    assert fake.connections == 1
+
+
+def test_refused_recipient_fails_without_retry():
+    with FakeSMTP(tls=False, refuse=["gone@example.com"]) as fake:
+        pool = make_pool(fake)
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            pool.send("gone@example.com", "Hello", "Body")
+        pool.send("lead@example.com", "Hello", "Body")
+        pool.close()
+    assert fake.messages == 1
+    assert fake.connections == 1
+
+
+def test_dropped_session_is_replaced_before_data():
+    with FakeSMTP(tls=False) as fake:
+        pool = make_pool(fake)
+        pool.send("lead1@example.com", "Hello", "Body")
+        server, _ = pool._idle.queue[0]
+        server.close()  # as if the server had timed the idle session out
+        pool.send("lead2@example.com", "Hello", "Body")
+        pool.close()
+    assert fake.messages == 2
+    assert fake.connections == 2
+
+
+def test_send_batch_reports_failures_per_message():
+    with FakeSMTP(tls=False, refuse=["gone@example.com"]) as fake:
+        pool = make_pool(fake)
+        results = pool.send_batch([
+            ("lead@example.com", "Hello", "Body"),
+            ("gone@example.com", "Hello", "Body"),
+        ])
+        pool.close()
+    assert [result["status"] for result in results] == ["sent", "failed"]
+    assert fake.messages == 1
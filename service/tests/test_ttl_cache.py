@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from ttl_cache import TTLCache
+
+
+def test_caches_and_coalesces():
+    cache = TTLCache(max_entries=10, ttl=60)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+        return first, await cache.get_or_compute("key", compute)
+
+    first, again = asyncio.run(run())
+    assert first == ["value"] * 5 and again == "value"
+    assert calls == 1
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 4, 1)
+
+
+def test_cancelled_leader_doesnt_cancel_waiters():
+    cache = TTLCache()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == "value"
+    assert cache.get("key") == "value"
+
+
+def test_failures_are_shared_but_not_cached():
+    cache = TTLCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)), return_exceptions=True)
+
+    outcomes = asyncio.run(run())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert calls == 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_once(cache, compute))
+    assert calls == 2
+
+
+async def run_once(cache, compute):
+    return await cache.get_or_compute("key", compute)
+
+
+def test_entries_expire_and_evict():
+    cache = TTLCache(max_entries=2, ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    cache.ttl = 60
+    for key in "abc":
+        cache.set(key, key)
+    assert cache.get("a") is None and cache.get("c") == "c"
+    assert cache.evictions == 1
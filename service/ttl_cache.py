@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+# In-memory LRU cache with per-entry TTL and single-flight loading: while a
+# value is being computed, other callers asking for the same key wait for
+# that computation instead of starting their own. The computation isn't
+# tied to any one caller, so it keeps going if the caller that started it
+# is cancelled. Failures are shared with the waiters but never cached.
+
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> asyncio.Task computing it
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_create(self, key, create, reusable=None):
+        # get_or_compute for values that are created at once, such as a
+        # handle on work that runs elsewhere; a cached value that
+        # reusable(value) rejects is replaced
+        value = self.get(key, _MISSING)
+        if value is not _MISSING and (reusable is None or reusable(value)):
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = create()
+        self.set(key, value)
+        return value
+
+    async def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._compute(key, compute))
+            # Retrieve a failure nobody is left waiting for
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._inflight[key] = task
+        # The computation runs in a task of its own, so cancelling the caller
+        # that started it doesn't cancel it for the others waiting on it
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        try:
+            value = await compute()
+            self.set(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }